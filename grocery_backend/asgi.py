@@ -12,5 +12,12 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'grocery_backend.settings')
+# Serve the hot read endpoints with the native async views (see asgi_urls.py)
+os.environ.setdefault('ASYNC_READ_VIEWS', '1')
+# No persistent connections under ASGI: sync ORM calls run in per-request
+# threads, so every thread would keep its own connection open for
+# CONN_MAX_AGE without it ever being reused, until Postgres runs out of
+# max_connections. Use DB_POOL=True to reuse connections instead.
+os.environ['DB_CONN_MAX_AGE'] = '0'
 
 application = get_asgi_application()
@@ -0,0 +1,13 @@
+"""
+URL configuration used when ASYNC_READ_VIEWS is on (grocery_backend/asgi.py
+turns it on): the hot read endpoints are served by the native async views in
+store/async_views.py, everything else is routed exactly as in urls.py.
+"""
+from django.urls import include, path
+
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path('api/', include('store.async_urls')),
+    *sync_urlpatterns,
+]
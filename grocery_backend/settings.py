@@ -1,6 +1,8 @@
 from pathlib import Path
 from datetime import timedelta
 from dotenv import load_dotenv
+from django.core.exceptions import ImproperlyConfigured
+import copy
 import os
 
 load_dotenv()
@@ -25,6 +27,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'store',
@@ -43,7 +46,20 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'grocery_backend.urls'
+# Per-view latency/query-count histograms at /metrics (store/metrics.py)
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "0") == "1"
+# /metrics needs "Authorization: Bearer <METRICS_TOKEN>"; while it's unset the
+# endpoint refuses every request
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+# Log requests slower than this (ms) together with their SQL; 0 turns it off
+METRICS_SLOW_REQUEST_MS = float(os.environ.get("METRICS_SLOW_REQUEST_MS", 0))
+if METRICS_ENABLED:
+    MIDDLEWARE.insert(0, 'store.metrics.MetricsMiddleware')
+
+# Serving over ASGI (asgi.py sets ASYNC_READ_VIEWS=1) swaps the hot read
+# endpoints for the native async views in store/async_views.py
+ASYNC_READ_VIEWS = os.environ.get("ASYNC_READ_VIEWS", "0") == "1"
+ROOT_URLCONF = 'grocery_backend.asgi_urls' if ASYNC_READ_VIEWS else 'grocery_backend.urls'
 
 TEMPLATES = [
     {
@@ -73,9 +89,106 @@ DATABASES = {
         "PASSWORD": os.environ.get("DB_PASSWORD"),
         "HOST": os.environ.get("DB_HOST"),
         "PORT": os.environ.get("DB_PORT"),
+        # Reuse each worker's connection for this many seconds instead of paying
+        # a TCP + auth handshake per request (0 = close after every request).
+        "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", 60)),
+        # Ping a reused connection before handing it out so a dropped one is replaced
+        "CONN_HEALTH_CHECKS": True,
+        # Must be on behind PgBouncer in transaction pooling mode
+        "DISABLE_SERVER_SIDE_CURSORS": os.environ.get("DB_DISABLE_SERVER_SIDE_CURSORS", "False") == "True",
+        "OPTIONS": {
+            "connect_timeout": int(os.environ.get("DB_CONNECT_TIMEOUT", 5)),
+        },
     }
 }
 
+# Native connection pool (Django 5.1+, psycopg 3 only: pip install -r requirements-pool.txt).
+# The pool keeps connections itself, so per-worker persistence is turned off.
+if os.environ.get("DB_POOL", "False") == "True":
+    try:
+        import psycopg_pool  # noqa: F401
+    except ImportError:
+        raise ImproperlyConfigured("DB_POOL=True needs psycopg 3 with its pool: pip install -r requirements-pool.txt")
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+    DATABASES["default"]["OPTIONS"]["pool"] = {
+        "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", 2)),
+        "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", 10)),
+        "timeout": int(os.environ.get("DB_POOL_TIMEOUT", 10)),
+    }
+
+# DB_ENGINE=sqlite swaps Postgres for a local file, e.g. to run the benchmarks
+# without a database server
+if os.environ.get("DB_ENGINE") == "sqlite":
+    DATABASES = {"default": {"ENGINE": "django.db.backends.sqlite3", "NAME": BASE_DIR / "db.sqlite3"}}
+
+# Read replicas (store/routers.py): DB_REPLICA_HOSTS=host1,host2 adds a "replicaN"
+# alias per host, same credentials as the primary. Catalogue and report reads go
+# to them; a user who just wrote stays on the primary for DB_REPLICA_PIN_SECONDS,
+# which should comfortably cover the replication lag.
+DATABASE_REPLICAS = []
+for number, host in enumerate(filter(None, os.environ.get("DB_REPLICA_HOSTS", "").split(",")), start=1):
+    DATABASES[f"replica{number}"] = {
+        **copy.deepcopy(DATABASES["default"]),
+        "HOST": host.strip(),
+        # Tests run the replicas against the test database itself
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(f"replica{number}")
+DATABASE_ROUTERS = ["store.routers.ReplicaRouter"]
+# Adds a replica1 alias mirroring the test database when none is configured,
+# so `manage.py test` runs the routing tests (store/tests/runner.py)
+TEST_RUNNER = "store.tests.runner.ReplicaMirrorTestRunner"
+DB_REPLICA_PIN_SECONDS = float(os.environ.get("DB_REPLICA_PIN_SECONDS", 5))
+
+# Cache
+# Set REDIS_URL (or any Redis-compatible server, e.g. redis://localhost:6379/0) in
+# production so all workers share one cache; falls back to per-process memory.
+
+if os.environ.get("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["REDIS_URL"],
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# Carts (store/carts.py). DatabaseCartBackend keeps every line as a CartItem row;
+# CacheCartBackend keeps each cart in the CART_CACHE cache instead. Give carts
+# their own Redis (ideally with persistence) with CART_REDIS_URL.
+CART_BACKEND = os.environ.get("CART_BACKEND", "store.carts.DatabaseCartBackend")
+CART_CACHE = "default"
+if os.environ.get("CART_REDIS_URL"):
+    CACHES["carts"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ["CART_REDIS_URL"],
+    }
+    CART_CACHE = "carts"
+# With CacheCartBackend: "checkout" writes carts to the database only as the order,
+# "write_behind" also copies every change to CartItem in the background (CART_WRITER,
+# any class with a submit(user_id) method), so a lost cache entry can be reloaded
+CART_DURABILITY = os.environ.get("CART_DURABILITY", "write_behind")
+if CART_DURABILITY not in ("checkout", "write_behind"):
+    raise ImproperlyConfigured("CART_DURABILITY must be 'checkout' or 'write_behind'")
+CART_WRITER = os.environ.get("CART_WRITER", "store.carts.ThreadCartWriter")
+# Seconds an untouched cached cart is kept
+CART_TTL = int(os.environ.get("CART_TTL", 30 * 24 * 3600))
+
+# Seconds a cached catalogue response (products/categories) may live. Writes
+# invalidate them immediately, this only bounds memory use.
+CATALOGUE_CACHE_TIMEOUT = int(os.environ.get("CATALOGUE_CACHE_TIMEOUT", 300))
+# Promo codes at checkout (store/promos.py): shared cache entries, and how long
+# each process trusts its own copy before rechecking the shared cache
+PROMO_CODE_CACHE_TIMEOUT = int(os.environ.get("PROMO_CODE_CACHE_TIMEOUT", 300))
+PROMO_CODE_LOCAL_CACHE_TTL = float(os.environ.get("PROMO_CODE_LOCAL_CACHE_TTL", 5))
+# How long each process trusts the slug -> id it saw for products/<slug>/<id>/ (store/slugs.py)
+PRODUCT_SLUG_CACHE_TTL = float(os.environ.get("PRODUCT_SLUG_CACHE_TTL", 60))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -120,7 +233,8 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # JWT without a user lookup per request (see store/authentication.py)
+        'store.authentication.StatelessJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
@@ -132,8 +246,15 @@ AUTH_USER_MODEL = 'store.User'
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
+    # Tokens carry the user's role; refreshes check the deny-list
+    'TOKEN_OBTAIN_SERIALIZER': 'store.authentication.RoleTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'store.authentication.DenyListTokenRefreshSerializer',
+    'TOKEN_USER_CLASS': 'store.authentication.RoleTokenUser',
 }
 
+# How long each process may use its cached copy of the token deny-list
+JWT_DENYLIST_CACHE_TTL = int(os.environ.get("JWT_DENYLIST_CACHE_TTL", 30))
+
 # AWS S3 Settings for media files
 STORAGES = {
     "default": {
@@ -152,6 +273,19 @@ STORAGES = {
     }
 }
 
+# Product image uploads are pushed to S3 concurrently by this many threads per request
+PRODUCT_IMAGE_UPLOAD_WORKERS = int(os.environ.get("PRODUCT_IMAGE_UPLOAD_WORKERS", 4))
+
+# Thumbnails/WebP renditions are rendered after the upload request commits.
+# Any class with a submit(image_ids) method works; SyncDerivativeWorker renders inline.
+IMAGE_DERIVATIVE_WORKER = os.environ.get("IMAGE_DERIVATIVE_WORKER", "store.images.ThreadDerivativeWorker")
+
+# Low-stock alerts (store/alerts.py): default threshold when neither the product
+# nor its category sets one, and where `manage.py process_stock_events` sends them.
+# Any class with a notify(alerts) method works.
+LOW_STOCK_THRESHOLD = int(os.environ.get("LOW_STOCK_THRESHOLD", 5))
+LOW_STOCK_NOTIFIER = os.environ.get("LOW_STOCK_NOTIFIER", "store.alerts.LogNotifier")
+
 AWS_S3_FILE_OVERWRITE = False
 AWS_S3_SIGNATURE_VERSION = "s3v4"
 AWS_S3_ADDRESSING_STYLE = "virtual"
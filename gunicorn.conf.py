@@ -0,0 +1,17 @@
+# gunicorn -c gunicorn.conf.py grocery_backend.asgi:application
+# Uvicorn workers, each running one event loop. The hot read endpoints are
+# served by the async views (asgi.py sets ASYNC_READ_VIEWS=1). asgi.py also
+# forces DB_CONN_MAX_AGE=0, since connections kept by per-request threads are
+# never reused; set DB_POOL=True to share connections across requests.
+import multiprocessing
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "uvicorn_worker.UvicornWorker"
+keepalive = 5
+timeout = 30
+graceful_timeout = 30
+# Recycle workers now and then so slow leaks can't build up
+max_requests = 10000
+max_requests_jitter = 1000
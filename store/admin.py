@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.utils.html import format_html
-from .models import User, Category, Product, CartItem, WishlistItem, Order, OrderItem
+from .models import User, Category, Product, CartItem, WishlistItem, Order, OrderItem, LowStockAlert
 
 
 class CustomUserAdmin(UserAdmin):
@@ -28,12 +28,19 @@ class ProductAdmin(admin.ModelAdmin):
     def image_preview(self, obj):
         first = obj.images.first()
         if first and first.image:
-            return format_html('<img src="{}" width="60" height="60" style="object-fit:cover; border-radius:5px;" />', first.image.url)
+            # Prefer the small rendition over the full-size upload
+            preview = first.thumbnail or first.image
+            return format_html('<img src="{}" width="60" height="60" style="object-fit:cover; border-radius:5px;" />', preview.url)
         return "(No Image)"
 
     image_preview.short_description = "Image"
 
 
+class LowStockAlertAdmin(admin.ModelAdmin):
+    list_display = ('product', 'stock', 'threshold', 'created_at')
+    list_select_related = ('product',)
+
+
 # Register Models
 admin.site.register(User, CustomUserAdmin)
 admin.site.register(Category)
@@ -42,4 +49,5 @@ admin.site.register(CartItem)
 admin.site.register(WishlistItem)
 admin.site.register(Order)
 admin.site.register(OrderItem)
+admin.site.register(LowStockAlert, LowStockAlertAdmin)
 
@@ -0,0 +1,118 @@
+"""
+Low-stock alerting, kept off the request path with an outbox.
+
+Anything that changes stock (Product.save, checkout, batch stock updates,
+bulk imports) writes one StockEvent row per product in the same transaction
+as the change, so an event exists if and only if the change committed. The
+`process_stock_events` command drains the outbox in batches: events are
+collapsed per product, the current stock is compared with the product's
+threshold (product, else category, else settings.LOW_STOCK_THRESHOLD), and
+newly-low products are handed to the notifier in one call per batch.
+
+A LowStockAlert row marks a product that has already been reported, so a
+product that stays low isn't reported again until it's been restocked.
+"""
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+from django.utils.module_loading import import_string
+
+from .models import LowStockAlert, Product, StockEvent
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 500
+
+
+def record_stock_changes(product_ids, source):
+    """Queue a stock-change event per product (one INSERT, any number of products)."""
+    StockEvent.objects.bulk_create([StockEvent(product_id=pk, source=source) for pk in set(product_ids)])
+
+
+class LogNotifier:
+    """Writes one warning per product to the `store.alerts` logger."""
+
+    def notify(self, alerts):
+        for alert in alerts:
+            logger.warning(
+                "Low stock: '%s' has only %s left (threshold %s).",
+                alert.product.name, alert.stock, alert.threshold,
+            )
+
+
+_notifiers = {}
+
+
+def get_notifier():
+    # LOW_STOCK_NOTIFIER is a dotted path to any class with notify(alerts)
+    # (e.g. one that sends an email digest or posts to a chat webhook)
+    path = settings.LOW_STOCK_NOTIFIER
+    if path not in _notifiers:
+        _notifiers[path] = import_string(path)()
+    return _notifiers[path]
+
+
+def _current_levels(product_ids):
+    return (
+        Product.objects.filter(id__in=product_ids)
+        .annotate(threshold=Coalesce('low_stock_threshold', 'category__low_stock_threshold', Value(settings.LOW_STOCK_THRESHOLD)))
+        .only('id', 'name', 'stock')
+    )
+
+
+def process_stock_events(batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Handle up to `batch_size` queued events. Returns a summary:
+    {'events': n, 'products': n, 'alerted': n, 'cleared': n}
+    """
+    with transaction.atomic():
+        # skip_locked lets several consumers drain the outbox side by side
+        events = list(
+            StockEvent.objects.select_for_update(skip_locked=True)
+            .order_by('id').values_list('id', 'product_id')[:batch_size]
+        )
+        summary = {'events': len(events), 'products': 0, 'alerted': 0, 'cleared': 0}
+        if not events:
+            return summary
+
+        # However many events a product got, only where it is now matters
+        product_ids = {product_id for _, product_id in events}
+        summary['products'] = len(product_ids)
+        alerted = {a.product_id: a for a in LowStockAlert.objects.filter(product_id__in=product_ids)}
+
+        new_alerts, still_low, cleared = [], [], []
+        for product in _current_levels(product_ids):
+            alert = alerted.get(product.id)
+            if product.stock > product.threshold:
+                if alert:
+                    cleared.append(product.id)
+            elif alert is None:
+                new_alerts.append(LowStockAlert(product=product, stock=product.stock, threshold=product.threshold))
+            else:
+                alert.stock, alert.threshold = product.stock, product.threshold
+                still_low.append(alert)
+
+        # Another consumer may have taken a different event for the same
+        # product and inserted its alert since we read `alerted`: skip those
+        # rows instead of failing the batch, and leave notifying to whoever
+        # inserted them (their rows don't carry our created_at)
+        LowStockAlert.objects.bulk_create(new_alerts, ignore_conflicts=True)
+        if new_alerts:
+            ours = dict(
+                LowStockAlert.objects.filter(product_id__in=[a.product_id for a in new_alerts])
+                .values_list('product_id', 'created_at')
+            )
+            new_alerts = [a for a in new_alerts if ours.get(a.product_id) == a.created_at]
+        LowStockAlert.objects.bulk_update(still_low, ['stock', 'threshold'])
+        LowStockAlert.objects.filter(product_id__in=cleared).delete()
+        StockEvent.objects.filter(id__in=[pk for pk, _ in events]).delete()
+        summary['alerted'], summary['cleared'] = len(new_alerts), len(cleared)
+
+    # Only notify once the alerts are committed, so a failure here doesn't
+    # lose events, at worst an alert is recorded but not sent
+    if new_alerts:
+        get_notifier().notify(new_alerts)
+    return summary
@@ -0,0 +1,11 @@
+from django.urls import path
+
+from .async_views import CartListView, CategoryListView, ProductDetailView, ProductListView
+
+# Mounted in front of store/urls.py by grocery_backend/asgi_urls.py, same paths and names
+urlpatterns = [
+    path('products/', ProductListView.as_view(), name='products-list'),
+    path('products/<slug:slug>/<int:pk>/', ProductDetailView.as_view(), name='product-details'),
+    path('categories/', CategoryListView.as_view(), name='categories-list'),
+    path('cart/', CartListView.as_view(), name='cart-list'),
+]
@@ -0,0 +1,219 @@
+"""
+Native async versions of the hot read endpoints, used when the app is served
+over ASGI (see grocery_backend/asgi.py and asgi_urls.py):
+
+    GET /api/products/                    ProductListView
+    GET /api/products/<slug>/<id>/        ProductDetailView
+    GET /api/categories/                  CategoryListView
+    GET /api/cart/                        CartListView
+
+GETs run on the event loop with Django's async ORM and cache APIs and
+return the same JSON as the DRF views. Anything else on these URLs (writes,
+and product searches/popularity sorting, which go through the synchronous
+search backends) is handed to the regular DRF view in a worker thread, so
+behaviour never differs between the two serving modes.
+"""
+import base64
+import binascii
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Q
+from django.http import HttpResponse
+from django.utils.decorators import classonlymethod
+from django.views import View
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from .authentication import StatelessJWTAuthentication
+from .cache import CATEGORIES, PRODUCTS, acached_response, product_key
+from .carts import DatabaseCartBackend, get_cart_backend
+from .models import Category
+from .pagination import ProductCursorPagination
+from .routers import ais_pinned, replica_reads
+from .serializers import CartItemSerializer, CategorySerializer, ProductSerializer
+from .slugs import remember_product_slug, slug_matches
+from .views import CartViewSet, CategoryViewSet, ProductViewSet, cart_queryset, product_queryset
+
+
+def json_response(data, status=status.HTTP_200_OK, headers=None):
+    # Same bytes DRF's JSONRenderer would send
+    return HttpResponse(JSONRenderer().render(data), status=status, headers=headers, content_type='application/json')
+
+
+class AsyncReadView(View):
+    """GET/HEAD handled natively, every other method by `fallback` (a DRF view) in a thread."""
+    fallback = None
+    # Read from a replica, like the DRF views' ReplicaReadsMixin (store/routers.py)
+    replica_reads = False
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        # Token-authenticated API: no CSRF, same as every DRF view
+        view.csrf_exempt = True
+        return view
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method in ('GET', 'HEAD') and not self.use_fallback(request):
+            try:
+                with replica_reads(await self.reads_from_replica(request)):
+                    return await self.get(request, *args, **kwargs)
+            except APIException as exc:
+                headers = {}
+                if exc.status_code == status.HTTP_401_UNAUTHORIZED:
+                    headers['WWW-Authenticate'] = StatelessJWTAuthentication().authenticate_header(request)
+                detail = exc.detail if isinstance(exc.detail, (dict, list)) else {'detail': exc.detail}
+                return json_response(detail, status=exc.status_code, headers=headers)
+        return await sync_to_async(self.fallback)(request, *args, **kwargs)
+
+    def use_fallback(self, request):
+        return False
+
+    async def reads_from_replica(self, request):
+        if not (self.replica_reads and settings.DATABASE_REPLICAS):
+            return False
+        if 'Authorization' not in request.headers:
+            return True
+        # Catalogue reads don't need a valid token, only a pinned user's does
+        try:
+            user = await authenticate(request)
+        except APIException:
+            return True
+        return not (user and await ais_pinned(user))
+
+    async def get(self, request, *args, **kwargs):
+        raise NotImplementedError
+
+
+async def authenticate(request):
+    """The JWT's user (or None without an Authorization header), like StatelessJWTAuthentication."""
+    result = await StatelessJWTAuthentication().aauthenticate(request)
+    return result and result[0]
+
+
+def encode_cursor(product, reverse=False):
+    raw = f"{'r' if reverse else 'n'}|{product.created_at.isoformat()}|{product.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(value):
+    """(reverse, created_at, id) from a cursor made by encode_cursor."""
+    try:
+        direction, created_at, pk = base64.urlsafe_b64decode(value.encode()).decode().split('|')
+        return direction == 'r', datetime.fromisoformat(created_at), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid cursor")
+
+
+class ProductListView(AsyncReadView):
+    """
+    Product listing, newest first. Keyset paginated on (created_at, id) like
+    ProductCursorPagination, with the exact position in the cursor, so a
+    page is one range query whatever its depth.
+    """
+    fallback = staticmethod(ProductViewSet.as_view({'get': 'list', 'post': 'create'}))
+    paginator = ProductCursorPagination
+    replica_reads = True
+
+    def use_fallback(self, request):
+        return 'search' in request.GET or 'popular' in request.GET
+
+    async def get(self, request):
+        return await acached_response(request, [PRODUCTS], lambda: self.page(request))
+
+    def page_size(self, request):
+        try:
+            size = int(request.GET[self.paginator.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.paginator.page_size
+        return min(size, self.paginator.max_page_size) if size > 0 else self.paginator.page_size
+
+    def link(self, request, cursor):
+        params = request.GET.copy()
+        params['cursor'] = cursor
+        return request.build_absolute_uri(f'{request.path}?{params.urlencode()}')
+
+    async def page(self, request):
+        drf_request = Request(request)
+        fields = ProductSerializer.requested_fields(drf_request)
+        qs = product_queryset(fields)
+        category = request.GET.get('category')
+        if category:
+            qs = qs.filter(category__slug=category.lower())
+
+        reverse = False
+        cursor = request.GET.get('cursor')
+        if cursor:
+            try:
+                reverse, created_at, pk = decode_cursor(cursor)
+            except ValueError:
+                return json_response({'detail': "Invalid cursor"}, status=status.HTTP_404_NOT_FOUND)
+            if reverse:
+                qs = qs.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk))
+            else:
+                qs = qs.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+        qs = qs.order_by('created_at', 'id') if reverse else qs.order_by('-created_at', '-id')
+
+        size = self.page_size(request)
+        products = [product async for product in qs[:size + 1]]
+        has_more = len(products) > size
+        products = products[:size]
+        if reverse:
+            products.reverse()
+
+        # Walking backwards, there's always a page after this one (we came from it)
+        has_next, has_previous = (True, has_more) if reverse else (has_more, bool(cursor))
+        next_link = previous_link = None
+        if products and has_next:
+            next_link = self.link(request, encode_cursor(products[-1]))
+        if products and has_previous:
+            previous_link = self.link(request, encode_cursor(products[0], reverse=True))
+        results = ProductSerializer(products, many=True, context={'request': drf_request}).data
+        return json_response({'next': next_link, 'previous': previous_link, 'results': results})
+
+
+class ProductDetailView(AsyncReadView):
+    fallback = staticmethod(ProductViewSet.as_view({'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'}))
+    replica_reads = True
+
+    async def get(self, request, slug, pk):
+        async def build():
+            drf_request = Request(request)
+            product = slug_matches(slug, pk) and await product_queryset(ProductSerializer.requested_fields(drf_request)).filter(slug=slug, id=pk).afirst()
+            if not product:
+                return json_response({'detail': "No product matches given slug and id"}, status=status.HTTP_404_NOT_FOUND)
+            remember_product_slug(slug, pk)
+            return json_response(ProductSerializer(product, context={'request': drf_request}).data)
+
+        return await acached_response(request, [product_key(pk), CATEGORIES], build)
+
+
+class CategoryListView(AsyncReadView):
+    fallback = staticmethod(CategoryViewSet.as_view({'get': 'list', 'post': 'create'}))
+    replica_reads = True
+
+    async def get(self, request):
+        async def build():
+            categories = [category async for category in Category.objects.order_by('name')]
+            return json_response(CategorySerializer(categories, many=True).data)
+
+        return await acached_response(request, [CATEGORIES], build)
+
+
+class CartListView(AsyncReadView):
+    fallback = staticmethod(CartViewSet.as_view({'get': 'list', 'post': 'create'}))
+
+    def use_fallback(self, request):
+        # Only database-backed carts are read natively
+        return not isinstance(get_cart_backend(), DatabaseCartBackend)
+
+    async def get(self, request):
+        user = await authenticate(request)
+        if user is None:
+            raise NotAuthenticated()
+        items = [item async for item in cart_queryset(user.id)]
+        return json_response(CartItemSerializer(items, many=True, context={'request': Request(request)}).data)
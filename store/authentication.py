@@ -0,0 +1,187 @@
+"""
+Stateless JWT authentication.
+
+Access tokens carry the user's `role` (and `is_superuser`) as claims, and
+StatelessJWTAuthentication turns a valid token straight into a RoleTokenUser
+without loading the User row, so permission checks (store/permissions.py)
+trust the claims and an authenticated request costs no user query.
+
+Because nothing is re-read per request, revocation goes through a deny-list
+of TokenRevocation rows: a single token on logout, or every token issued to
+a user before their role, active flag, superuser flag or password changed
+(see store/signals.py). Each request checks its token's two cache keys
+(revoked:jti:<jti>, revoked:user:<id>) with one get_many; only a miss reads
+the table, for that token alone, and "not revoked" is cached for
+JWT_DENYLIST_CACHE_TTL seconds. A revocation sets its key once committed, so
+it's picked up at once when the cache is shared (REDIS_URL), or by other
+processes within that TTL.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from .models import TokenRevocation
+
+ROLE_CLAIM = 'role'
+# When the token pair was issued, to the microsecond (`iat` is whole seconds)
+ISSUED_AT_CLAIM = 'issued_at'
+
+
+class RoleTokenUser(TokenUser):
+    """request.user for stateless requests: id, role and superuser flag straight from the token."""
+
+    @cached_property
+    def id(self):
+        # simplejwt stores the id as a string; hand views the int a User would have
+        user_id = self.token[jwt_settings.USER_ID_CLAIM]
+        return int(user_id) if str(user_id).isdigit() else user_id
+
+    @cached_property
+    def role(self):
+        return self.token.get(ROLE_CLAIM, 'customer')
+
+    def is_manager(self):
+        return self.role == 'manager'
+
+
+class RoleTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        # Claims on the refresh token are copied to every access token made from it
+        token = super().get_token(user)
+        token[ROLE_CLAIM] = user.role
+        token['is_superuser'] = user.is_superuser
+        token[ISSUED_AT_CLAIM] = timezone.now().timestamp()
+        return token
+
+
+def _jti_key(jti):
+    return f'revoked:jti:{jti}'
+
+
+def _user_key(user_id):
+    return f'revoked:user:{user_id}'
+
+
+def _keys(token):
+    return _jti_key(token.get(jwt_settings.JTI_CLAIM)), _user_key(token.get(jwt_settings.USER_ID_CLAIM))
+
+
+def _revocation_rows(token):
+    return TokenRevocation.objects.filter(expires_at__gt=timezone.now()).filter(
+        Q(jti=token.get(jwt_settings.JTI_CLAIM)) | Q(user_id=token.get(jwt_settings.USER_ID_CLAIM), jti='')
+    ).values_list('jti', 'revoked_at')
+
+
+def _entries(token, rows):
+    # {jti key: 1 if revoked, user key: timestamp up to which their tokens are revoked (0: none)}
+    jti_revoked, user_revoked_at = 0, 0
+    for jti, revoked_at in rows:
+        if jti:
+            jti_revoked = 1
+        else:
+            user_revoked_at = max(user_revoked_at, revoked_at.timestamp())
+    jti_key, user_key = _keys(token)
+    return {jti_key: jti_revoked, user_key: user_revoked_at}
+
+
+def _issued_at(token):
+    # Tokens without the claim (e.g. AccessToken.for_user) only have `iat`, the
+    # start of their second, so a revocation later in that second covers them
+    return token.get(ISSUED_AT_CLAIM, token.get('iat', 0))
+
+
+def _check(token, entries):
+    jti_key, user_key = _keys(token)
+    if entries[jti_key] or _issued_at(token) <= entries[user_key]:
+        raise AuthenticationFailed("Token has been revoked.", code="token_revoked")
+
+
+def ensure_not_revoked(token):
+    """One cache round trip for the token's jti and user; the table only on a miss."""
+    keys = _keys(token)
+    entries = cache.get_many(keys)
+    if len(entries) < len(keys):
+        entries = _entries(token, _revocation_rows(token))
+        # "Not revoked" is trusted for JWT_DENYLIST_CACHE_TTL; a revocation overwrites it on commit
+        cache.set_many(entries, settings.JWT_DENYLIST_CACHE_TTL)
+    _check(token, entries)
+
+
+async def aensure_not_revoked(token):
+    keys = _keys(token)
+    entries = await cache.aget_many(keys)
+    if len(entries) < len(keys):
+        entries = _entries(token, [row async for row in _revocation_rows(token)])
+        await cache.aset_many(entries, settings.JWT_DENYLIST_CACHE_TTL)
+    _check(token, entries)
+
+
+def _publish(key, value, timeout):
+    # Only once the row is committed: a request that looked the token up in
+    # between cached "not revoked", and this overwrites it
+    transaction.on_commit(lambda: cache.set(key, value, max(1, int(timeout))))
+
+
+def revoke_user_tokens(user_id):
+    """Revoke every access/refresh token issued to the user so far."""
+    now = timezone.now()
+    TokenRevocation.objects.filter(expires_at__lte=now).delete()
+    TokenRevocation.objects.create(user_id=user_id, revoked_at=now, expires_at=now + jwt_settings.REFRESH_TOKEN_LIFETIME)
+    _publish(_user_key(user_id), now.timestamp(), jwt_settings.REFRESH_TOKEN_LIFETIME.total_seconds())
+
+
+def revoke_token(token):
+    """Revoke a single token (by jti) until it would have expired anyway."""
+    expires_at = datetime.fromtimestamp(token['exp'], tz=dt_timezone.utc)
+    TokenRevocation.objects.create(user_id=token.get(jwt_settings.USER_ID_CLAIM), jti=token[jwt_settings.JTI_CLAIM], expires_at=expires_at)
+    _publish(_jti_key(token[jwt_settings.JTI_CLAIM]), 1, (expires_at - timezone.now()).total_seconds())
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that trusts the token's claims instead of loading the
+    user. Tokens issued before the role claim existed still get the usual
+    database lookup.
+    """
+
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        ensure_not_revoked(token)
+        return token
+
+    def get_user(self, validated_token):
+        if ROLE_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+        if jwt_settings.USER_ID_CLAIM not in validated_token:
+            raise AuthenticationFailed("Token contained no recognizable user identification", code="token_not_valid")
+        return RoleTokenUser(validated_token)
+
+    async def aauthenticate(self, request):
+        """authenticate() for the async views: (user, token) or None."""
+        header = self.get_header(request)
+        raw_token = header and self.get_raw_token(header)
+        if not raw_token:
+            return None
+        token = super().get_validated_token(raw_token)
+        await aensure_not_revoked(token)
+        if ROLE_CLAIM in token:
+            return self.get_user(token), token
+        return await sync_to_async(super().get_user)(token), token
+
+
+class DenyListTokenRefreshSerializer(TokenRefreshSerializer):
+    def validate(self, attrs):
+        ensure_not_revoked(self.token_class(attrs['refresh']))
+        return super().validate(attrs)
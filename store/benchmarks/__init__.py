@@ -0,0 +1,16 @@
+"""
+Micro-benchmarks for the store API.
+
+Each module exposes ``run(scale=1.0)`` which seeds whatever data it needs and
+returns a JSON-serialisable dict of results. They are run through
+``python manage.py benchmark`` which gives them a scratch database.
+"""
+
+SUITES = {
+    'pagination': 'store.benchmarks.pagination',
+    'search': 'store.benchmarks.search',
+    'connections': 'store.benchmarks.connections',
+    'bulk': 'store.benchmarks.bulk',
+    'asgi': 'store.benchmarks.asgi',
+    'api': 'store.benchmarks.api',
+}
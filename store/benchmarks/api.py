@@ -0,0 +1,150 @@
+"""
+End-to-end API load test on production-sized fixtures: 100k products, 1M
+order items and customers with 50-line carts (at --scale 1).
+
+Every request goes through the full Django/DRF stack with a real JWT, one
+at a time, and reports latency percentiles, throughput and the number of
+queries it ran, so a regression in either shows up when comparing two runs'
+JSON. Cached reads are measured both warm and with the cache cleared before
+each request ("_uncached"), since a warm cache hides the queries behind it.
+"""
+import random
+import time
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from store.categories import refresh_category_counts
+from store.models import CartItem, Category, Order, OrderItem, Product, User
+from store.sales import rebuild_sales_counters
+from .base import scaled, summarize
+from .search import ADJECTIVES, BRANDS, NOUNS, QUERIES
+
+CATEGORIES = 20
+ITEMS_PER_ORDER = 10
+CART_LINES = 50
+CHUNK = 5000
+
+
+def bearer(user):
+    return {'Authorization': f'Bearer {AccessToken.for_user(user)}'}
+
+
+def seed_products(count):
+    rng = random.Random(42)
+    categories = Category.objects.bulk_create([
+        Category(name=f'BENCH API {i}', slug=f'bench-api-{i}', path=f'bench-api-{i}/') for i in range(CATEGORIES)
+    ])
+    for start in range(0, count, CHUNK):
+        Product.objects.bulk_create([
+            Product(
+                name=f'{rng.choice(BRANDS).title()} {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i}',
+                slug=f'bench-api-{i}', category=categories[i % CATEGORIES],
+                price=Decimal(rng.randint(99, 2999)) / 100, stock=100000,
+            )
+            for i in range(start, min(start + CHUNK, count))
+        ])
+    refresh_category_counts()
+    return list(Product.objects.values_list('id', 'price')), categories
+
+
+def seed_orders(order_items, customers, products):
+    rng = random.Random(43)
+    orders = order_items // ITEMS_PER_ORDER
+    per_chunk = CHUNK // ITEMS_PER_ORDER
+    for start in range(0, orders, per_chunk):
+        created = Order.objects.bulk_create([
+            Order(customer=rng.choice(customers), total_amount=0)
+            for _ in range(min(per_chunk, orders - start))
+        ])
+        items = []
+        for order in created:
+            for product_id, price in rng.sample(products, ITEMS_PER_ORDER):
+                items.append(OrderItem(order=order, product_id=product_id, quantity=rng.randint(1, 5), price_at_purchase=price))
+        OrderItem.objects.bulk_create(items)
+    # Orders are bulk-created, so the report counters have to be caught up by hand
+    rebuild_sales_counters()
+    return orders * ITEMS_PER_ORDER
+
+
+def seed_carts(users, products):
+    rng = random.Random(44)
+    CartItem.objects.bulk_create(
+        [
+            CartItem(user=user, product_id=product_id, quantity=rng.randint(1, 3))
+            for user in users
+            for product_id, _ in rng.sample(products, CART_LINES)
+        ],
+        batch_size=CHUNK,
+    )
+
+
+def measure(requests, uncached=False):
+    """Send each (method, url, data, headers) in turn; latency, throughput and queries per request."""
+    client = APIClient()
+    samples, queries, errors, elapsed = [], [], 0, 0.0
+    for method, url, data, headers in requests:
+        if uncached:
+            cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            response = getattr(client, method)(url, data, headers=headers)
+            took = time.perf_counter() - start
+        elapsed += took
+        samples.append(took)
+        queries.append(len(ctx.captured_queries))
+        errors += response.status_code >= 400
+    return {
+        **summarize(samples),
+        'requests_per_s': round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        'errors': errors,
+        'queries': {'min': min(queries), 'mean': round(sum(queries) / len(queries), 1), 'max': max(queries)},
+    }
+
+
+def run(scale=1.0):
+    requests = scaled(200, scale)
+    seed_start = time.perf_counter()
+    products, categories = seed_products(scaled(100000, scale))
+    customers = User.objects.bulk_create([User(username=f'bench-api-customer-{i}') for i in range(scaled(1000, scale))])
+    order_items = seed_orders(scaled(1000000, scale), customers, products)
+    shopper = User.objects.create_user(username='bench-api-shopper', password='pass')
+    buyers = User.objects.bulk_create([User(username=f'bench-api-buyer-{i}') for i in range(requests)])
+    seed_carts([shopper, *buyers], products)
+    manager = User.objects.create_user(username='bench-api-manager', password='pass', role='manager')
+    seed_seconds = round(time.perf_counter() - seed_start, 1)
+
+    def get(url, headers=None, count=requests):
+        return [('get', url, None, headers or {}) for _ in range(count)]
+
+    pages = [f'/api/products/?page_size=20&category={categories[i % CATEGORIES].slug}' for i in range(requests)]
+    searches = [f'/api/products/?search={QUERIES[i % len(QUERIES)]}' for i in range(requests)]
+    reports = bearer(manager)
+    # Warm up the connection and (for the in-process backend) the search index
+    measure(get('/api/products/?page_size=20', count=1) + get('/api/products/?search=warmup', count=1))
+
+    results = {
+        'product_list': measure(get('/api/products/?page_size=20')),
+        'product_list_uncached': measure([('get', url, None, {}) for url in pages], uncached=True),
+        'product_search': measure([('get', url, None, {}) for url in searches]),
+        'product_search_uncached': measure([('get', url, None, {}) for url in searches], uncached=True),
+        'cart_list': measure(get('/api/cart/', bearer(shopper))),
+        'checkout': measure([('post', '/api/cart/checkout/', {}, bearer(buyer)) for buyer in buyers]),
+        'sales_by_product': measure(get('/api/reports/sales-by-product/', reports, scaled(20, scale))),
+        # A date range aggregates OrderItem directly instead of reading the counters
+        'sales_by_product_range': measure(get('/api/reports/sales-by-product/?date_from=2000-01-01', reports, scaled(5, scale))),
+    }
+    return {
+        'fixtures': {
+            'products': len(products),
+            'order_items': order_items,
+            'cart_lines': CART_LINES,
+            'seed_s': seed_seconds,
+        },
+        'requests': requests,
+        'endpoints': results,
+    }
@@ -0,0 +1,101 @@
+"""
+Read endpoints at high concurrency: the WSGI handler on a thread pool vs the
+ASGI handler on one event loop, with the regular DRF views (each request
+thread-hopped through sync_to_async) and with the native async views
+(ASYNC_READ_VIEWS, store/async_views.py).
+
+Everything runs in-process through the test clients' handlers, so it
+measures the request stack (middleware, routing, views, ORM, serialization)
+rather than a web server's socket handling. For a full end-to-end run point
+a load generator at uvicorn/gunicorn instead (see README).
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.db import connections
+from django.test import AsyncClient, Client, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from store.models import CartItem, Category, Product, User
+from .base import scaled, summarize
+
+ENDPOINTS = {
+    'product_list': '/api/products/?page_size=20',
+    'category_list': '/api/categories/',
+    'cart': '/api/cart/',
+}
+URLCONFS = {
+    'wsgi': 'grocery_backend.urls',
+    'asgi_sync_views': 'grocery_backend.urls',
+    'asgi_async_views': 'grocery_backend.asgi_urls',
+}
+
+
+def seed(products):
+    category = Category.objects.create(name='BENCH ASGI')
+    created = Product.objects.bulk_create(
+        [
+            Product(name=f'Bench asgi product {i}', slug=f'bench-asgi-product-{i}', category=category,
+                    price=Decimal('1.99'), stock=100)
+            for i in range(products)
+        ],
+        batch_size=2000,
+    )
+    user = User.objects.create_user(username='bench-asgi', password='pass')
+    CartItem.objects.bulk_create([CartItem(user=user, product=p, quantity=1) for p in created[:10]])
+    return {'Authorization': f'Bearer {AccessToken.for_user(user)}'}
+
+
+def result(samples, elapsed, errors):
+    return {**summarize(samples), 'errors': errors, 'requests_per_s': round(len(samples) / elapsed, 1)}
+
+
+def run_wsgi(url, headers, requests, concurrency):
+    def request(_):
+        start = time.perf_counter()
+        response = Client().get(url, headers=headers)
+        return time.perf_counter() - start, response.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(request, range(requests)))
+    elapsed = time.perf_counter() - start
+    connections.close_all()
+    return result([t for t, _ in outcomes], elapsed, sum(code != 200 for _, code in outcomes))
+
+
+def run_asgi(url, headers, requests, concurrency):
+    async def main():
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def request():
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get(url, headers=headers)
+                return time.perf_counter() - start, response.status_code
+
+        start = time.perf_counter()
+        outcomes = await asyncio.gather(*[request() for _ in range(requests)])
+        return outcomes, time.perf_counter() - start
+
+    outcomes, elapsed = asyncio.run(main())
+    return result([t for t, _ in outcomes], elapsed, sum(code != 200 for _, code in outcomes))
+
+
+def run(scale=1.0, concurrency=64):
+    requests = scaled(2000, scale)
+    headers = seed(scaled(2000, scale))
+    results = {'requests': requests, 'concurrency': concurrency, 'endpoints': {}}
+    for endpoint, url in ENDPOINTS.items():
+        auth = headers if endpoint == 'cart' else {}
+        modes = {}
+        for mode, urlconf in URLCONFS.items():
+            runner = run_wsgi if mode == 'wsgi' else run_asgi
+            with override_settings(ROOT_URLCONF=urlconf):
+                runner(url, auth, min(requests, 50), concurrency)  # warm up caches/connections
+                modes[mode] = runner(url, auth, requests, concurrency)
+        results['endpoints'][endpoint] = modes
+    return results
@@ -0,0 +1,41 @@
+"""
+Bulk import/export throughput (rows/s): a fresh import, the same file again
+(every row becomes an update) and a full streaming export.
+"""
+import io
+import time
+
+from store.bulk import export_products, import_products
+from store.models import Category
+from .base import scaled
+
+
+def make_csv(rows, categories):
+    out = io.StringIO()
+    out.write('name,category,price,stock\n')
+    for i in range(rows):
+        out.write(f'Supplier item {i},{categories[i % len(categories)]},{i % 50 + 0.99},{i % 200}\n')
+    return out.getvalue()
+
+
+def throughput(rows, fn):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    return result, {'rows': rows, 'seconds': round(elapsed, 3), 'rows_per_second': round(rows / elapsed) if elapsed else None}
+
+
+def run(scale=1.0):
+    rows = scaled(50000, scale)
+    categories = [Category.objects.create(name=f'BENCH BULK {i}').slug for i in range(20)]
+    data = make_csv(rows, categories)
+
+    summary, created = throughput(rows, lambda: import_products(io.StringIO(data), 'csv'))
+    _, updated = throughput(rows, lambda: import_products(io.StringIO(data), 'csv'))
+    _, exported = throughput(rows, lambda: sum(1 for _ in export_products('csv')))
+    return {
+        'rejected_rows': len(summary['errors']),
+        'import_new': created,
+        'import_update': updated,
+        'export_csv': exported,
+    }
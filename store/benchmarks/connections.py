@@ -0,0 +1,56 @@
+"""
+Per-request cost of opening a database connection.
+
+Replays a small authenticated endpoint (the cart) the way the request
+handler does it, closing/keeping the connection between requests according
+to CONN_MAX_AGE, and compares that with a persistent connection. Only
+meaningful on a networked database: Django never closes in-memory SQLite
+connections.
+"""
+from django.db import close_old_connections, connection
+from rest_framework.test import APIClient
+
+from store.models import CartItem, Category, Product, User
+from .base import scaled, summarize, timed
+
+
+def seed():
+    user = User.objects.create_user(username='bench-connections', password='pass')
+    category = Category.objects.create(name='BENCH CONNECTIONS')
+    product = Product.objects.create(name='Bench connection product', category=category, price=1, stock=10)
+    CartItem.objects.create(user=user, product=product, quantity=1)
+    return user
+
+
+def replay(client, requests, max_age):
+    connection.close()
+    connection.settings_dict['CONN_MAX_AGE'] = max_age
+
+    def request():
+        # The test client disables the handler's connection cleanup, do it by hand
+        close_old_connections()
+        client.get('/api/cart/')
+        close_old_connections()
+
+    return summarize(timed(request, repeat=requests))
+
+
+def run(scale=1.0):
+    requests = scaled(500, scale)
+    user = seed()
+    client = APIClient()
+    client.force_authenticate(user)
+    original = connection.settings_dict['CONN_MAX_AGE']
+    try:
+        connect = summarize(timed(lambda: (connection.close(), connection.ensure_connection()), repeat=scaled(100, scale)))
+        fresh = replay(client, requests, 0)
+        persistent = replay(client, requests, 600)
+    finally:
+        connection.settings_dict['CONN_MAX_AGE'] = original
+    return {
+        'requests': requests,
+        'connect': connect,
+        'conn_max_age_0': fresh,
+        'conn_max_age_600': persistent,
+        'overhead_p50_ms': round(fresh['p50_ms'] - persistent['p50_ms'], 3),
+    }
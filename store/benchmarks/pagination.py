@@ -0,0 +1,60 @@
+"""
+Product listing at increasing page depths: cursor pagination vs the
+LIMIT/OFFSET query it replaces. Cursor pages should stay flat, OFFSET
+pages grow with depth.
+"""
+from decimal import Decimal
+
+from rest_framework.test import APIClient
+
+from store.models import Category, Product
+from .base import scaled, summarize, timed
+
+
+def seed(count):
+    category = Category.objects.create(name='BENCH PAGINATION')
+    Product.objects.bulk_create(
+        [
+            Product(name=f'Bench product {i}', slug=f'bench-product-{i}', category=category,
+                    price=Decimal('9.99'), stock=100)
+            for i in range(count)
+        ],
+        batch_size=2000,
+    )
+
+
+def run(scale=1.0):
+    products = scaled(40000, scale)
+    page_size = 50
+    pages = products // page_size
+    depths = sorted({1, max(1, pages // 10), max(1, pages // 2), pages})
+    seed(products)
+
+    client = APIClient()
+    url = f'/api/products/?page_size={page_size}&fields=id,name,slug,price,stock'
+    cursor_ms = {}
+    depth = 0
+    while url and depth < pages:
+        depth += 1
+        next_url = {}
+
+        def fetch(url=url):
+            next_url['url'] = client.get(url).data['next']
+
+        samples = timed(fetch, repeat=3 if depth in depths else 1)
+        if depth in depths:
+            cursor_ms[depth] = summarize(samples)
+        url = next_url['url']
+
+    offset_ms = {}
+    qs = Product.objects.order_by('-created_at', '-id').values('id', 'name', 'slug', 'price', 'stock')
+    for page in depths:
+        start = (page - 1) * page_size
+        offset_ms[page] = summarize(timed(lambda: list(qs[start:start + page_size]), repeat=3))
+
+    return {
+        'products': products,
+        'page_size': page_size,
+        'cursor_api': cursor_ms,
+        'offset_query': offset_ms,
+    }
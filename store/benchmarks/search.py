@@ -0,0 +1,55 @@
+"""
+?search= latency: the old ``name__icontains`` filter vs the search backend
+(ranked tsvector/trigram on Postgres, the in-process inverted index elsewhere).
+"""
+import random
+from decimal import Decimal
+
+from store.models import Category, Product
+from store.search import get_search_backend
+from .base import scaled, summarize, timed
+
+ADJECTIVES = ['fresh', 'organic', 'green', 'red', 'frozen', 'dried', 'sweet', 'spicy', 'baby', 'wild']
+NOUNS = ['apple', 'banana', 'carrot', 'tomato', 'spinach', 'mango', 'almond', 'cheddar', 'yogurt', 'salmon',
+         'bread', 'rice', 'lentil', 'pepper', 'onion', 'garlic', 'grape', 'orange', 'lemon', 'potato']
+BRANDS = ['acme', 'farmco', 'daily', 'greenleaf', 'harvest', 'sunny', 'valley', 'northern']
+QUERIES = ['app', 'apple', 'organic ban', 'sal', 'greenleaf tom', 'zzz']
+
+
+def seed(count):
+    rng = random.Random(42)
+    category = Category.objects.create(name='BENCH SEARCH')
+    Product.objects.bulk_create(
+        [
+            Product(
+                name=f'{rng.choice(BRANDS).title()} {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i}',
+                slug=f'bench-search-{i}', category=category, price=Decimal('1.99'), stock=10,
+            )
+            for i in range(count)
+        ],
+        batch_size=2000,
+    )
+
+
+def run(scale=1.0):
+    products = scaled(100000, scale)
+    seed(products)
+    backend = get_search_backend()
+    backend.reset()
+
+    base = Product.objects.order_by('-created_at')
+    # First search pays for building the index when using the in-process backend
+    warmup_ms = summarize(timed(lambda: list(backend.search(base, 'warmup')[:20])))
+
+    results = {}
+    for query in QUERIES:
+        results[query] = {
+            'icontains': summarize(timed(lambda: list(base.filter(name__icontains=query)[:20]), repeat=10)),
+            'backend': summarize(timed(lambda: list(backend.search(base, query).order_by('-search_rank', '-id')[:20]), repeat=10)),
+        }
+    return {
+        'products': products,
+        'backend': type(backend).__name__,
+        'first_search': warmup_ms,
+        'queries': results,
+    }
@@ -0,0 +1,167 @@
+"""
+Bulk product import/export, shared by the import_products/export_products
+management commands and the manager-only /api/products/import|export/ actions.
+
+Imports are read as a stream of CSV or NDJSON rows (name, category, price,
+stock) and upserted by slug in chunks with one INSERT ... ON CONFLICT per
+chunk. Bad rows are reported by line number and skipped, the rest goes in.
+Like every bulk write this bypasses Product.save() and its signals, so the
+caches that depend on them are refreshed (and stock events queued for the
+low-stock alerts) explicitly per chunk.
+"""
+import codecs
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils.text import slugify
+
+from .alerts import record_stock_changes
+from .cache import invalidate_products
+from .categories import refresh_category_counts
+from .models import Category, Product
+from .reports import EXPORT_FORMATS
+from .search import get_search_backend
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+EXPORT_COLUMNS = ['name', 'slug', 'category', 'price', 'stock']
+DEFAULT_CHUNK_SIZE = 1000
+MAX_PRICE = Decimal('99999999.99')  # Product.price is DecimalField(10, 2)
+
+
+def read_rows(lines, file_format):
+    """(line number, row dict, parse error) for each record in an iterable of text lines."""
+    if file_format == 'csv':
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row, None
+        return
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield number, None, "Invalid JSON."
+            continue
+        if not isinstance(row, dict):
+            yield number, None, "Expected a JSON object."
+            continue
+        yield number, row, None
+
+
+def decode_lines(stream):
+    """Text lines from a binary file/upload, without reading it all into memory."""
+    return codecs.iterdecode(stream, 'utf-8-sig')
+
+
+class CategoryResolver:
+    """Every category, loaded once, matched by name or slug (case-insensitive)."""
+
+    def __init__(self):
+        self.lookup = {}
+        for pk, name, slug in Category.objects.values_list('id', 'name', 'slug'):
+            self.lookup[name.lower()] = pk
+            self.lookup[slug] = pk
+
+    def resolve(self, value):
+        value = (value or '').strip().lower()
+        return self.lookup.get(value) or self.lookup.get(slugify(value))
+
+
+def clean_row(row, categories):
+    """A Product ready for bulk_create, or a dict of field errors."""
+    errors = {}
+    name = str(row.get('name') or '').strip()
+    slug = slugify(name)
+    if not name:
+        errors['name'] = "This field is required."
+    elif len(name) > 255:
+        errors['name'] = "Ensure this field has no more than 255 characters."
+    elif not slug:
+        errors['name'] = "Name must contain letters or digits."
+    elif row.get('slug') and row['slug'] != slug:
+        errors['slug'] = f"Slug is derived from the name and must be '{slug}'."
+
+    category_id = None
+    if row.get('category'):
+        category_id = categories.resolve(str(row['category']))
+        if category_id is None:
+            errors['category'] = f"Unknown category '{row['category']}'."
+
+    try:
+        price = Decimal(str(row.get('price'))).quantize(Decimal('0.01'))
+        if price < 0 or price > MAX_PRICE:
+            errors['price'] = "Price must be between 0 and 99999999.99."
+    except (InvalidOperation, ValueError):
+        errors['price'] = "A valid number is required."
+
+    try:
+        stock = int(str(row.get('stock', 0) or 0))
+        if stock < 0:
+            errors['stock'] = "Stock can't be negative."
+    except ValueError:
+        errors['stock'] = "A valid integer is required."
+
+    if errors:
+        return errors
+    return Product(name=name, slug=slug, category_id=category_id, price=price, stock=stock)
+
+
+def _write_chunk(products):
+    with transaction.atomic():
+        Product.objects.bulk_create(
+            products,
+            update_conflicts=True,
+            unique_fields=['slug'],
+            update_fields=['name', 'category', 'price', 'stock', 'updated_at'],
+        )
+        record_stock_changes([p.pk for p in products if p.pk], 'import')
+    invalidate_products([p.pk for p in products if p.pk])
+
+
+def import_products(lines, file_format='csv', chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Upsert products from an iterable of text lines. Returns a summary:
+    {'rows': n, 'imported': n, 'errors': [{'line': n, 'errors': {...}}]}
+    """
+    if file_format not in IMPORT_FORMATS:
+        raise ValueError(f"Unsupported format '{file_format}'.")
+    categories = CategoryResolver()
+    summary = {'rows': 0, 'imported': 0, 'errors': []}
+    chunk = {}
+    for line, row, error in read_rows(lines, file_format):
+        summary['rows'] += 1
+        product = {'row': error} if error else clean_row(row, categories)
+        if not isinstance(product, Product):
+            summary['errors'].append({'line': line, 'errors': product})
+            continue
+        # Later rows win within a chunk (ON CONFLICT can't touch a row twice)
+        chunk[product.slug] = product
+        if len(chunk) >= chunk_size:
+            _write_chunk(list(chunk.values()))
+            summary['imported'] += len(chunk)
+            chunk = {}
+    if chunk:
+        _write_chunk(list(chunk.values()))
+        summary['imported'] += len(chunk)
+    if summary['imported']:
+        # The in-process search index (if any) reloads itself on the next search
+        get_search_backend().reset()
+        # bulk_create skips the signals that keep the category counts current
+        refresh_category_counts()
+    return summary
+
+
+def export_rows():
+    rows = Product.objects.order_by('id').values('name', 'slug', 'category__name', 'price', 'stock')
+    for row in rows.iterator(chunk_size=2000):
+        row['category'] = row.pop('category__name') or ''
+        yield row
+
+
+def export_products(file_format='csv'):
+    """Chunks of text for the whole catalogue, straight from a server-side cursor."""
+    stream, _ = EXPORT_FORMATS[file_format]
+    return stream(export_rows(), EXPORT_COLUMNS)
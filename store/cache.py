@@ -0,0 +1,178 @@
+"""
+Response cache for the public catalogue (product/category list + detail).
+
+Cached responses are keyed on the request path + query params *and* on a set
+of version tokens ("products", "product:<id>", "categories", "category-counts").
+Writes never delete cached responses, they just bump the relevant tokens (from
+the signals in store/signals.py, and explicitly for the queryset .update()
+paths that bypass signals), so stale entries become unreachable and expire on
+their own.
+
+The same tokens give us cheap ETags: a conditional request is answered with
+a 304 after a single cache lookup, without touching the cached body.
+acached_response is the same thing for the async read views.
+
+Tokens start with the time they were made: a response built less than
+DB_REPLICA_PIN_SECONDS after its data changed is read from the primary, not
+a replica that may not have the change yet (store/routers.py).
+"""
+import hashlib
+import time
+import uuid
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.response import Response
+
+from .routers import replica_reads
+
+PRODUCTS = 'products'
+CATEGORIES = 'categories'
+# Only the category tree shows the product counts (store/categories.py)
+CATEGORY_COUNTS = 'category-counts'
+
+
+def product_key(product_id):
+    return f'product:{product_id}'
+
+
+def _version_key(name):
+    return f'catalogue:version:{name}'
+
+
+def _new_token():
+    return f'{time.time():.3f}:{uuid.uuid4().hex}'
+
+
+def _reads_for(versions):
+    # Primary-only reads while any of the versions is younger than the replica lag allowance
+    if settings.DATABASE_REPLICAS:
+        cutoff = time.time() - settings.DB_REPLICA_PIN_SECONDS
+        if any(float(version.partition(':')[0]) > cutoff for version in versions if ':' in version):
+            return replica_reads(False)
+    return nullcontext()
+
+
+def get_versions(names):
+    keys = [_version_key(name) for name in names]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            # Never seen (or evicted): start from a fresh random token so
+            # responses cached under an older token can't come back.
+            cache.add(key, _new_token(), None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def _bump(names):
+    cache.set_many({_version_key(name): _new_token() for name in names}, None)
+
+
+def bump(*names):
+    names = set(names)
+    if not names:
+        return
+    _bump(names)
+    # Bump again once the write is visible to other connections, so a
+    # request that re-cached the old rows in between doesn't stick.
+    transaction.on_commit(lambda: _bump(names))
+
+
+def invalidate_products(product_ids=()):
+    bump(PRODUCTS, *[product_key(pid) for pid in product_ids])
+
+
+def invalidate_category(category):
+    # Products embed their category (and its path, which a rename or move
+    # changes for the whole subtree): listings are keyed on "products" and
+    # product details on "categories" too, so no need to look them up
+    bump(CATEGORIES, PRODUCTS)
+
+
+async def aget_versions(names):
+    keys = [_version_key(name) for name in names]
+    found = await cache.aget_many(keys)
+    for key in keys:
+        if key not in found:
+            await cache.aadd(key, _new_token(), None)
+            found[key] = await cache.aget(key)
+    return [found[key] for key in keys]
+
+
+def _response_token(request, versions, namespace=''):
+    params = sorted((k, v) for k, values in request.GET.lists() for v in values)
+    return hashlib.md5(repr((namespace, request.path, params, versions)).encode()).hexdigest()
+
+
+def _is_fresh(request, etag):
+    return etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]
+
+
+def _add_cache_headers(response, etag):
+    response['ETag'] = etag
+    # Let clients keep their copy but revalidate it with If-None-Match every time
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+def cached_response(request, version_names, build):
+    """
+    Serve `build()`'s response from the cache when possible. Only successful
+    responses are cached; anything else passes straight through.
+    """
+    versions = get_versions(version_names)
+    token = _response_token(request, versions)
+    etag = f'"{token}"'
+
+    if _is_fresh(request, etag):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+    key = f'catalogue:response:{token}'
+    data = cache.get(key)
+    if data is None:
+        with _reads_for(versions):
+            response = build()
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        cache.set(key, response.data, settings.CATALOGUE_CACHE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+    else:
+        response = Response(data)
+        response['X-Cache'] = 'HIT'
+    return _add_cache_headers(response, etag)
+
+
+async def acached_response(request, version_names, build):
+    """
+    cached_response for the async views (store/async_views.py): `build` is a
+    coroutine function returning a rendered HttpResponse, and the rendered
+    bytes are what gets cached. Their pagination links differ from the DRF
+    views', so they get their own cache entries.
+    """
+    versions = await aget_versions(version_names)
+    token = _response_token(request, versions, namespace='async')
+    etag = f'"{token}"'
+
+    if _is_fresh(request, etag):
+        response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        response['ETag'] = etag
+        return response
+
+    key = f'catalogue:response:{token}'
+    content = await cache.aget(key)
+    if content is None:
+        with _reads_for(versions):
+            response = await build()
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        await cache.aset(key, response.content, settings.CATALOGUE_CACHE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+    else:
+        response = HttpResponse(content, content_type='application/json')
+        response['X-Cache'] = 'HIT'
+    return _add_cache_headers(response, etag)
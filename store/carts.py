@@ -0,0 +1,384 @@
+"""
+Cart storage behind CartViewSet, chosen with CART_BACKEND.
+
+DatabaseCartBackend keeps every line as a CartItem row (the default).
+CacheCartBackend keeps each cart as a single entry in the CART_CACHE cache
+alias (Redis in production, so every worker sees the same carts; locmem in
+the tests), so adding to or changing a cart doesn't write to Postgres at
+all. CartItem is then only touched according to CART_DURABILITY:
+
+- "checkout": carts exist only in the cache until they're checked out. A
+  cart the cache loses (eviction, restart without persistence, CART_TTL
+  passing without a change) is gone.
+- "write_behind": after every change CART_WRITER copies the cart to its
+  CartItem rows in the background, so a lost cache entry is reloaded from
+  the database, a few moments behind at worst.
+
+Checkout first claims the cart (outside the order's transaction): its lines
+move aside under a claim id, so a second checkout of the same cart (a double
+click, a retry) finds it empty, and a failed checkout puts them back.
+
+Switching over needs no migration step: a cart that isn't in the cache yet
+is loaded from the user's CartItem rows the first time it's used (keeping
+the line ids), and in "checkout" mode those rows are then deleted. To go
+back to DatabaseCartBackend, run in "write_behind" mode for a while first.
+"""
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException
+
+from .models import CartItem, Product
+
+logger = logging.getLogger(__name__)
+
+CHECKOUT = 'checkout'
+WRITE_BEHIND = 'write_behind'
+ALREADY_IN_CART = "Product is already in the cart."
+LOCK_TIMEOUT = 5
+# A claim whose checkout never finished (the worker died) is given back after this
+CLAIM_TIMEOUT = 60
+
+
+class CartBusy(APIException):
+    # Another request held the cart's lock for all of LOCK_TIMEOUT
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "The cart is being changed by another request, try again."
+    default_code = 'cart_busy'
+
+
+def _cart_queryset(user_id):
+    from .views import cart_queryset  # views imports this module
+
+    return cart_queryset(user_id)
+
+
+def _product_queryset():
+    from .views import product_queryset
+
+    return product_queryset()
+
+
+class DatabaseCartBackend:
+    """Every cart line is a CartItem row."""
+
+    def lines(self, user_id):
+        return list(_cart_queryset(user_id))
+
+    def get_line(self, user_id, line_id):
+        return _cart_queryset(user_id).filter(id=line_id).first()
+
+    def add(self, user_id, product, quantity):
+        try:
+            with transaction.atomic():
+                return CartItem.objects.create(user_id=user_id, product=product, quantity=quantity)
+        except IntegrityError:
+            raise serializers.ValidationError(ALREADY_IN_CART)
+
+    def update(self, user_id, item, product, quantity):
+        item.product, item.quantity = product, quantity
+        try:
+            with transaction.atomic():
+                item.save()
+        except IntegrityError:
+            raise serializers.ValidationError(ALREADY_IN_CART)
+        return item
+
+    def remove(self, user_id, line_id):
+        return CartItem.objects.filter(user_id=user_id, id=line_id).delete()[0] > 0
+
+    def set_quantities(self, user_id, quantities):
+        """{product_id: quantity} in at most two statements; 0 removes the product."""
+        removed = [pid for pid, quantity in quantities.items() if not quantity]
+        with transaction.atomic():
+            if removed:
+                CartItem.objects.filter(user_id=user_id, product_id__in=removed).delete()
+            _upsert_rows(user_id, {pid: quantity for pid, quantity in quantities.items() if quantity})
+
+    def claim(self, user_id):
+        # Nothing to do: checkout_lines locks the rows, so a second checkout
+        # waits for the first and then finds them gone
+        return None
+
+    def release(self, user_id, claim):
+        pass
+
+    def checkout_lines(self, user_id, claim):
+        # Lock the cart lines and their products in one go (ordered by product
+        # to keep lock acquisition deterministic between concurrent checkouts)
+        return list(
+            CartItem.objects.filter(user_id=user_id)
+            .select_related('product')
+            .select_for_update(of=('self', 'product'))
+            .order_by('product_id')
+        )
+
+    def clear(self, user_id, claim):
+        CartItem.objects.filter(user_id=user_id).delete()
+
+
+class CacheCartBackend:
+    """
+    Each cart is one cache entry: {'next_id': int, 'lines': {product_id: line}}
+    where a line is {'id', 'quantity', 'added_at'}, plus, while it's being
+    checked out, 'checkout': {'id', 'expires', 'lines'}. Read-modify-write cycles
+    hold a short per-cart lock (cache.add), so concurrent requests from the
+    same user don't lose each other's changes.
+    """
+
+    @property
+    def cache(self):
+        return caches[settings.CART_CACHE]
+
+    def _key(self, user_id):
+        return f'cart:{user_id}'
+
+    @contextmanager
+    def _locked(self, user_id):
+        key = f'{self._key(user_id)}:lock'
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        # A holder that died leaves the lock to expire after LOCK_TIMEOUT
+        while not self.cache.add(key, token, LOCK_TIMEOUT):
+            if time.monotonic() >= deadline:
+                raise CartBusy()
+            time.sleep(0.01)
+        try:
+            yield
+        finally:
+            # Only release our own lock: if we overran LOCK_TIMEOUT it may
+            # have expired and been taken by another request since
+            if self.cache.get(key) == token:
+                self.cache.delete(key)
+
+    def snapshot(self, user_id):
+        """The cached cart, or None if it isn't cached."""
+        return self.cache.get(self._key(user_id))
+
+    def _save(self, user_id, cart):
+        self.cache.set(self._key(user_id), cart, settings.CART_TTL)
+
+    def _load(self, user_id):
+        cart = self.snapshot(user_id)
+        if cart is None:
+            # First use since switching backends, or the entry was lost: start
+            # from the CartItem rows, keeping their ids
+            rows = list(CartItem.objects.filter(user_id=user_id).values('id', 'product_id', 'quantity', 'added_at'))
+            cart = {
+                'next_id': max((row['id'] for row in rows), default=0) + 1,
+                'lines': {row.pop('product_id'): row for row in rows},
+            }
+            if rows and settings.CART_DURABILITY == CHECKOUT:
+                CartItem.objects.filter(user_id=user_id).delete()
+            self._save(user_id, cart)
+        claim = cart.get('checkout')
+        if claim and claim['expires'] < time.time():
+            self._restore(cart)
+            self._save(user_id, cart)
+        return cart
+
+    def _restore(self, cart):
+        # Claimed lines go back; anything added to the product meanwhile wins
+        claim = cart.pop('checkout')
+        cart['lines'] = {**claim['lines'], **cart['lines']}
+
+    def _changed(self, user_id, cart):
+        self._save(user_id, cart)
+        if settings.CART_DURABILITY == WRITE_BEHIND:
+            get_cart_writer().submit(user_id)
+
+    def _item(self, user_id, product, line):
+        return CartItem(id=line['id'], user_id=user_id, product=product, quantity=line['quantity'], added_at=line['added_at'])
+
+    def _items(self, user_id, lines, products):
+        # Lines whose product has since been deleted just drop out
+        ordered = sorted(lines.items(), key=lambda entry: (entry[1]['added_at'], entry[1]['id']))
+        return [self._item(user_id, products[pid], line) for pid, line in ordered if pid in products]
+
+    def lines(self, user_id):
+        lines = self._load(user_id)['lines']
+        return self._items(user_id, lines, _product_queryset().in_bulk(list(lines)) if lines else {})
+
+    def get_line(self, user_id, line_id):
+        for product_id, line in self._load(user_id)['lines'].items():
+            if line['id'] == int(line_id):
+                product = _product_queryset().filter(id=product_id).first()
+                return product and self._item(user_id, product, line)
+        return None
+
+    def add(self, user_id, product, quantity):
+        with self._locked(user_id):
+            cart = self._load(user_id)
+            if product.id in cart['lines']:
+                raise serializers.ValidationError(ALREADY_IN_CART)
+            line = cart['lines'][product.id] = {'id': cart['next_id'], 'quantity': quantity, 'added_at': timezone.now()}
+            cart['next_id'] += 1
+            self._changed(user_id, cart)
+        return self._item(user_id, product, line)
+
+    def update(self, user_id, item, product, quantity):
+        with self._locked(user_id):
+            cart = self._load(user_id)
+            lines = cart['lines']
+            line = lines.pop(item.product_id, None)
+            if line is None or line['id'] != item.id:
+                # Removed (or re-added under another id) since we read it
+                raise serializers.ValidationError("Cart line no longer exists.")
+            if product.id in lines:
+                raise serializers.ValidationError(ALREADY_IN_CART)
+            line['quantity'] = quantity
+            lines[product.id] = line
+            self._changed(user_id, cart)
+        return self._item(user_id, product, line)
+
+    def remove(self, user_id, line_id):
+        with self._locked(user_id):
+            cart = self._load(user_id)
+            for product_id, line in cart['lines'].items():
+                if line['id'] == int(line_id):
+                    del cart['lines'][product_id]
+                    self._changed(user_id, cart)
+                    return True
+        return False
+
+    def set_quantities(self, user_id, quantities):
+        with self._locked(user_id):
+            cart = self._load(user_id)
+            lines = cart['lines']
+            for product_id, quantity in quantities.items():
+                if not quantity:
+                    lines.pop(product_id, None)
+                elif product_id in lines:
+                    lines[product_id]['quantity'] = quantity
+                else:
+                    lines[product_id] = {'id': cart['next_id'], 'quantity': quantity, 'added_at': timezone.now()}
+                    cart['next_id'] += 1
+            self._changed(user_id, cart)
+
+    def claim(self, user_id):
+        """
+        Take the cart's lines out for checkout; call before the order's
+        transaction starts (loading the cart may delete migrated rows, which
+        mustn't roll back with a failed order). Returns the claim, whose lines
+        are empty if the cart is empty or another checkout already has it.
+        """
+        with self._locked(user_id):
+            cart = self._load(user_id)
+            claim = {'id': uuid.uuid4().hex, 'expires': time.time() + CLAIM_TIMEOUT, 'lines': {}}
+            if 'checkout' not in cart:
+                claim['lines'], cart['lines'] = cart['lines'], {}
+                cart['checkout'] = claim
+                self._save(user_id, cart)
+        return claim
+
+    def release(self, user_id, claim):
+        """The order wasn't placed: put the claimed lines back."""
+        with self._locked(user_id):
+            cart = self.snapshot(user_id)
+            if cart and cart.get('checkout', {}).get('id') == claim['id']:
+                self._restore(cart)
+                self._save(user_id, cart)
+
+    def checkout_lines(self, user_id, claim):
+        lines = claim['lines']
+        products = Product.objects.select_for_update().order_by('id').in_bulk(list(lines)) if lines else {}
+        return self._items(user_id, lines, products)
+
+    def clear(self, user_id, claim):
+        def done():
+            with self._locked(user_id):
+                cart = self.snapshot(user_id)
+                if cart and cart.get('checkout', {}).get('id') == claim['id']:
+                    del cart['checkout']
+                    # Saved rather than deleted, so rows a write-behind is
+                    # still writing can't be loaded back into the cart
+                    self._changed(user_id, cart)
+
+        # Only once the order is in: a failed checkout gets its lines back (release)
+        transaction.on_commit(done)
+
+
+def _upsert_rows(user_id, quantities):
+    # One INSERT ... ON CONFLICT (user, product) DO UPDATE for the lot
+    CartItem.objects.bulk_create(
+        [CartItem(user_id=user_id, product_id=pid, quantity=quantity) for pid, quantity in quantities.items()],
+        update_conflicts=True, unique_fields=['user', 'product'], update_fields=['quantity', 'updated_at'],
+    )
+
+
+def write_cart_rows(user_id):
+    """Make the user's CartItem rows match their cached cart (write-behind)."""
+    cart = CacheCartBackend().snapshot(user_id)
+    if cart is None:
+        return
+    # Lines out for checkout stay until the order is in
+    lines = {**cart.get('checkout', {}).get('lines', {}), **cart['lines']}
+    existing = set(Product.objects.filter(id__in=list(lines)).values_list('id', flat=True))
+    with transaction.atomic():
+        CartItem.objects.filter(user_id=user_id).exclude(product_id__in=existing).delete()
+        _upsert_rows(user_id, {pid: line['quantity'] for pid, line in lines.items() if pid in existing})
+
+
+class SyncCartWriter:
+    """Writes the rows in the calling thread. Used by the tests."""
+
+    def submit(self, user_id):
+        write_cart_rows(user_id)
+
+
+class ThreadCartWriter:
+    """
+    Writes rows on a background thread. A cart changed again before its
+    write started is written once, with its latest contents.
+    """
+
+    def __init__(self):
+        self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='cart-writer')
+        self.pending = set()
+        self.lock = threading.Lock()
+
+    def submit(self, user_id):
+        with self.lock:
+            if user_id in self.pending:
+                return
+            self.pending.add(user_id)
+        self.pool.submit(self._run, user_id)
+
+    def _run(self, user_id):
+        with self.lock:
+            # Changes made from here on queue another write
+            self.pending.discard(user_id)
+        try:
+            write_cart_rows(user_id)
+        except Exception:
+            logger.exception("Writing the cart of user %s to the database failed", user_id)
+        finally:
+            close_old_connections()
+
+
+_instances = {}
+
+
+def _get(path):
+    if path not in _instances:
+        _instances[path] = import_string(path)()
+    return _instances[path]
+
+
+def get_cart_backend():
+    return _get(settings.CART_BACKEND)
+
+
+def get_cart_writer():
+    # CART_WRITER is a dotted path to any class with submit(user_id)
+    return _get(settings.CART_WRITER)
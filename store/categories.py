@@ -0,0 +1,68 @@
+"""
+Category tree navigation.
+
+Categories nest through `parent`, and each one keeps its materialised `path`
+("food/fruits/citrus/", see Category.save), so the whole tree comes back in
+one query ordered by path. Each category also carries denormalised
+`product_count`/`in_stock_count` for the products directly in it; they're
+refreshed here whenever a product is added, removed, moved to another
+category or goes in/out of stock, so the navigation menu never has to count
+products itself.
+"""
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .cache import CATEGORY_COUNTS, bump
+from .models import Category, Product
+
+TREE_FIELDS = ('id', 'name', 'slug', 'path', 'parent_id', 'product_count', 'in_stock_count')
+
+
+def _count(**filters):
+    counts = (
+        Product.objects.filter(category=OuterRef('pk'), **filters)
+        .order_by().values('category').annotate(n=Count('id')).values('n')
+    )
+    return Coalesce(Subquery(counts), 0)
+
+
+def refresh_category_counts(category_ids=None):
+    """Recount the given categories (all of them by default) in one UPDATE."""
+    categories = Category.objects.all()
+    if category_ids is not None:
+        category_ids = {pk for pk in category_ids if pk is not None}
+        if not category_ids:
+            return
+        categories = categories.filter(id__in=category_ids)
+    categories.update(product_count=_count(), in_stock_count=_count(stock__gt=0))
+    bump(CATEGORY_COUNTS)
+
+
+def category_tree():
+    """
+    Every category as nested dicts (roots first, siblings by slug), with
+    `total_product_count`/`total_in_stock_count` covering the whole subtree.
+    """
+    rows = list(Category.objects.order_by('path').values(*TREE_FIELDS))
+    nodes = {
+        row['id']: {
+            **row,
+            'total_product_count': row['product_count'],
+            'total_in_stock_count': row['in_stock_count'],
+            'children': [],
+        }
+        for row in rows
+    }
+    # A child's path is always longer than its parent's, so longest first
+    # adds every subtree's totals in before its parent's are passed up
+    for node in sorted(nodes.values(), key=lambda n: len(n['path']), reverse=True):
+        parent = nodes.get(node['parent_id'])
+        if parent:
+            parent['total_product_count'] += node['total_product_count']
+            parent['total_in_stock_count'] += node['total_in_stock_count']
+
+    roots = []
+    for node in nodes.values():
+        parent = nodes.get(node.pop('parent_id'))
+        (parent['children'] if parent else roots).append(node)
+    return roots
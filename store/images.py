@@ -0,0 +1,137 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.utils.module_loading import import_string
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .cache import invalidate_products
+from .models import ProductImage
+
+logger = logging.getLogger(__name__)
+
+# name -> (max bounding box, Pillow format, file extension)
+RENDITIONS = {
+    'thumbnail': ((160, 160), 'JPEG', 'jpg'),
+    'medium': ((640, 640), 'JPEG', 'jpg'),
+    'webp': ((1200, 1200), 'WEBP', 'webp'),
+}
+
+
+def upload_product_images(product, files):
+    """
+    Push the uploaded files to storage in parallel (bounded by
+    PRODUCT_IMAGE_UPLOAD_WORKERS), then insert all the rows with one query.
+    Each file is streamed straight from the upload handler to the backend.
+    """
+    field = ProductImage._meta.get_field('image')
+
+    def upload(f):
+        name = field.generate_filename(ProductImage(product=product), f.name)
+        return field.storage.save(name, f, max_length=field.max_length)
+
+    workers = max(1, min(len(files), settings.PRODUCT_IMAGE_UPLOAD_WORKERS))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(upload, f) for f in files]
+    names, errors = [], []
+    for future in futures:
+        try:
+            names.append(future.result())
+        except Exception as exc:
+            errors.append(exc)
+    if errors:
+        # Don't leave orphaned objects in the bucket for a failed request
+        for name in names:
+            field.storage.delete(name)
+        raise errors[0]
+
+    created = ProductImage.objects.bulk_create([ProductImage(product=product, image=name) for name in names])
+    invalidate_products([product.id])
+    enqueue_derivatives([obj.id for obj in created])
+    return created
+
+
+def render(original, size, fmt):
+    img = ImageOps.exif_transpose(original)
+    if fmt == 'JPEG' and img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    img.thumbnail(size, Image.LANCZOS)
+    out = BytesIO()
+    img.save(out, fmt, quality=82, optimize=True)
+    return out.getvalue()
+
+
+def generate_derivatives(image_id):
+    """Render every RENDITION of one ProductImage and store them next to the original."""
+    obj = ProductImage.objects.filter(id=image_id).first()
+    if obj is None or not obj.image:
+        return
+    storage = obj.image.storage
+    try:
+        with obj.image.open('rb') as fh, Image.open(fh) as original:
+            original.load()
+            rendered = {name: render(original, size, fmt) for name, (size, fmt, _) in RENDITIONS.items()}
+    except (UnidentifiedImageError, OSError) as exc:
+        logger.warning("Could not generate derivatives for ProductImage %s: %s", image_id, exc)
+        return
+
+    root, _ = os.path.splitext(obj.image.name)
+    names = {}
+    for name, data in rendered.items():
+        ext = RENDITIONS[name][2]
+        names[name] = storage.save(f"{root}_{name}.{ext}", ContentFile(data))
+
+    # The original may have been replaced or deleted while we were rendering
+    if not ProductImage.objects.filter(id=image_id, image=obj.image.name).update(**names):
+        for path in names.values():
+            storage.delete(path)
+        return
+    invalidate_products([obj.product_id])
+
+
+class SyncDerivativeWorker:
+    """Renders in-process, in the calling thread. Used by the tests."""
+
+    def submit(self, image_ids):
+        for image_id in image_ids:
+            generate_derivatives(image_id)
+
+
+class ThreadDerivativeWorker:
+    """Renders on a small background thread pool so uploads return immediately."""
+
+    def __init__(self, max_workers=2):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='image-derivatives')
+
+    def submit(self, image_ids):
+        for image_id in image_ids:
+            self.pool.submit(self._run, image_id)
+
+    def _run(self, image_id):
+        try:
+            generate_derivatives(image_id)
+        except Exception:
+            logger.exception("Derivative generation failed for ProductImage %s", image_id)
+        finally:
+            close_old_connections()
+
+
+_workers = {}
+
+
+def get_derivative_worker():
+    # IMAGE_DERIVATIVE_WORKER is a dotted path to any class with submit(image_ids)
+    # (e.g. a wrapper around a task queue)
+    path = settings.IMAGE_DERIVATIVE_WORKER
+    if path not in _workers:
+        _workers[path] = import_string(path)()
+    return _workers[path]
+
+
+def enqueue_derivatives(image_ids):
+    if image_ids:
+        transaction.on_commit(lambda: get_derivative_worker().submit(image_ids))
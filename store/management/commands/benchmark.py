@@ -0,0 +1,45 @@
+import json
+from importlib import import_module
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from store.benchmarks import SUITES
+
+
+class Command(BaseCommand):
+    help = "Run the store benchmark suites against a scratch database and print JSON results."
+
+    def add_arguments(self, parser):
+        parser.add_argument('suites', nargs='*', help=f"Suites to run (default: all). Available: {', '.join(SUITES)}")
+        parser.add_argument('--scale', type=float, default=1.0, help="Multiply fixture sizes by this factor.")
+        parser.add_argument('--output', help="Write the JSON results to this file instead of stdout.")
+        parser.add_argument('--keepdb', action='store_true', help="Keep the scratch database between runs.")
+
+    def handle(self, *args, **options):
+        names = options['suites'] or list(SUITES)
+        unknown = [name for name in names if name not in SUITES]
+        if unknown:
+            raise CommandError(f"Unknown suite(s): {', '.join(unknown)}")
+
+        # Never seed fixtures into the real database: borrow the test runner's
+        # machinery to create (and afterwards drop) a throwaway one.
+        old_name = connection.settings_dict['NAME']
+        setup_test_environment()
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        results = {'vendor': connection.vendor, 'scale': options['scale'], 'suites': {}}
+        try:
+            for name in names:
+                self.stderr.write(f"Running {name}...")
+                results['suites'][name] = import_module(SUITES[name]).run(scale=options['scale'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        payload = json.dumps(results, indent=2, default=str)
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                fh.write(payload)
+        else:
+            self.stdout.write(payload)
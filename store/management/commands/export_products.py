@@ -0,0 +1,23 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from store.bulk import export_products
+from store.reports import EXPORT_FORMATS
+
+
+class Command(BaseCommand):
+    help = "Stream the whole product catalogue as CSV or NDJSON (the import_products input format)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', dest='file_format', choices=list(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--output', help="Write to this file instead of stdout.")
+
+    def handle(self, *args, **options):
+        out = open(options['output'], 'w', newline='') if options['output'] else sys.stdout
+        try:
+            for chunk in export_products(options['file_format']):
+                out.write(chunk)
+        finally:
+            if out is not sys.stdout:
+                out.close()
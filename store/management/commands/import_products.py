@@ -0,0 +1,32 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.bulk import DEFAULT_CHUNK_SIZE, IMPORT_FORMATS, decode_lines, import_products
+
+
+class Command(BaseCommand):
+    help = "Upsert products (by slug) from a CSV or NDJSON file with name, category, price and stock columns."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or - for stdin.")
+        parser.add_argument('--format', dest='file_format', choices=IMPORT_FORMATS,
+                            help="Defaults to the file extension (.ndjson/.jsonl => ndjson, otherwise csv).")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['file_format'] or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+        try:
+            stream = sys.stdin.buffer if path == '-' else open(path, 'rb')
+        except OSError as exc:
+            raise CommandError(exc)
+        with stream:
+            summary = import_products(decode_lines(stream), file_format, options['chunk_size'])
+
+        for error in summary['errors']:
+            self.stderr.write(f"line {error['line']}: {json.dumps(error['errors'])}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {summary['imported']} of {summary['rows']} rows ({len(summary['errors'])} rejected)."
+        ))
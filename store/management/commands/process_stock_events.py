@@ -0,0 +1,56 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from store.alerts import DEFAULT_BATCH_SIZE, process_stock_events
+
+logger = logging.getLogger(__name__)
+
+# Longest pause between retries after failed batches (with --loop)
+MAX_BACKOFF = 300
+
+
+class Command(BaseCommand):
+    help = "Drain the stock event outbox and send low-stock alerts. Use --loop to keep running as a worker."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true', help="Keep polling for new events instead of exiting once the outbox is empty.")
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds to wait between polls when the outbox is empty (with --loop).")
+
+    def handle(self, *args, **options):
+        totals = {'events': 0, 'alerted': 0, 'cleared': 0}
+        failures = 0
+        while True:
+            try:
+                summary = process_stock_events(options['batch_size'])
+            except Exception:
+                if not options['loop']:
+                    raise
+                # A failed batch rolls back, so its events are still queued:
+                # keep the worker alive and retry, backing off while it keeps failing
+                failures += 1
+                delay = min(options['interval'] * 2 ** (failures - 1), MAX_BACKOFF)
+                logger.exception("Processing stock events failed, retrying in %.0fs.", delay)
+                close_old_connections()  # drops a broken connection, the next poll reconnects
+                time.sleep(delay)
+                continue
+            failures = 0
+            for key in totals:
+                totals[key] += summary[key]
+            if summary['events']:
+                self.stdout.write(
+                    f"Processed {summary['events']} events for {summary['products']} products: "
+                    f"{summary['alerted']} new alerts, {summary['cleared']} cleared."
+                )
+            # A full batch means there's probably more waiting
+            if summary['events'] == options['batch_size']:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {totals['events']} events, {totals['alerted']} new alerts, {totals['cleared']} cleared."
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from store.sales import rebuild_sales_counters
+
+
+class Command(BaseCommand):
+    help = "Recompute the per-product and per-category sales counters from OrderItem."
+
+    def handle(self, *args, **options):
+        products, categories = rebuild_sales_counters()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt sales counters for {products} products and {categories} categories."))
@@ -0,0 +1,202 @@
+"""
+Per-endpoint request metrics, on when METRICS_ENABLED is set.
+
+MetricsMiddleware times every request and counts the queries it runs (and
+the time spent in them), keyed on the resolved URL name, e.g. `cart-checkout`
+or `product-details`. The numbers are aggregated in memory, per process,
+into histograms served in the Prometheus text format at /metrics. With
+METRICS_SLOW_REQUEST_MS set, slower requests are also logged to the
+`store.metrics` logger together with their SQL.
+
+Queries are seen through a database execute wrapper that reports to the
+current request through a context variable, so queries the async views run
+in sync_to_async threads are counted too.
+"""
+import hmac
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import Http404, HttpResponse
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+DB_TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+MAX_LOGGED_QUERIES = 100
+UNRESOLVED = '<unresolved>'
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, labels):
+        lines, cumulative = [], 0
+        for bound, count in zip((*self.buckets, '+Inf'), self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_sum{{{labels}}} {self.sum:.6f}')
+        lines.append(f'{name}_count{{{labels}}} {self.count}')
+        return lines
+
+
+HISTOGRAMS = (
+    # (metric name, help text, buckets)
+    ('store_request_duration_seconds', 'Request latency by view.', LATENCY_BUCKETS),
+    ('store_request_db_queries', 'Database queries per request by view.', QUERY_COUNT_BUCKETS),
+    ('store_request_db_duration_seconds', 'Time spent in database queries per request by view.', DB_TIME_BUCKETS),
+)
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.series = {}  # (view, method) -> one Histogram per HISTOGRAMS entry
+            self.requests = Counter()  # (view, method, status)
+
+    def observe(self, view, method, status, duration, queries, db_time):
+        with self._lock:
+            histograms = self.series.get((view, method))
+            if histograms is None:
+                histograms = self.series[(view, method)] = [Histogram(buckets) for _, _, buckets in HISTOGRAMS]
+            for histogram, value in zip(histograms, (duration, queries, db_time)):
+                histogram.observe(value)
+            self.requests[(view, method, status)] += 1
+
+    def render(self):
+        with self._lock:
+            lines = ['# HELP store_requests_total Requests by view, method and status.',
+                     '# TYPE store_requests_total counter']
+            for (view, method, status), count in sorted(self.requests.items()):
+                lines.append(f'store_requests_total{{view="{view}",method="{method}",status="{status}"}} {count}')
+            for index, (name, help_text, _) in enumerate(HISTOGRAMS):
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+                for (view, method), histograms in sorted(self.series.items()):
+                    lines += histograms[index].render(name, f'view="{view}",method="{method}"')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class RequestStats:
+    def __init__(self, capture_sql):
+        self.queries = 0
+        self.db_time = 0.0
+        self.sql = [] if capture_sql else None
+
+
+_current = ContextVar('store_request_stats', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        stats.queries += 1
+        stats.db_time += elapsed
+        if stats.sql is not None and len(stats.sql) < MAX_LOGGED_QUERIES:
+            stats.sql.append((sql, elapsed))
+
+
+def _install(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def install_query_recorder():
+    # Every connection opened from now on, plus the ones this thread already has
+    connection_created.connect(_install, dispatch_uid='store.metrics')
+    for connection in connections.all(initialized_only=True):
+        _install(connection)
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        install_query_recorder()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        stats, token, start = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, stats, start)
+        return response
+
+    async def __acall__(self, request):
+        stats, token, start = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, stats, start)
+        return response
+
+    def start(self):
+        stats = RequestStats(capture_sql=bool(settings.METRICS_SLOW_REQUEST_MS))
+        return stats, _current.set(stats), time.perf_counter()
+
+    def finish(self, request, response, stats, start):
+        duration = time.perf_counter() - start
+        match = request.resolver_match
+        view = (match.url_name or match.route) if match else UNRESOLVED
+        if view == 'metrics':
+            return
+        registry.observe(view, request.method, response.status_code, duration, stats.queries, stats.db_time)
+
+        threshold = settings.METRICS_SLOW_REQUEST_MS
+        if threshold and duration * 1000 >= threshold:
+            queries = '\n'.join(f'  {elapsed * 1000:.1f} ms  {sql}' for sql, elapsed in stats.sql)
+            logger.warning(
+                "Slow request: %s %s (%s) %s in %.1f ms, %d queries in %.1f ms\n%s",
+                request.method, request.get_full_path(), view, response.status_code,
+                duration * 1000, stats.queries, stats.db_time * 1000, queries,
+            )
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint. Needs "Authorization: Bearer <METRICS_TOKEN>"; no token set, no access."""
+    if not settings.METRICS_ENABLED:
+        raise Http404()
+    if not settings.METRICS_TOKEN:
+        return HttpResponse(status=403)
+    expected = f'Bearer {settings.METRICS_TOKEN}'.encode()
+    if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), expected):
+        return HttpResponse(status=401)
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
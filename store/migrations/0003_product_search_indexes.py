@@ -0,0 +1,43 @@
+from django.db import migrations
+
+
+def fts_index():
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+
+    return GinIndex(SearchVector('name', config='simple'), name='store_product_name_fts')
+
+
+def trigram_index():
+    from django.contrib.postgres.indexes import GinIndex, OpClass
+
+    return GinIndex(OpClass('name', name='gin_trgm_ops'), name='store_product_name_trgm')
+
+
+def create_search_indexes(apps, schema_editor):
+    # Postgres only; other databases use the in-process index in store/search.py
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Product = apps.get_model('store', 'Product')
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.add_index(Product, fts_index())
+    schema_editor.add_index(Product, trigram_index())
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Product = apps.get_model('store', 'Product')
+    schema_editor.remove_index(Product, trigram_index())
+    schema_editor.remove_index(Product, fts_index())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0002_category_slug"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0003_product_search_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CategorySales",
+            fields=[
+                (
+                    "category",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="sales",
+                        serialize=False,
+                        to="store.category",
+                    ),
+                ),
+                ("units_sold", models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="ProductSales",
+            fields=[
+                (
+                    "product",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="sales",
+                        serialize=False,
+                        to="store.product",
+                    ),
+                ),
+                ("units_sold", models.PositiveIntegerField(db_index=True, default=0)),
+            ],
+        ),
+    ]
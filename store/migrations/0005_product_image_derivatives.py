@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0004_sales_counters"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="productimage",
+            name="medium",
+            field=models.ImageField(blank=True, upload_to="product_images/"),
+        ),
+        migrations.AddField(
+            model_name="productimage",
+            name="thumbnail",
+            field=models.ImageField(blank=True, upload_to="product_images/"),
+        ),
+        migrations.AddField(
+            model_name="productimage",
+            name="webp",
+            field=models.ImageField(blank=True, upload_to="product_images/"),
+        ),
+    ]
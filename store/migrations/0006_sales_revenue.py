@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0005_product_image_derivatives"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="categorysales",
+            name="revenue",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name="productsales",
+            name="revenue",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0006_sales_revenue"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["customer", "-created_at", "-id"],
+                name="order_customer_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(fields=["created_at"], name="order_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="orderitem",
+            index=models.Index(
+                fields=["product"],
+                include=("quantity", "price_at_purchase"),
+                name="orderitem_product_sales_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["-created_at", "-id"], name="product_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["category", "-created_at", "-id"],
+                name="product_cat_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productimage",
+            index=models.Index(
+                fields=["product", "created_at"], name="productimage_product_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="promocode",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["code"],
+                include=("discount_type", "value", "expires_at"),
+                name="promo_active_code_idx",
+            ),
+        ),
+    ]
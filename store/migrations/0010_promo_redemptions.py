@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0009_token_revocation"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="promocode",
+            name="max_redemptions",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="promocode",
+            name="times_redeemed",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,68 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Concat
+
+
+def populate_paths_and_counts(apps, schema_editor):
+    Category = apps.get_model('store', 'Category')
+    Product = apps.get_model('store', 'Product')
+
+    def count(**filters):
+        counts = (
+            Product.objects.filter(category=OuterRef('pk'), **filters)
+            .order_by().values('category').annotate(n=Count('id')).values('n')
+        )
+        return Coalesce(Subquery(counts), 0)
+
+    # Every existing category is a root
+    Category.objects.update(
+        path=Concat('slug', Value('/')), product_count=count(), in_stock_count=count(stock__gt=0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0010_promo_redemptions"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="category",
+            name="parent",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="children",
+                to="store.category",
+            ),
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="path",
+            field=models.CharField(default="", editable=False, max_length=1024),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="product_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="in_stock_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_paths_and_counts, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="category",
+            name="path",
+            field=models.CharField(editable=False, max_length=1024, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name="category",
+            index=models.Index(fields=["path"], name="category_path_idx", opclasses=["varchar_pattern_ops"]),
+        ),
+    ]
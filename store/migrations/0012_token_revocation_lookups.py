@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0011_category_tree"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="tokenrevocation",
+            name="jti",
+            field=models.CharField(blank=True, db_index=True, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name="tokenrevocation",
+            name="user_id",
+            field=models.BigIntegerField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -1,10 +1,32 @@
 # store/models.py
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 from django.utils.text import slugify
+from django.db.models import Subquery, Value
+from django.db.models.functions import Concat, Length, Substr
 
-class User(AbstractUser):
+class LoadedValuesMixin:
+    """
+    Remembers the field values an instance was loaded with (and, once saved,
+    the values it was saved with) as `_loaded_values`, so save() and the
+    signals can tell what changed without reading the row again.
+    """
+    _loaded_values = {}
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def remember_values(self):
+        # Deferred fields that were never loaded stay unknown
+        self._loaded_values = {
+            f.attname: getattr(self, f.attname) for f in self._meta.concrete_fields if f.attname in self.__dict__
+        }
+
+class User(LoadedValuesMixin, AbstractUser):
     ROLE_CHOICES = (
         ('customer', 'Customer'),
         ('manager', 'Store Manager'),
@@ -14,63 +36,143 @@ class User(AbstractUser):
     def is_manager(self):
         return self.role == 'manager'
 
-class Category(models.Model):
+class Category(LoadedValuesMixin, models.Model):
     name = models.CharField(max_length=255, unique=True)
     slug = models.SlugField(unique=True, blank=True)
+    # Low-stock alert level for products that don't set their own
+    low_stock_threshold = models.PositiveIntegerField(null=True, blank=True)
+    parent = models.ForeignKey('self', on_delete=models.PROTECT, null=True, blank=True, related_name='children')
+    # Materialised path of slugs, e.g. "food/fruits/citrus/": a subtree is a
+    # prefix match, and ORDER BY path lists the tree parents-first
+    path = models.CharField(max_length=1024, unique=True, editable=False)
+    # Products directly in this category, and those with stock > 0 (see store/categories.py)
+    product_count = models.PositiveIntegerField(default=0, editable=False)
+    in_stock_count = models.PositiveIntegerField(default=0, editable=False)
+
+    # Only ever written by refresh_category_counts, never by save()
+    COUNT_FIELDS = ('product_count', 'in_stock_count')
+
+    class Meta:
+        indexes = [
+            # Subtree lookups are LIKE 'prefix%'
+            models.Index(fields=['path'], name='category_path_idx', opclasses=['varchar_pattern_ops']),
+        ]
 
     def save(self, *args, **kwargs):
+        loaded = self._loaded_values
         # 1. Force uppercase name (as per your logic)
         if self.name:
             self.name = self.name.upper()
 
-        # 2. Always regenerate slug when name changes
-        new_slug = slugify(self.name.lower())
-        if not self.slug or self.slug != new_slug:
-            self.slug = new_slug
+        # 2. Regenerate the slug when the name changes
+        if not self.slug or self.name != loaded.get('name') or self.slug != loaded.get('slug'):
+            self.slug = slugify(self.name.lower())
 
-        super().save(*args, **kwargs)
+        # 3. The path is computed in the INSERT/UPDATE from the parent's row,
+        # so it's right even if the parent was moved since we loaded it
+        own_path = Value(f'{self.slug}/')
+        if self.parent_id:
+            own_path = Concat(Subquery(Category.objects.filter(pk=self.parent_id).values('path')), own_path)
+        self.path = own_path
+
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields if not f.primary_key and f.name not in self.COUNT_FIELDS
+            ]
+        moved = not self._state.adding and (self.slug != loaded.get('slug') or self.parent_id != loaded.get('parent_id'))
+        if moved:
+            with transaction.atomic():
+                # Renamed or moved: the whole subtree moves with it (matched on
+                # the path still in the database, before this row is updated)
+                old_path = Subquery(Category.objects.filter(pk=self.pk).values('path'))
+                Category.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                    path=Concat(own_path, Substr('path', Length(old_path) + 1))
+                )
+                super().save(*args, **kwargs)
+        else:
+            super().save(*args, **kwargs)
+
+        # Best guess without reading the row back (refresh_from_db for the exact value)
+        if self.parent_id and self.parent_id == loaded.get('parent_id') and 'path' in loaded:
+            parent_path = loaded['path'][:-len(loaded['slug']) - 1]
+        else:
+            parent_path = self.parent.path if self.parent_id else ''
+        self.path = f'{parent_path}{self.slug}/'
+        self.remember_values()
 
     def __str__(self):
         return self.name
 
-class Product(models.Model):
+class Product(LoadedValuesMixin, models.Model):
     name = models.CharField(max_length=255)
     slug = models.SlugField(unique=True, blank=True)
 
+    # No FK index of its own: product_cat_created_idx leads with it
     category = models.ForeignKey(
-        Category, on_delete=models.SET_NULL, null=True, related_name='products'
+        Category, on_delete=models.SET_NULL, null=True, related_name='products', db_index=False
     )
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.PositiveIntegerField(default=0)
+    # Alert when stock drops to this; falls back to the category's, then settings.LOW_STOCK_THRESHOLD
+    low_stock_threshold = models.PositiveIntegerField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Listing keyset: ORDER BY created_at DESC, id DESC
+            models.Index(fields=['-created_at', '-id'], name='product_created_idx'),
+            # ?category=<slug> listing: equality on category, then the same keyset
+            models.Index(fields=['category', '-created_at', '-id'], name='product_cat_created_idx'),
+        ]
     
     def save(self, *args, **kwargs):
-        # Always regenerate slug if name changed
-        new_slug = slugify(self.name)
-        if not self.slug or self.slug != new_slug:
-            self.slug = new_slug
+        # Regenerate the slug when the name changes
+        if not self.slug or self.name != self._loaded_values.get('name') or self.slug != self._loaded_values.get('slug'):
+            self.slug = slugify(self.name)
         super().save(*args, **kwargs)
+        self.remember_values()
 
     def __str__(self):
         return self.name
 
 class ProductImage(models.Model):
+    # No FK index of its own: productimage_product_idx leads with it
     product = models.ForeignKey(
         Product,
         related_name="images",
-        on_delete=models.CASCADE
+        on_delete=models.CASCADE,
+        db_index=False,
     )
     image = models.ImageField(upload_to="product_images/")
+    # Resized renditions, generated off the request path by store/images.py
+    thumbnail = models.ImageField(upload_to="product_images/", blank=True)
+    medium = models.ImageField(upload_to="product_images/", blank=True)
+    webp = models.ImageField(upload_to="product_images/", blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-    
+
+    DERIVATIVE_FIELDS = ("thumbnail", "medium", "webp")
+
+    class Meta:
+        indexes = [
+            # Images are always fetched per product in upload order
+            models.Index(fields=['product', 'created_at'], name='productimage_product_idx'),
+        ]
+
     def save(self, *args, **kwargs):
-        # If updating the image, delete the old one
+        # New rows have no previous image to clean up
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+
+        # If updating the image, delete the old one (and its renditions)
         try:
             old = ProductImage.objects.get(id=self.id)
             if old.image and old.image != self.image:
                 old.image.delete(save=False)
+                old.delete_derivatives()
+                for field in self.DERIVATIVE_FIELDS:
+                    setattr(self, field, "")
         except ProductImage.DoesNotExist:
             pass
 
@@ -79,24 +181,49 @@ class ProductImage(models.Model):
     def __str__(self):
         return f"Image for {self.product.name}"
 
+    def delete_derivatives(self):
+        for field in self.DERIVATIVE_FIELDS:
+            derivative = getattr(self, field)
+            if derivative:
+                derivative.delete(save=False)
+
     def delete(self, *args, **kwargs):
         if self.image:
             self.image.delete(save=False)  # delete from S3
+        self.delete_derivatives()
         super().delete(*args, **kwargs)   
 
 class Order(models.Model):
-    customer = models.ForeignKey('User', on_delete=models.CASCADE, related_name='orders')
+    # No FK index of its own: order_customer_created_idx leads with it
+    customer = models.ForeignKey('User', on_delete=models.CASCADE, related_name='orders', db_index=False)
     created_at = models.DateTimeField(auto_now_add=True)
     total_amount = models.DecimalField(max_digits=12, decimal_places=2)
     # Could add status, payment info
+
+    class Meta:
+        indexes = [
+            # Order history per customer, newest first
+            models.Index(fields=['customer', '-created_at', '-id'], name='order_customer_created_idx'),
+            # Date-ranged sales reports
+            models.Index(fields=['created_at'], name='order_created_idx'),
+        ]
+
     def __str__(self): return f"Order {self.id} by {self.customer.username}"
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
-    product = models.ForeignKey(Product, on_delete=models.PROTECT)
+    # No FK index of its own: orderitem_product_sales_idx leads with it
+    product = models.ForeignKey(Product, on_delete=models.PROTECT, db_index=False)
     quantity = models.PositiveIntegerField()
     price_at_purchase = models.DecimalField(max_digits=10, decimal_places=2)
 
+    class Meta:
+        indexes = [
+            # Per-product sales aggregates read quantity/price straight from the
+            # index (INCLUDE is Postgres only; elsewhere it's a plain product index)
+            models.Index(fields=['product'], include=['quantity', 'price_at_purchase'], name='orderitem_product_sales_idx'),
+        ]
+
 class CartItem(models.Model):
     user = models.ForeignKey('User', on_delete=models.CASCADE, related_name='cart_items')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
@@ -124,7 +251,73 @@ class PromoCode(models.Model):
     value = models.DecimalField(max_digits=10, decimal_places=2)
     is_active = models.BooleanField(default=True)
     expires_at = models.DateTimeField(null=True, blank=True)
+    # Checkout bumps times_redeemed with one conditional UPDATE (store/promos.py)
+    max_redemptions = models.PositiveIntegerField(null=True, blank=True)
+    times_redeemed = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Checkout only ever looks up active codes (on a promo cache miss):
+            # a small partial index that also carries what the discount needs
+            models.Index(
+                fields=['code'],
+                include=['discount_type', 'value', 'expires_at'],
+                condition=models.Q(is_active=True),
+                name='promo_active_code_idx',
+            ),
+        ]
+
     def __str__(self):
-        return self.code
\ No newline at end of file
+        return self.code
+
+class ProductSales(models.Model):
+    # Running total of units sold, bumped by checkout so popularity sorting and
+    # the sales report don't have to SUM the whole OrderItem table.
+    # `manage.py rebuild_sales_counters` recomputes it from OrderItem.
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='sales')
+    units_sold = models.PositiveIntegerField(default=0, db_index=True)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+
+class CategorySales(models.Model):
+    # Same as ProductSales, credited to the product's category once the checkout commits
+    category = models.OneToOneField(Category, on_delete=models.CASCADE, primary_key=True, related_name='sales')
+    units_sold = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+
+class StockEvent(models.Model):
+    # Outbox of stock changes, written in the same transaction as the change
+    # and drained by `manage.py process_stock_events` (see store/alerts.py)
+    SOURCE_CHOICES = (
+        ('save', 'Product saved'),
+        ('checkout', 'Checkout'),
+        ('stock_update', 'Batch stock update'),
+        ('import', 'Bulk import'),
+    )
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
+class LowStockAlert(models.Model):
+    # A product that's currently low and has been reported; removed once it's restocked
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='low_stock_alert')
+    stock = models.PositiveIntegerField()
+    threshold = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Low stock: {self.product.name} ({self.stock})"
+
+
+class TokenRevocation(models.Model):
+    # JWT deny-list (store/authentication.py): either a single token (jti) or
+    # every token a user was issued before revoked_at. A row is only needed
+    # until the tokens it covers have expired.
+    # Indexed for the per-token lookups on a deny-list cache miss
+    user_id = models.BigIntegerField(null=True, blank=True, db_index=True)  # not a FK: has to outlive a deleted user
+    jti = models.CharField(max_length=255, blank=True, db_index=True)
+    revoked_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField(db_index=True)
@@ -0,0 +1,120 @@
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination, PageNumberPagination, _reverse_ordering
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Keyset pagination on the *whole* ordering. DRF's CursorPagination keeps
+    only the first ordering field in the cursor and steps through rows that
+    tie on it with an OFFSET, capped at offset_cutoff, so a long run of ties
+    (every unsold product under ?popular=most) repeats pages forever. Here
+    the cursor holds every ordering value and each page is a
+    "WHERE (a, id) < (<a>, <id>)" range query. The ordering has to end in a
+    unique field (id), so positions are unique and no offset is needed.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse, position = (self.cursor.reverse, self.cursor.position) if self.cursor else (False, None)
+
+        ordering = _reverse_ordering(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self._after(ordering, position))
+
+        # One extra row tells us whether there's a page beyond this one
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_more = len(results) > self.page_size
+        if reverse:
+            self.page.reverse()
+        came_from_cursor = position is not None and bool(self.page)
+        self.has_next = came_from_cursor if reverse else has_more
+        self.has_previous = has_more if reverse else came_from_cursor
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def _after(self, ordering, position):
+        """Rows past `position` in `ordering`: (a < x) OR (a = x AND id < y), field by field."""
+        try:
+            values = json.loads(position)
+            if not isinstance(values, list) or len(values) != len(ordering):
+                raise ValueError
+            after, equal = Q(), {}
+            for field, value in zip(ordering, values):
+                name = field.lstrip('-')
+                lookup = 'lt' if field.startswith('-') else 'gt'
+                after |= Q(**equal, **{f'{name}__{lookup}': value})
+                equal[name] = value
+            return after
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _get_position_from_instance(self, instance, ordering):
+        def value(field):
+            name = field.lstrip('-')
+            return instance[name] if isinstance(instance, dict) else getattr(instance, name)
+        return json.dumps([str(value(field)) for field in ordering])
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        position = self._get_position_from_instance(self.page[-1], self.ordering)
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        position = self._get_position_from_instance(self.page[0], self.ordering)
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+
+class ProductCursorPagination(KeysetCursorPagination):
+    # Keyset pagination: every page is a "WHERE (created_at, id) < <cursor>"
+    # range query, so page 500 costs the same as page 1 (no growing OFFSET scans).
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        # Views can swap the keyset for a filter that changes the sort order
+        # (e.g. ?popular=most) by setting `pagination_ordering`.
+        return getattr(view, 'pagination_ordering', None) or self.ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Set by ProductViewSet when the search backend capped its matches
+        self.search_truncated = getattr(view, 'search_truncated', False)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.search_truncated:
+            response.data['search_truncated'] = True
+        return response
+
+
+class ReportPagination(PageNumberPagination):
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+class OrderCursorPagination(KeysetCursorPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
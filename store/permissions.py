@@ -1,14 +1,20 @@
 from rest_framework.permissions import BasePermission, SAFE_METHODS
 
+# request.user is usually the stateless token user (store/authentication.py),
+# so these only look at the role/superuser claims it carries, never the DB
+
+def is_manager(user):
+    return bool(user and user.is_authenticated and user.is_manager())
+
 class IsManager(BasePermission):
     def has_permission(self, request, view):
-        return bool(request.user and request.user.is_authenticated and request.user.is_manager())
+        return is_manager(request.user)
 
 class IsManagerOrReadOnly(BasePermission):
     def has_permission(self, request, view):
         if request.method in SAFE_METHODS:
             return True
-        return bool(request.user and request.user.is_authenticated and request.user.is_manager())
+        return is_manager(request.user)
 
 class IsAdmin(BasePermission):
     def has_permission(self, request, view):
@@ -0,0 +1,86 @@
+"""
+Promo code lookups for checkout, without a database query per order.
+
+Active codes are cached in two tiers: a small in-process dict (entries live
+PROMO_CODE_LOCAL_CACHE_TTL seconds) in front of the shared cache, where
+entries are keyed on a "promocodes" version token (store/cache.py) that is
+bumped whenever a code is saved or deleted. Unknown codes are cached too, so
+guessing codes doesn't reach the database either.
+
+Nothing that changes per order is cached: redemptions are counted with one
+conditional UPDATE that also enforces max_redemptions and is_active, so a
+stale cache entry can never let a disabled or used-up code through.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .cache import bump, get_versions
+from .models import PromoCode
+
+PROMOCODES = 'promocodes'
+PROMO_FIELDS = ('id', 'code', 'discount_type', 'value', 'expires_at')
+MISSING = {}  # cached for codes that don't exist (or aren't active)
+LOCAL_MAX_ENTRIES = 1000
+
+_local = {}  # code -> (monotonic deadline, entry)
+
+
+def invalidate_promo_codes():
+    _local.clear()
+    bump(PROMOCODES)
+
+
+def _timeout(entry):
+    timeout = settings.PROMO_CODE_CACHE_TIMEOUT
+    if entry and entry['expires_at']:
+        # Let the entry go when the code expires (the lookup checks expiry anyway)
+        remaining = (entry['expires_at'] - timezone.now()).total_seconds()
+        timeout = max(1, min(timeout, int(remaining) + 1))
+    return timeout
+
+
+def _load(code):
+    [version] = get_versions([PROMOCODES])
+    key = f'promo:{version}:{code}'
+    entry = cache.get(key)
+    if entry is None:
+        entry = PromoCode.objects.filter(code=code, is_active=True).values(*PROMO_FIELDS).first() or MISSING
+        cache.set(key, entry, _timeout(entry))
+    return entry
+
+
+def get_promo_code(code):
+    """The active code as a dict of PROMO_FIELDS, or None."""
+    now = time.monotonic()
+    cached = _local.get(code)
+    if cached and cached[0] > now:
+        entry = cached[1]
+    else:
+        entry = _load(code)
+        if len(_local) >= LOCAL_MAX_ENTRIES:
+            _local.clear()
+        _local[code] = (now + settings.PROMO_CODE_LOCAL_CACHE_TTL, entry)
+    return entry or None
+
+
+def is_expired(promo):
+    return bool(promo['expires_at'] and promo['expires_at'] < timezone.now())
+
+
+def discount_for(promo, total):
+    if promo['discount_type'] == 'percent':
+        return (total * promo['value']) / 100
+    return promo['value']
+
+
+def redeem(promo_id):
+    """Count one use of the code. False if it's been disabled or has hit max_redemptions."""
+    return bool(
+        PromoCode.objects.filter(id=promo_id, is_active=True)
+        .filter(Q(max_redemptions__isnull=True) | Q(times_redeemed__lt=F('max_redemptions')))
+        .update(times_redeemed=F('times_redeemed') + 1)
+    )
@@ -0,0 +1,147 @@
+"""
+Query building and streaming helpers for ReportViewSet.
+
+Without a date range the reports read the precomputed sales counters
+(store/sales.py). With ?date_from/?date_to they aggregate OrderItem for
+that window instead, since the counters are all-time totals: the window is
+in the WHERE (so order_created_idx bounds the rows read) and the items are
+grouped by product or category, which leaves out anything that didn't sell
+in the window.
+"""
+import csv
+import json
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework import serializers
+
+from .models import Category, OrderItem, Product
+
+PRODUCT_COLUMNS = ['product_id', 'name', 'total_sold', 'revenue']
+CATEGORY_COLUMNS = ['category_id', 'name', 'total_sold', 'revenue']
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+
+def parse_bound(params, name, end=False):
+    """
+    ?date_from / ?date_to as YYYY-MM-DD or an ISO 8601 datetime. Returns the
+    lookup and value to filter Order.created_at with; a date_to *date* covers
+    that whole day.
+    """
+    value = params.get(name)
+    if not value:
+        return None
+    error = serializers.ValidationError({name: "Expected a date (YYYY-MM-DD) or an ISO 8601 datetime."})
+    try:
+        day = parse_date(value)
+        moment = None if day else parse_datetime(value)
+    except ValueError:
+        raise error
+    if day:
+        moment = timezone.make_aware(datetime.combine(day, time.min))
+        if end:
+            return 'lt', moment + timedelta(days=1)
+        return 'gte', moment
+    if moment is None:
+        raise error
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return ('lte' if end else 'gte'), moment
+
+
+def sales_window(params):
+    """Q() over OrderItem's `order__created_at` for the requested range, or None for all time."""
+    window = Q()
+    for name, end in (('date_from', False), ('date_to', True)):
+        bound = parse_bound(params, name, end)
+        if bound:
+            lookup, moment = bound
+            window &= Q(**{f'order__created_at__{lookup}': moment})
+    return window or None
+
+
+def _order(qs, params, tiebreak):
+    if params.get('sort') == 'least':
+        return qs.order_by('total_sold', tiebreak)
+    return qs.order_by('-total_sold', tiebreak)
+
+
+def _window_sales(items, window, *fields, **expressions):
+    """OrderItem totals in the window, grouped by the given columns."""
+    return items.filter(window).values(*fields, **expressions).annotate(
+        total_sold=Sum('quantity'),
+        revenue=Sum(F('quantity') * F('price_at_purchase'), output_field=MONEY),
+    )
+
+
+def sales_by_product(params):
+    window = sales_window(params)
+    category = params.get('category')
+    if window is None:
+        qs = Product.objects.annotate(
+            total_sold=Coalesce('sales__units_sold', 0),
+            revenue=Coalesce('sales__revenue', Value(Decimal('0')), output_field=MONEY),
+        )
+        if category:
+            qs = qs.filter(category__name__iexact=category)
+        return _order(qs, params, 'id').values('name', 'total_sold', 'revenue', product_id=F('id'))
+
+    items = OrderItem.objects.all()
+    if category:
+        items = items.filter(product__category__name__iexact=category)
+    qs = _window_sales(items, window, 'product_id', name=F('product__name'))
+    return _order(qs, params, 'product_id')
+
+
+def sales_by_category(params):
+    window = sales_window(params)
+    if window is None:
+        qs = Category.objects.annotate(
+            total_sold=Coalesce('sales__units_sold', 0),
+            revenue=Coalesce('sales__revenue', Value(Decimal('0')), output_field=MONEY),
+        )
+        return _order(qs, params, 'name').values('name', 'total_sold', 'revenue', category_id=F('id'))
+
+    qs = _window_sales(
+        OrderItem.objects.filter(product__category__isnull=False), window, category_id=F('product__category'), name=F('product__category__name'),
+    )
+    return _order(qs, params, 'name')
+
+
+CENTS = Decimal('0.01')
+
+
+def as_row(row, columns):
+    # Not every backend keeps the scale of a computed decimal (SQLite returns 10, not 10.00)
+    return {column: row[column].quantize(CENTS) if column == 'revenue' else row[column] for column in columns}
+
+
+class Echo:
+    """File-like object csv.writer can write to; hands each line straight back."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows, columns):
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        row = as_row(row, columns)
+        yield writer.writerow([row[column] for column in columns])
+
+
+def stream_ndjson(rows, columns):
+    for row in rows:
+        yield json.dumps(as_row(row, columns), cls=DjangoJSONEncoder) + '\n'
+
+
+EXPORT_FORMATS = {
+    'csv': (stream_csv, 'text/csv'),
+    'ndjson': (stream_ndjson, 'application/x-ndjson'),
+}
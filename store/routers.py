@@ -0,0 +1,102 @@
+"""
+Read replicas (DATABASE_REPLICAS, see settings) for the catalogue and reports.
+
+Nothing is sent to a replica unless it's asked for: ReplicaReadsMixin turns
+replica reads on for the safe (GET/HEAD/OPTIONS) requests of the views that
+use it, and everything else - writes, checkout, carts, auth, anything inside
+a transaction on the primary - keeps using "default".
+
+Replicas lag the primary a little, so after a user writes (to their cart, a
+checkout, a manager editing products) they're pinned to the primary for
+DB_REPLICA_PIN_SECONDS and see their own writes. The catalogue response
+cache does the same for everyone: responses built right after the data
+changed are read from the primary, so a stale copy from a lagging replica
+can't be cached under the new version (see store/cache.py).
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+# The replica this request reads from (None: the primary). One per request, so
+# e.g. a listing's count and its page can't come from replicas lagging differently
+_replica = ContextVar('store_replica', default=None)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replica = _replica.get()
+        if replica in settings.DATABASE_REPLICAS and not connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return replica
+        # Explicitly, or Django would follow an instance hint back to the replica it came from
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+def _pick_replica(enabled):
+    replicas = settings.DATABASE_REPLICAS
+    return random.choice(replicas) if enabled and replicas else None
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """Reads in the block go to one replica, picked on entry (or the primary if not enabled)."""
+    token = _replica.set(_pick_replica(enabled))
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+def _pin_key(user_id):
+    return f'db:pin:{user_id}'
+
+
+def pin_to_primary(user):
+    if settings.DATABASE_REPLICAS and user.is_authenticated:
+        cache.set(_pin_key(user.id), 1, settings.DB_REPLICA_PIN_SECONDS)
+
+
+def is_pinned(user):
+    return user.is_authenticated and bool(cache.get(_pin_key(user.id)))
+
+
+async def ais_pinned(user):
+    return user.is_authenticated and bool(await cache.aget(_pin_key(user.id)))
+
+
+class ReplicaReadsMixin:
+    """
+    For DRF views: safe requests read from a replica (unless the user is
+    pinned to the primary), and successful writes pin the user. Views that
+    should only pin, like the cart, set `replica_reads = False`.
+    """
+    replica_reads = True
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (self.replica_reads and settings.DATABASE_REPLICAS
+                and request.method in SAFE_METHODS and not is_pinned(request.user)):
+            self._replica_token = _replica.set(_pick_replica(True))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_replica_token', None)
+        if token is not None:
+            _replica.reset(token)
+            self._replica_token = None
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            pin_to_primary(request.user)
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -0,0 +1,78 @@
+from collections import Counter, defaultdict
+from decimal import Decimal
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, PositiveIntegerField, Sum, When
+
+from .models import CategorySales, OrderItem, ProductSales
+
+REVENUE = F('quantity') * F('price_at_purchase')
+
+
+def _increment(model, key, units, revenue):
+    # Make sure every counter row exists, then bump them all in one UPDATE
+    model.objects.bulk_create([model(**{key: pk}) for pk in units], ignore_conflicts=True)
+    model.objects.filter(**{f'{key}__in': list(units)}).update(
+        units_sold=Case(
+            *[When(**{key: pk}, then=F('units_sold') + qty) for pk, qty in units.items()],
+            output_field=PositiveIntegerField(),
+        ),
+        revenue=Case(
+            *[When(**{key: pk}, then=F('revenue') + amount) for pk, amount in revenue.items()],
+            output_field=DecimalField(max_digits=14, decimal_places=2),
+        ),
+    )
+
+
+def _increment_categories(units, revenue):
+    with transaction.atomic():
+        _increment(CategorySales, 'category_id', units, revenue)
+
+
+def record_sales(order_items):
+    """
+    Add freshly created OrderItems to the sales counters. The product rows are
+    bumped in the caller's transaction (2 queries, any cart size); checkout
+    already locks those products' rows for the stock update. A category row
+    is shared by every checkout buying from that category, so its increments
+    run after the commit instead of holding the row until checkout ends. A
+    crash in between leaves them short until `rebuild_sales_counters` runs.
+    """
+    product_units, product_revenue = Counter(), defaultdict(Decimal)
+    category_units, category_revenue = Counter(), defaultdict(Decimal)
+    for item in order_items:
+        amount = item.quantity * item.price_at_purchase
+        product_units[item.product_id] += item.quantity
+        product_revenue[item.product_id] += amount
+        if item.product.category_id:
+            category_units[item.product.category_id] += item.quantity
+            category_revenue[item.product.category_id] += amount
+    if product_units:
+        _increment(ProductSales, 'product_id', product_units, product_revenue)
+    if category_units:
+        transaction.on_commit(partial(_increment_categories, category_units, category_revenue), robust=True)
+
+
+@transaction.atomic
+def rebuild_sales_counters():
+    """Recompute every counter from OrderItem. Returns (products, categories) rows written."""
+    ProductSales.objects.all().delete()
+    CategorySales.objects.all().delete()
+    products = ProductSales.objects.bulk_create(
+        [
+            ProductSales(product_id=row['product'], units_sold=row['units'], revenue=row['revenue'])
+            for row in OrderItem.objects.values('product')
+            .annotate(units=Sum('quantity'), revenue=Sum(REVENUE)).order_by()
+        ],
+        batch_size=1000,
+    )
+    categories = CategorySales.objects.bulk_create(
+        [
+            CategorySales(category_id=row['product__category'], units_sold=row['units'], revenue=row['revenue'])
+            for row in OrderItem.objects.filter(product__category__isnull=False)
+            .values('product__category').annotate(units=Sum('quantity'), revenue=Sum(REVENUE)).order_by()
+        ],
+        batch_size=1000,
+    )
+    return len(products), len(categories)
@@ -0,0 +1,199 @@
+"""
+Product search backends used by ``ProductViewSet`` for ``?search=``.
+
+On Postgres the search runs against a ``to_tsvector('simple', name)`` GIN
+index (prefix matching via ``term:*``) plus a trigram index for typo
+tolerance, ranked with ts_rank + word similarity. Every other database
+(SQLite in tests/dev) gets a small in-process inverted index that is kept
+up to date from ``Product`` save/delete signals.
+
+A backend that stops short of every match sets ``search_truncated = True``
+on the queryset it returns, and the listing says so in its response.
+"""
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, FloatField, Q, Value, When
+from django.db.models.functions import Cast
+from django.utils.module_loading import import_string
+
+TOKEN_RE = re.compile(r'\w+')
+SEARCH_CONFIG = 'simple'
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or '').lower())
+
+
+def no_results(qs):
+    # Keep the search_rank annotation so callers can still order by it
+    return qs.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+class PostgresSearchBackend:
+    def search(self, qs, query):
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity
+
+        terms = tokenize(query)
+        if not terms:
+            return no_results(qs)
+        # "appl & jui" -> "appl:* & jui:*" so every word is also a prefix match
+        tsquery = SearchQuery(' & '.join(f'{term}:*' for term in terms), search_type='raw', config=SEARCH_CONFIG)
+        vector = SearchVector('name', config=SEARCH_CONFIG)
+        return (
+            qs.alias(search_vector=vector)
+            .filter(Q(search_vector=tsquery) | Q(name__trigram_word_similar=query))
+            # ts_rank is a float4; as a float8 the rank read back compares
+            # equal to itself in the pagination cursor's WHERE
+            .annotate(search_rank=Cast(SearchRank(vector, tsquery) + TrigramWordSimilarity(query, 'name'), FloatField()))
+        )
+
+    # The database keeps its indexes current, nothing to do on save/delete
+    def update(self, product):
+        pass
+
+    def remove(self, product_id):
+        pass
+
+    def reset(self):
+        pass
+
+
+class InvertedIndexSearchBackend:
+    """
+    token -> product ids, with a sorted vocabulary so prefix lookups are a
+    bisect instead of a scan. Built lazily from the DB on the first search.
+    Meant for SQLite/tests: each process holds its own copy and only sees
+    saves made through this process. Every match goes into the SQL as a
+    parameter, so only the `max_results` best are returned (the response
+    then carries "search_truncated": true).
+    """
+    max_results = 1000
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._postings = defaultdict(set)
+            self._doc_tokens = {}
+            self._vocab = []
+            self._loaded = False
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        from .models import Product
+
+        with self._lock:
+            if self._loaded:
+                return
+            for product_id, name in Product.objects.values_list('id', 'name').iterator(chunk_size=5000):
+                self._index(product_id, name)
+            self._vocab = sorted(self._postings)
+            self._loaded = True
+
+    def _index(self, product_id, name):
+        tokens = set(tokenize(name))
+        self._doc_tokens[product_id] = tokens
+        for token in tokens:
+            self._postings[token].add(product_id)
+
+    def _unindex(self, product_id):
+        for token in self._doc_tokens.pop(product_id, ()):
+            ids = self._postings.get(token)
+            if ids is None:
+                continue
+            ids.discard(product_id)
+            if not ids:
+                del self._postings[token]
+                index = bisect_left(self._vocab, token)
+                if index < len(self._vocab) and self._vocab[index] == token:
+                    self._vocab.pop(index)
+
+    def update(self, product):
+        if not self._loaded:
+            return
+        with self._lock:
+            self._unindex(product.id)
+            self._index(product.id, product.name)
+            for token in self._doc_tokens[product.id]:
+                index = bisect_left(self._vocab, token)
+                if index == len(self._vocab) or self._vocab[index] != token:
+                    self._vocab.insert(index, token)
+
+    def remove(self, product_id):
+        if not self._loaded:
+            return
+        with self._lock:
+            self._unindex(product_id)
+
+    def _matches(self, term):
+        """Docs containing `term` exactly (score 1.0) or as a prefix (0.5)."""
+        scores = {}
+        index = bisect_left(self._vocab, term)
+        while index < len(self._vocab) and self._vocab[index].startswith(term):
+            token = self._vocab[index]
+            weight = 1.0 if token == term else 0.5
+            for product_id in self._postings[token]:
+                if scores.get(product_id, 0) < weight:
+                    scores[product_id] = weight
+            index += 1
+        return scores
+
+    def search(self, qs, query):
+        terms = tokenize(query)
+        if not terms:
+            return no_results(qs)
+        self._ensure_loaded()
+        with self._lock:
+            scores = None
+            # AND semantics: every term has to match (as a word or a prefix)
+            for term in terms:
+                matches = self._matches(term)
+                if scores is None:
+                    scores = matches
+                else:
+                    scores = {pid: score + matches[pid] for pid, score in scores.items() if pid in matches}
+                if not scores:
+                    return no_results(qs)
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+        truncated = len(ranked) > self.max_results
+        ranked = ranked[:self.max_results]
+        # Scores only take a handful of distinct values, so group ids by score
+        # to keep the CASE expression small
+        by_score = defaultdict(list)
+        for pid, score in ranked:
+            by_score[score].append(pid)
+        results = qs.filter(id__in=[pid for pid, _ in ranked]).annotate(
+            search_rank=Case(
+                *[When(id__in=ids, then=Value(score)) for score, ids in by_score.items()],
+                output_field=FloatField(),
+            )
+        )
+        results.search_truncated = truncated
+        return results
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_search_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                path = getattr(settings, 'PRODUCT_SEARCH_BACKEND', None)
+                if path:
+                    _backend = import_string(path)()
+                elif connection.vendor == 'postgresql':
+                    _backend = PostgresSearchBackend()
+                else:
+                    _backend = InvertedIndexSearchBackend()
+    return _backend
@@ -1,4 +1,6 @@
+from functools import partial
 from rest_framework import serializers
+from django.db import IntegrityError, transaction
 from .models import User, Category, Product, CartItem, Order, OrderItem, WishlistItem, PromoCode, ProductImage
 from django.contrib.auth.password_validation import validate_password
 
@@ -33,30 +35,105 @@ class ManagerCreateSerializer(serializers.ModelSerializer):
         user.save()
         return user
 
-class CategorySerializer(serializers.ModelSerializer):
+class UniqueWriteMixin:
+    """
+    Leaves unique fields to the database constraint instead of checking them
+    with a query first: the write runs in a savepoint, and a violation of one
+    of `unique_fields` comes back as `unique_error` (a 400) rather than a 500.
+    Any other IntegrityError (e.g. from a signal's write) is re-raised.
+    """
+    unique_fields = ()
+    unique_error = None
+
+    def create(self, validated_data):
+        return self._write(super().create, validated_data)
+
+    def update(self, instance, validated_data):
+        return self._write(partial(super().update, instance), validated_data)
+
+    def _write(self, write, validated_data):
+        try:
+            with transaction.atomic():
+                return write(validated_data)
+        except IntegrityError as exc:
+            if not self._violates_unique_field(exc):
+                raise
+            raise serializers.ValidationError(self.unique_error)
+
+    def _violates_unique_field(self, exc):
+        # sqlite/MySQL name the column ("store_product.slug"), Postgres the
+        # constraint ("store_product_slug_key" or "store_product_slug_<hash>_uniq")
+        opts = self.Meta.model._meta
+        message = str(exc)
+        for name in self.unique_fields:
+            column = opts.get_field(name).column
+            if f"{opts.db_table}.{column}" in message or f"{opts.db_table}_{column}_" in message:
+                return True
+        return False
+
+class CategorySerializer(UniqueWriteMixin, serializers.ModelSerializer):
+    # The path follows the slug, so it collides whenever the slug does
+    unique_fields = ("name", "slug", "path")
+    unique_error = {"name": ["Category already exists."]}
+
     class Meta:
         model = Category
-        fields = ["id", "name", "slug"]
+        fields = ["id", "name", "slug", "low_stock_threshold", "parent", "path"]
+        # The slug and path follow the name (see Category.save)
+        read_only_fields = ("slug", "path")
+        extra_kwargs = {"name": {"validators": []}}
+
+    def validate_parent(self, value):
+        # A category can't be moved under itself or anything below it
+        if value and self.instance and value.path.startswith(self.instance.path):
+            raise serializers.ValidationError("A category can't be nested under itself or one of its subcategories.")
+        return value
 
     def validate_name(self, value):
-        name_upper = value.upper()
-        if Category.objects.filter(name=name_upper).exists():
-            raise serializers.ValidationError("Category already exists.")
-        return name_upper
+        return value.upper()
     
 class ProductImageSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProductImage
-        fields = ["id", "image", "created_at"]
+        fields = ["id", "image", "thumbnail", "medium", "webp", "created_at"]
+        read_only_fields = ("thumbnail", "medium", "webp")
+
+class SparseFieldsetMixin:
+    """
+    Lets GET requests trim the payload with ?fields=id,name,price.
+    Only applies to the top-level serializer (nested ones get no request
+    in their context when they are constructed).
+    """
 
-class ProductSerializer(serializers.ModelSerializer):
+    @staticmethod
+    def requested_fields(request):
+        if request is None or request.method not in ('GET', 'HEAD'):
+            return None
+        value = request.query_params.get('fields')
+        if not value:
+            return None
+        return {name.strip() for name in value.split(',') if name.strip()}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        wanted = self.requested_fields(self.context.get('request'))
+        if wanted:
+            for name in set(self.fields) - wanted:
+                self.fields.pop(name)
+
+class ProductSerializer(SparseFieldsetMixin, UniqueWriteMixin, serializers.ModelSerializer):
+    # Only the slug is unique; two names can still slugify alike ("Apple", "apple!")
+    unique_fields = ("slug",)
+    unique_error = {"name": ["This name gives the same slug as an existing product."]}
     category = CategorySerializer(read_only=True)
     category_id = serializers.PrimaryKeyRelatedField(write_only=True, queryset=Category.objects.all(), source='category')
     images = ProductImageSerializer(many=True, read_only=True)
 
     class Meta:
         model = Product
-        fields = ["id","name","slug","category","category_id","price","stock","created_at","images"]
+        fields = ["id","name","slug","category","category_id","price","stock","low_stock_threshold","created_at","images"]
+        # Follows the name (see Product.save)
+        read_only_fields = ("slug",)
 
 class CartItemSerializer(serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
@@ -66,6 +143,33 @@ class CartItemSerializer(serializers.ModelSerializer):
         fields = ['id','user','product','product_id','quantity','added_at']
         read_only_fields = ('user','added_at')
 
+class CartLineSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=0)  # 0 removes the line
+
+class CartBulkSerializer(serializers.Serializer):
+    lines = CartLineSerializer(many=True, allow_empty=False, max_length=500)
+
+    def validate_lines(self, lines):
+        product_ids = [line['product_id'] for line in lines]
+        if len(set(product_ids)) != len(product_ids):
+            raise serializers.ValidationError("Each product can only appear once.")
+        # Existence and stock for every product in one query
+        stock = dict(Product.objects.filter(id__in=[line['product_id'] for line in lines if line['quantity']]).values_list('id', 'stock'))
+        errors = []
+        for line in lines:
+            if not line['quantity']:
+                errors.append({})
+            elif line['product_id'] not in stock:
+                errors.append({'product_id': [f"Invalid pk \"{line['product_id']}\" - object does not exist."]})
+            elif line['quantity'] > stock[line['product_id']]:
+                errors.append({'quantity': ["Insufficient stock."]})
+            else:
+                errors.append({})
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return lines
+
 class WishlistItemSerializer(serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
     product_id = serializers.PrimaryKeyRelatedField(write_only=True, queryset=Product.objects.all(), source='product')
@@ -91,3 +195,18 @@ class PromoCodeSerializer(serializers.ModelSerializer):
     class Meta:
         model = PromoCode
         fields = '__all__'
+        read_only_fields = ('times_redeemed',)
+
+
+class StockUpdateSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    stock = serializers.IntegerField(min_value=0, required=False)
+    delta = serializers.IntegerField(required=False)
+
+    def validate(self, attrs):
+        if ('stock' in attrs) == ('delta' in attrs):
+            raise serializers.ValidationError("Give either an absolute 'stock' or a 'delta', not both.")
+        return attrs
+
+class StockBatchSerializer(serializers.Serializer):
+    updates = StockUpdateSerializer(many=True, allow_empty=False, max_length=10000)
@@ -1,15 +1,87 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, pre_delete
 from django.dispatch import receiver
-from django.db.models.expressions import CombinedExpression
-from .models import Product
+from .models import Product, Category, ProductImage, PromoCode, User
+from .authentication import revoke_user_tokens
+from .alerts import record_stock_changes
+from .cache import invalidate_products, invalidate_category
+from .categories import refresh_category_counts
+from .slugs import forget_product_slugs
+from .promos import invalidate_promo_codes
+from .search import get_search_backend
 
-LOW_STOCK_THRESHOLD = 5
+# Low-stock alerts are raised by `manage.py process_stock_events`; saves just
+# queue an event (checkout and the bulk paths queue their own, see store/alerts.py)
+@receiver(post_save, sender=Product)
+def queue_stock_event(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'stock' not in update_fields:
+        return
+    record_stock_changes([instance.id], 'save')
+
+
+@receiver(post_save, sender=Product)
+def update_search_index(sender, instance, **kwargs):
+    get_search_backend().update(instance)
+
+@receiver(post_delete, sender=Product)
+def remove_from_search_index(sender, instance, **kwargs):
+    get_search_backend().remove(instance.id)
+
+# Catalogue response cache invalidation (see store/cache.py)
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_product_cache(sender, instance, **kwargs):
+    invalidate_products([instance.id])
+    # Runs before save() records the new values, so this is the slug it had
+    forget_product_slugs(instance._loaded_values.get('slug'), instance.slug)
 
+# Category product counts (store/categories.py): only recounted when a product
+# joins or leaves a category or goes in/out of stock, not on every edit
 @receiver(post_save, sender=Product)
-def alert_low_stock(sender, instance, **kwargs):
-    # Skip check if stock is an expression (F() update)
-    if isinstance(instance.stock, CombinedExpression):
+def refresh_category_counts_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
         return
+    old = instance._loaded_values
+    if created:
+        refresh_category_counts([instance.category_id])
+    elif 'category_id' not in old or 'stock' not in old:
+        # Don't know what it was before, so recount everything
+        refresh_category_counts()
+    elif old['category_id'] != instance.category_id:
+        refresh_category_counts([old['category_id'], instance.category_id])
+    elif (old['stock'] > 0) != (instance.stock > 0):
+        refresh_category_counts([instance.category_id])
+
+@receiver(post_delete, sender=Product)
+def refresh_category_counts_on_delete(sender, instance, **kwargs):
+    refresh_category_counts([instance.category_id])
+
+# pre_delete: the category's products are still linked to it at that point
+@receiver([post_save, pre_delete], sender=Category)
+def invalidate_category_cache(sender, instance, **kwargs):
+    invalidate_category(instance)
+
+@receiver([post_save, post_delete], sender=ProductImage)
+def invalidate_product_image_cache(sender, instance, **kwargs):
+    invalidate_products([instance.product_id])
+
+# Promo code cache (store/promos.py); redemption counts are .update()s and don't land here
+@receiver([post_save, post_delete], sender=PromoCode)
+def invalidate_promo_code_cache(sender, instance, **kwargs):
+    invalidate_promo_codes()
+
+# Tokens carry the role/superuser flag and aren't re-checked against the DB,
+# so any change to what a user may do revokes the tokens they already hold
+ACCESS_FIELDS = ('role', 'is_active', 'is_superuser', 'password')
+
+@receiver(post_save, sender=User)
+def revoke_tokens_on_access_change(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # Compared with the values the user was loaded with, no query. A field we
+    # never loaded counts as changed: revoking too often is the safe mistake.
+    fields = ACCESS_FIELDS if update_fields is None else [f for f in ACCESS_FIELDS if f in update_fields]
+    old = instance._loaded_values
+    if not (raw or created) and any(old.get(field, None) != getattr(instance, field) for field in fields):
+        revoke_user_tokens(instance.pk)
+    instance.remember_values()
 
-    if instance.stock is not None and instance.stock <= LOW_STOCK_THRESHOLD:
-        print(f"[Alert] Low stock: '{instance.name}' has only {instance.stock} left!")
+@receiver(post_delete, sender=User)
+def revoke_tokens_on_delete(sender, instance, **kwargs):
+    revoke_user_tokens(instance.pk)
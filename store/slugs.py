@@ -0,0 +1,38 @@
+"""
+In-process slug -> id cache for the hybrid products/<slug>/<id>/ routes.
+
+The id finds the product; the slug only has to match it. Once we've seen
+which id a slug belongs to, a request whose slug names a different product
+(an old link after a rename, a typo, a crawler walking ids) gets its 404
+without a query. Matching requests still read the row, so a stale entry can
+never serve the wrong product.
+
+Entries live PRODUCT_SLUG_CACHE_TTL seconds and are dropped in this process
+when a product is saved or deleted. Another worker may keep an entry for a
+slug that was just renamed away and reused by a new product, and 404 that
+new product's URL until the entry expires.
+"""
+import time
+
+from django.conf import settings
+
+MAX_ENTRIES = 10000
+
+_slugs = {}  # slug -> (monotonic deadline, product id)
+
+
+def slug_matches(slug, product_id):
+    """False only when we know the slug belongs to another product."""
+    cached = _slugs.get(slug)
+    return not (cached and cached[0] > time.monotonic() and cached[1] != int(product_id))
+
+
+def remember_product_slug(slug, product_id):
+    if len(_slugs) >= MAX_ENTRIES:
+        _slugs.clear()
+    _slugs[slug] = (time.monotonic() + settings.PRODUCT_SLUG_CACHE_TTL, int(product_id))
+
+
+def forget_product_slugs(*slugs):
+    for slug in slugs:
+        _slugs.pop(slug, None)
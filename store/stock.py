@@ -0,0 +1,54 @@
+from django.db import transaction
+from django.db.models import Case, PositiveIntegerField, Value, When
+from django.utils import timezone
+
+from .alerts import record_stock_changes
+from .cache import invalidate_products
+from .categories import refresh_category_counts
+from .models import Product
+
+
+def apply_stock_updates(updates):
+    """
+    Apply [{'id': .., 'stock': n} | {'id': .., 'delta': +/-n}, ...] with one
+    locking SELECT and one UPDATE, whatever the batch size. Updates for the
+    same product are applied in order. Returns one result per update; an
+    update that is rejected (unknown product, stock would go negative)
+    doesn't stop the others.
+    """
+    ids = {u['id'] for u in updates}
+    results = []
+    changed = {}
+    with transaction.atomic():
+        products = {
+            p.id: p
+            for p in Product.objects.select_for_update().filter(id__in=ids).only('id', 'name', 'stock', 'category').order_by('id')
+        }
+        in_stock = {pk: p.stock > 0 for pk, p in products.items()}
+        for update in updates:
+            product = products.get(update['id'])
+            if product is None:
+                results.append({'id': update['id'], 'status': 'error', 'detail': "Product not found."})
+                continue
+            new_stock = update['stock'] if 'stock' in update else product.stock + update['delta']
+            if new_stock < 0:
+                results.append({'id': product.id, 'status': 'error', 'stock': product.stock,
+                                'detail': f"Stock can't go below 0 (currently {product.stock})."})
+                continue
+            product.stock = new_stock
+            changed[product.id] = product
+            results.append({'id': product.id, 'status': 'ok', 'stock': new_stock})
+
+        if changed:
+            # Rows are locked, so writing the final values (not F() deltas) is safe
+            Product.objects.filter(id__in=list(changed)).update(
+                stock=Case(
+                    *[When(id=pk, then=Value(p.stock)) for pk, p in changed.items()],
+                    output_field=PositiveIntegerField(),
+                ),
+                updated_at=timezone.now(),
+            )
+            invalidate_products(list(changed))
+            record_stock_changes(changed, 'stock_update')
+            refresh_category_counts([p.category_id for pk, p in changed.items() if (p.stock > 0) != in_stock[pk]])
+    return results
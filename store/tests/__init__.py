@@ -1 +1,2 @@
- 
+# For tests that store or render images: never the real bucket
+IN_MEMORY_STORAGES = {"default": {"BACKEND": "django.core.files.storage.InMemoryStorage"}}
@@ -0,0 +1,24 @@
+"""
+Test runner for `manage.py test` (TEST_RUNNER in settings).
+
+The replica routing tests (test_replicas.py) read through a `replica1`
+alias. Unless DB_REPLICA_HOSTS already configured one, this adds it as a
+mirror of the test database, so those tests run without any replica.
+"""
+import copy
+
+from django.conf import settings
+from django.db import connections
+from django.test.runner import DiscoverRunner
+
+REPLICA_ALIAS = 'replica1'
+
+
+class ReplicaMirrorTestRunner(DiscoverRunner):
+    def setup_databases(self, **kwargs):
+        if REPLICA_ALIAS not in settings.DATABASES:
+            default = copy.deepcopy(settings.DATABASES['default'])
+            settings.DATABASES[REPLICA_ALIAS] = {**default, 'TEST': {**default.get('TEST', {}), 'MIRROR': 'default'}}
+            # connections.settings is settings.DATABASES; fill in the new alias' defaults
+            connections.configure_settings(settings.DATABASES)
+        return super().setup_databases(**kwargs)
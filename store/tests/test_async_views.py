@@ -0,0 +1,88 @@
+import json
+
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+from django.core.cache import cache
+from django.test import AsyncClient, override_settings
+from django.urls import reverse
+from store.models import Product, Category, User, CartItem
+
+
+@override_settings(ROOT_URLCONF="grocery_backend.asgi_urls")
+class AsyncReadViewTests(APITestCase):
+    client_class = AsyncClient
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name="FRUITS")
+        self.products = [Product.objects.create(name=f"Apple {i}", category=self.category, price=5, stock=5) for i in range(5)]
+        self.user = User.objects.create_user(username="u1", password="pass")
+        self.auth = {"Authorization": f"Bearer {AccessToken.for_user(self.user)}"}
+
+    async def get_json(self, url, **kwargs):
+        response = await self.client.get(url, **kwargs)
+        return response, json.loads(response.content) if response.content else None
+
+    async def test_product_list_walks_both_ways(self):
+        response, page = await self.get_json(reverse("products-list"), data={"page_size": 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(page["previous"])
+        seen, pages = [], [page]
+        while page["next"]:
+            response, page = await self.get_json(page["next"])
+            pages.append(page)
+        seen = [p["id"] for page in pages for p in page["results"]]
+        self.assertEqual(seen, [p.id for p in reversed(self.products)])
+
+        # Back from the last page to the first
+        page = pages[-1]
+        back = [[p["id"] for p in page["results"]]]
+        while page["previous"]:
+            response, page = await self.get_json(page["previous"])
+            back.insert(0, [p["id"] for p in page["results"]])
+        self.assertEqual(back, [[p["id"] for p in page["results"]] for page in pages])
+
+    async def test_product_list_matches_sync_payload(self):
+        response, page = await self.get_json(reverse("products-list"), data={"fields": "id,name,category", "category": "fruits"})
+        self.assertEqual(page["results"][0], {"id": self.products[-1].id, "name": "Apple 4",
+                                              "category": {"id": self.category.id, "name": "FRUITS", "slug": "fruits", "low_stock_threshold": None,
+                                                           "parent": None, "path": "fruits/"}})
+        self.assertEqual(response["X-Cache"], "MISS")
+
+        again = await self.client.get(reverse("products-list"), data={"fields": "id,name,category", "category": "fruits"})
+        self.assertEqual(again["X-Cache"], "HIT")
+        not_modified = await self.client.get(reverse("products-list"), data={"fields": "id,name,category", "category": "fruits"},
+                                             headers={"If-None-Match": response["ETag"]})
+        self.assertEqual(not_modified.status_code, 304)
+
+    async def test_search_falls_back_to_the_drf_view(self):
+        response, page = await self.get_json(reverse("products-list"), data={"search": "apple 3"})
+        self.assertEqual([p["id"] for p in page["results"]], [self.products[3].id])
+
+    async def test_product_detail(self):
+        product = self.products[0]
+        response, data = await self.get_json(reverse("product-details", args=[product.slug, product.id]))
+        self.assertEqual((data["id"], data["images"]), (product.id, []))
+        response, data = await self.get_json(reverse("product-details", args=["nope", product.id]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_categories(self):
+        response, data = await self.get_json(reverse("categories-list"))
+        self.assertEqual([c["slug"] for c in data], ["fruits"])
+
+    async def test_cart_needs_a_valid_token(self):
+        await CartItem.objects.acreate(user=self.user, product=self.products[0], quantity=2)
+        response, data = await self.get_json(reverse("cart-list"))
+        self.assertEqual(response.status_code, 401)
+        self.assertIn("Bearer", response["WWW-Authenticate"])
+        response, data = await self.get_json(reverse("cart-list"), headers={"Authorization": "Bearer nope"})
+        self.assertEqual(response.status_code, 401)
+
+        response, data = await self.get_json(reverse("cart-list"), headers=self.auth)
+        self.assertEqual([(i["product"]["id"], i["quantity"]) for i in data], [(self.products[0].id, 2)])
+
+    async def test_writes_go_through_the_drf_view(self):
+        response = await self.client.post(reverse("cart-list"), {"product_id": self.products[1].id, "quantity": 1},
+                                          content_type="application/json", headers=self.auth)
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(await CartItem.objects.filter(user=self.user, product=self.products[1]).aexists())
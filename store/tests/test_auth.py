@@ -1,6 +1,12 @@
+from datetime import timedelta
+from unittest import mock
+
 from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+from django.core.cache import cache
 from django.urls import reverse
-from store.models import User
+from django.utils import timezone
+from store.models import User, Category, Product, CartItem, TokenRevocation
 
 class AuthTests(APITestCase):
     def test_register_customer(self):
@@ -22,3 +28,128 @@ class AuthTests(APITestCase):
 
         self.assertEqual(response.status_code, 200)
         self.assertIn("access", response.data)
+
+
+class StatelessTokenTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="u1", password="Test@123")
+        self.manager = User.objects.create_user(username="m1", password="Test@123", role="manager")
+        self.category = Category.objects.create(name="FRUITS")
+
+    def login(self, username):
+        response = self.client.post(reverse("token_obtain_pair"), {"username": username, "password": "Test@123"})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def use(self, tokens):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+
+    def test_tokens_carry_the_role(self):
+        self.assertEqual(AccessToken(self.login("m1")["access"])["role"], "manager")
+        self.assertEqual(AccessToken(self.login("u1")["access"])["role"], "customer")
+
+    def test_authenticated_requests_skip_the_user_lookup(self):
+        self.use(self.login("u1"))
+        self.client.get(reverse("cart-list"))  # warms the deny-list cache
+        with self.assertNumQueries(1):  # just the (empty) cart
+            self.assertEqual(self.client.get(reverse("cart-list")).status_code, 200)
+
+    def test_manager_permission_comes_from_the_claim(self):
+        self.use(self.login("m1"))
+        data = {"name": "Apple", "category_id": self.category.id, "price": 5, "stock": 5}
+        self.assertEqual(self.client.post(reverse("products-list"), data).status_code, 201)
+        self.use(self.login("u1"))
+        self.assertEqual(self.client.post(reverse("products-list"), data).status_code, 403)
+
+    def test_role_change_revokes_existing_tokens(self):
+        tokens = self.login("m1")
+        self.use(tokens)
+        self.client.get(reverse("cart-list"))
+        # Pretend the tokens are from an earlier second than the demotion
+        TokenRevocation.objects.all().delete()
+        with mock.patch("store.authentication.timezone.now", return_value=timezone.now() + timedelta(seconds=2)), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.manager.role = "customer"
+            self.manager.save()
+
+        response = self.client.get(reverse("cart-list"))
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.data["code"], "token_revoked")
+        self.assertEqual(self.client.post(reverse("token_refresh"), {"refresh": tokens["refresh"]}).status_code, 401)
+
+    def test_revocation_covers_tokens_from_earlier_in_the_same_second(self):
+        second = timezone.now().replace(microsecond=0)
+        with mock.patch("store.authentication.timezone.now", return_value=second + timedelta(milliseconds=200)):
+            self.use(self.login("m1"))
+        with mock.patch("store.authentication.timezone.now", return_value=second + timedelta(milliseconds=500)), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.manager.role = "customer"
+            self.manager.save()
+        response = self.client.get(reverse("cart-list"))
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.data["code"], "token_revoked")
+
+        # A login later in that same second gets a working token
+        with mock.patch("store.authentication.timezone.now", return_value=second + timedelta(milliseconds=800)):
+            self.use(self.login("m1"))
+        self.assertEqual(self.client.get(reverse("cart-list")).status_code, 200)
+
+    def test_unrelated_saves_dont_revoke(self):
+        self.use(self.login("u1"))
+        self.user.first_name = "Ann"
+        with self.assertNumQueries(1):  # just the UPDATE, no re-read to compare with
+            self.user.save()
+        self.assertEqual(self.client.get(reverse("cart-list")).status_code, 200)
+
+    def test_logout_revokes_access_and_refresh_tokens(self):
+        tokens = self.login("u1")
+        self.use(tokens)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post(reverse("logout"), {"refresh": tokens["refresh"]}).status_code, 204)
+        self.assertEqual(self.client.get(reverse("cart-list")).status_code, 401)
+        self.assertEqual(self.client.post(reverse("token_refresh"), {"refresh": tokens["refresh"]}).status_code, 401)
+
+        self.use(self.login("u1"))
+        self.assertEqual(self.client.get(reverse("cart-list")).status_code, 200)
+
+    def test_tokens_without_a_role_claim_still_work(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.manager)}")
+        data = {"name": "Apple", "category_id": self.category.id, "price": 5, "stock": 5}
+        self.assertEqual(self.client.post(reverse("products-list"), data).status_code, 201)
+
+    def test_checkout_with_a_token_user(self):
+        product = Product.objects.create(name="Apple", category=self.category, price=5, stock=5)
+        CartItem.objects.create(user=self.user, product=product, quantity=1)
+        self.use(self.login("u1"))
+        response = self.client.post(reverse("cart-checkout"), {})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["customer"], self.user.id)
+
+    def test_logouts_dont_grow_the_per_request_check(self):
+        tokens = self.login("u1")
+        for _ in range(3):
+            other = self.login("u1")
+            self.use(other)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse("logout"))
+        self.use(tokens)
+        self.client.get(reverse("cart-list"))
+        # Just this token's keys: no deny-list rebuild however many logouts there were
+        with self.assertNumQueries(1):  # the cart
+            self.assertEqual(self.client.get(reverse("cart-list")).status_code, 200)
+
+    def test_revocation_is_published_on_commit(self):
+        tokens = self.login("u1")
+        self.use(tokens)
+        self.client.get(reverse("cart-list"))  # caches "not revoked"
+        TokenRevocation.objects.all().delete()
+        with mock.patch("store.authentication.timezone.now", return_value=timezone.now() + timedelta(seconds=2)):
+            with self.captureOnCommitCallbacks(execute=False) as callbacks:
+                self.user.is_active = False
+                self.user.save()
+            # Not committed yet: still the cached answer
+            self.assertEqual(self.client.get(reverse("cart-list")).status_code, 200)
+            for callback in callbacks:
+                callback()
+        self.assertEqual(self.client.get(reverse("cart-list")).status_code, 401)
@@ -0,0 +1,65 @@
+import json
+
+from rest_framework.test import APITestCase
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from store.models import Product, Category, User
+
+CSV = b"""name,category,price,stock
+Apple,fruits,1.50,10
+Pear,FRUITS,2,5
+Milk,dairy,1,1
+Banana,fruits,abc,-1
+"""
+
+
+class BulkProductTests(APITestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username="manager", password="pass", role="manager")
+        self.client.force_authenticate(self.manager)
+        self.fruits = Category.objects.create(name="FRUITS")
+
+    def upload(self, content, name="products.csv"):
+        return self.client.post(
+            reverse("products-import-products"),
+            {"file": SimpleUploadedFile(name, content)},
+            format="multipart",
+        )
+
+    def test_import_upserts_and_reports_bad_rows(self):
+        Product.objects.create(name="Apple", category=None, price=9, stock=0)
+        response = self.upload(CSV)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["rows"], 4)
+        self.assertEqual(response.data["imported"], 2)
+        self.assertEqual([e["line"] for e in response.data["errors"]], [4, 5])
+        self.assertIn("category", response.data["errors"][0]["errors"])
+        self.assertEqual(set(response.data["errors"][1]["errors"]), {"price", "stock"})
+
+        apple = Product.objects.get(slug="apple")
+        self.assertEqual((apple.category, apple.price, apple.stock), (self.fruits, 1.5, 10))
+        self.assertEqual(Product.objects.count(), 2)
+
+    def test_import_ndjson_in_one_statement_per_chunk(self):
+        lines = "\n".join(json.dumps({"name": f"Apple {i}", "category": "fruits", "price": "1", "stock": i}) for i in range(50))
+        with self.assertNumQueries(6):  # categories + savepoint, upsert, stock events, release + category counts
+            response = self.upload(lines.encode(), name="products.ndjson")
+        self.assertEqual(response.data["imported"], 50)
+        self.assertEqual(Product.objects.filter(category=self.fruits).count(), 50)
+
+    def test_import_is_manager_only(self):
+        customer = User.objects.create_user(username="u1", password="pass")
+        self.client.force_authenticate(customer)
+        self.assertEqual(self.upload(CSV).status_code, 403)
+        self.assertEqual(self.client.get(reverse("products-export-products")).status_code, 403)
+
+    def test_export_round_trips(self):
+        self.upload(CSV)
+        response = self.client.get(reverse("products-export-products"))
+        self.assertTrue(response.streaming)
+        exported = b"".join(response.streaming_content)
+        self.assertEqual(exported.decode().splitlines()[0], "name,slug,category,price,stock")
+
+        Product.objects.all().delete()
+        self.assertEqual(self.upload(exported).data["imported"], 2)
+        self.assertEqual(sorted(Product.objects.values_list("slug", flat=True)), ["apple", "pear"])
@@ -1,7 +1,16 @@
+from decimal import Decimal
+from unittest import mock
+
 from rest_framework.test import APITestCase
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from store.models import Product, User, Category
+from store.models import Product, User, Category, CartItem, Order, ProductImage
+from store.tests import IN_MEMORY_STORAGES
 
+@override_settings(STORAGES=IN_MEMORY_STORAGES)
 class CartTests(APITestCase):
     def setUp(self):
         self.user = User.objects.create_user(username="u1", password="pass")
@@ -15,3 +24,187 @@ class CartTests(APITestCase):
         data = {"product_id": self.product.id, "quantity": 2}
         response = self.client.post(url, data)
         self.assertEqual(response.status_code, 201)
+
+    def test_adding_a_product_twice_is_a_validation_error(self):
+        data = {"product_id": self.product.id, "quantity": 1}
+        self.client.post(reverse("cart-list"), data)
+        response = self.client.post(reverse("cart-list"), data)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(CartItem.objects.get(user=self.user).quantity, 1)
+
+    def test_cart_list_query_count_is_constant(self):
+        cat = self.product.category
+        for i in range(5):
+            p = Product.objects.create(name=f"Pear {i}", category=cat, price=10, stock=10)
+            ProductImage.objects.create(product=p, image=f"product_images/pear{i}.jpg")
+            CartItem.objects.create(user=self.user, product=p, quantity=1)
+
+        # cart items + product images, however many lines there are
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("cart-list"))
+        self.assertEqual(len(response.data), 5)
+        self.assertEqual(len(response.data[0]["product"]["images"]), 1)
+
+
+class BulkCartTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="u1", password="pass")
+        self.client.force_authenticate(self.user)
+        cat = Category.objects.create(name="FRUITS")
+        self.products = [Product.objects.create(name=f"Item {i}", category=cat, price=5, stock=10) for i in range(25)]
+
+    def bulk(self, lines):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse("cart-bulk"), {"lines": lines}, format="json")
+        return response, len(ctx.captured_queries)
+
+    def test_upserts_and_removes_in_constant_queries(self):
+        CartItem.objects.create(user=self.user, product=self.products[0], quantity=1)
+        CartItem.objects.create(user=self.user, product=self.products[1], quantity=1)
+
+        response, small = self.bulk([{"product_id": self.products[0].id, "quantity": 4}, {"product_id": self.products[1].id, "quantity": 0}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(item["product"]["id"], item["quantity"]) for item in response.data], [(self.products[0].id, 4)])
+
+        response, large = self.bulk([{"product_id": p.id, "quantity": 2} for p in self.products[:20]] + [{"product_id": self.products[20].id, "quantity": 0}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 20)
+        self.assertEqual(small, large)
+        self.assertEqual(CartItem.objects.get(user=self.user, product=self.products[0]).quantity, 2)
+
+    def test_every_line_is_validated_before_anything_is_written(self):
+        response, _ = self.bulk([
+            {"product_id": self.products[0].id, "quantity": 1},
+            {"product_id": self.products[1].id, "quantity": 11},
+            {"product_id": 999999, "quantity": 1},
+        ])
+        self.assertEqual(response.status_code, 400)
+        errors = response.data["lines"]
+        self.assertEqual(errors[0], {})
+        self.assertEqual(errors[1]["quantity"], ["Insufficient stock."])
+        self.assertIn("product_id", errors[2])
+        self.assertFalse(CartItem.objects.exists())
+
+        response, _ = self.bulk([{"product_id": self.products[0].id, "quantity": 1}] * 2)
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(CART_BACKEND="store.carts.CacheCartBackend", CART_DURABILITY="checkout")
+    def test_cached_carts(self):
+        cache.clear()
+        self.client.post(reverse("cart-list"), {"product_id": self.products[0].id, "quantity": 1})
+        response, _ = self.bulk([{"product_id": self.products[0].id, "quantity": 3}, {"product_id": self.products[1].id, "quantity": 2}])
+        self.assertEqual([item["quantity"] for item in response.data], [3, 2])
+        self.assertFalse(CartItem.objects.exists())
+
+@override_settings(CART_BACKEND="store.carts.CacheCartBackend", CART_DURABILITY="checkout", CART_WRITER="store.carts.SyncCartWriter")
+class CacheCartTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="u1", password="pass")
+        self.client.force_authenticate(self.user)
+        cat = Category.objects.create(name="FRUITS")
+        self.apple = Product.objects.create(name="Apple", category=cat, price=50, stock=10)
+        self.pear = Product.objects.create(name="Pear", category=cat, price=20, stock=10)
+
+    def add(self, product, quantity=1):
+        return self.client.post(reverse("cart-list"), {"product_id": product.id, "quantity": quantity})
+
+    def test_cart_changes_never_touch_cart_rows(self):
+        with CaptureQueriesContext(connection) as ctx:
+            line = self.add(self.apple, 2).data
+            self.add(self.pear)
+            self.client.patch(reverse("cart-detail", args=[line["id"]]), {"quantity": 3})
+        self.assertFalse([q for q in ctx.captured_queries if "store_cartitem" in q["sql"] and not q["sql"].startswith("SELECT")])
+        self.assertFalse(CartItem.objects.exists())
+
+        # products + images
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("cart-list"))
+        self.assertEqual([(item["product"]["name"], item["quantity"]) for item in response.data], [("Apple", 3), ("Pear", 1)])
+
+        self.assertEqual(self.client.delete(reverse("cart-detail", args=[line["id"]])).status_code, 204)
+        self.assertEqual(self.client.delete(reverse("cart-detail", args=[line["id"]])).status_code, 404)
+        self.assertEqual([item["product"]["name"] for item in self.client.get(reverse("cart-list")).data], ["Pear"])
+
+    def test_same_product_twice_is_rejected(self):
+        self.assertEqual(self.add(self.apple).status_code, 201)
+        response = self.add(self.apple)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, ["Product is already in the cart."])
+
+    @mock.patch("store.carts.LOCK_TIMEOUT", 0.05)
+    def test_busy_cart_is_a_conflict(self):
+        lock = f"cart:{self.user.id}:lock"
+        cache.set(lock, "another request")
+        response = self.add(self.apple)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data["detail"].code, "cart_busy")
+        # Neither written under the other request's lock nor releasing it
+        self.assertEqual(cache.get(lock), "another request")
+        self.assertIsNone(cache.get(f"cart:{self.user.id}"))
+
+        cache.delete(lock)
+        self.assertEqual(self.add(self.apple).status_code, 201)
+
+    def test_existing_rows_are_carried_over(self):
+        row = CartItem.objects.create(user=self.user, product=self.apple, quantity=4)
+        response = self.client.get(reverse("cart-list"))
+        self.assertEqual([(item["id"], item["quantity"]) for item in response.data], [(row.id, 4)])
+        # "checkout" durability: the cache holds the only copy from now on
+        self.assertFalse(CartItem.objects.exists())
+        self.assertEqual(self.add(self.pear).data["id"], row.id + 1)
+
+    def test_checkout_from_cached_cart(self):
+        self.add(self.apple, 2)
+        self.add(self.pear, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("cart-checkout"), {})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Decimal(response.data["total_amount"]), Decimal("120"))
+        self.apple.refresh_from_db()
+        self.assertEqual(self.apple.stock, 8)
+        self.assertEqual(self.client.get(reverse("cart-list")).data, [])
+
+    def test_failed_checkout_keeps_the_cart(self):
+        self.add(self.apple, 5)
+        Product.objects.filter(id=self.apple.id).update(stock=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post(reverse("cart-checkout"), {}).status_code, 400)
+        self.assertEqual(len(self.client.get(reverse("cart-list")).data), 1)
+
+    def test_second_checkout_of_the_same_cart_finds_it_empty(self):
+        self.add(self.apple, 2)
+        # The first order's on_commit hasn't run yet when the retry comes in
+        self.assertEqual(self.client.post(reverse("cart-checkout"), {}).status_code, 201)
+        response = self.client.post(reverse("cart-checkout"), {})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["detail"], "Cart is empty.")
+        self.apple.refresh_from_db()
+        self.assertEqual(self.apple.stock, 8)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_failed_checkout_of_migrated_rows_leaves_no_rows(self):
+        CartItem.objects.create(user=self.user, product=self.apple, quantity=5)
+        Product.objects.filter(id=self.apple.id).update(stock=1)
+        self.assertEqual(self.client.post(reverse("cart-checkout"), {}).status_code, 400)
+        # The rows moved into the cache before the order's transaction, so its rollback can't bring them back
+        self.assertFalse(CartItem.objects.exists())
+        self.assertEqual([item["quantity"] for item in self.client.get(reverse("cart-list")).data], [5])
+
+    @override_settings(CART_DURABILITY="write_behind")
+    def test_write_behind_mirrors_the_cart(self):
+        line = self.add(self.apple, 2).data
+        self.add(self.pear)
+        self.client.patch(reverse("cart-detail", args=[line["id"]]), {"quantity": 5})
+        self.assertEqual(dict(CartItem.objects.values_list("product_id", "quantity")), {self.apple.id: 5, self.pear.id: 1})
+
+        self.client.delete(reverse("cart-detail", args=[line["id"]]))
+        self.assertEqual(list(CartItem.objects.values_list("product_id", flat=True)), [self.pear.id])
+
+        # A lost cache entry comes back from the rows
+        cache.clear()
+        self.assertEqual([item["product"]["name"] for item in self.client.get(reverse("cart-list")).data], ["Pear"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("cart-checkout"), {})
+        self.assertFalse(CartItem.objects.exists())
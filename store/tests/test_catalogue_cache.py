@@ -0,0 +1,69 @@
+from rest_framework.test import APITestCase
+from django.core.cache import cache
+from django.urls import reverse
+from store.models import Product, Category, User, CartItem
+
+class CatalogueCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name="FRUITS")
+        self.product = Product.objects.create(name="Apple", category=self.category, price=10, stock=10)
+        self.detail_url = reverse("product-details", args=[self.product.slug, self.product.id])
+
+    def test_repeat_listing_is_served_from_cache(self):
+        first = self.client.get(reverse("products-list"))
+        self.assertEqual(first["X-Cache"], "MISS")
+        with self.assertNumQueries(0):
+            second = self.client.get(reverse("products-list"))
+        self.assertEqual(second["X-Cache"], "HIT")
+        self.assertEqual(second.data, first.data)
+
+    def test_query_params_are_part_of_the_key(self):
+        self.client.get(reverse("products-list"))
+        response = self.client.get(reverse("products-list"), {"fields": "id"})
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(set(response.data["results"][0]), {"id"})
+
+    def test_product_save_invalidates(self):
+        self.client.get(reverse("products-list"))
+        self.client.get(self.detail_url)
+        self.product.price = 12
+        self.product.save()
+
+        self.assertEqual(self.client.get(reverse("products-list")).data["results"][0]["price"], "12.00")
+        self.assertEqual(self.client.get(self.detail_url).data["price"], "12.00")
+
+    def test_other_product_save_keeps_detail_cached(self):
+        self.client.get(self.detail_url)
+        Product.objects.create(name="Pear", category=self.category, price=10, stock=10)
+        self.assertEqual(self.client.get(self.detail_url)["X-Cache"], "HIT")
+
+    def test_category_rename_invalidates_nested_copies(self):
+        self.client.get(self.detail_url)
+        self.client.get(reverse("categories-list"))
+        self.category.name = "Fresh Fruits"
+        self.category.save()
+
+        self.assertEqual(self.client.get(self.detail_url).data["category"]["name"], "FRESH FRUITS")
+        self.assertEqual(self.client.get(reverse("categories-list")).data[0]["name"], "FRESH FRUITS")
+
+    def test_checkout_invalidates_stock(self):
+        self.client.get(self.detail_url)
+        user = User.objects.create_user(username="u1", password="pass")
+        CartItem.objects.create(user=user, product=self.product, quantity=3)
+        self.client.force_authenticate(user)
+        self.client.post(reverse("cart-checkout"), {})
+        self.assertEqual(self.client.get(self.detail_url).data["stock"], 7)
+
+    def test_etag_revalidation(self):
+        response = self.client.get(self.detail_url)
+        etag = response["ETag"]
+        with self.assertNumQueries(0):
+            not_modified = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+
+        self.product.stock = 3
+        self.product.save()
+        changed = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed["ETag"], etag)
@@ -1,6 +1,9 @@
 from rest_framework.test import APITestCase
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from store.models import Category, User
+from store.models import Category, Product, User
 
 class CategoryTests(APITestCase):
     def setUp(self):
@@ -15,8 +18,140 @@ class CategoryTests(APITestCase):
         response = self.client.post(url, data)
         self.assertEqual(response.status_code, 201)
 
+    def test_create_is_one_insert(self):
+        with self.assertNumQueries(3):  # savepoint, insert, release
+            response = self.client.post(reverse("categories-list"), {"name": "fruits"})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data["name"], response.data["slug"], response.data["path"]), ("FRUITS", "fruits", "fruits/"))
+
+    def test_duplicate_name_is_a_validation_error(self):
+        Category.objects.create(name="FRUITS")
+        with self.assertNumQueries(4):  # savepoint, failed insert, rollback, release
+            response = self.client.post(reverse("categories-list"), {"name": "Fruits"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["name"], ["Category already exists."])
+
+    def test_update_is_one_update(self):
+        cat = Category.objects.create(name="FRUITS")
+        url = reverse("category-details", args=[cat.slug, cat.id])
+        with self.assertNumQueries(4):  # lookup + savepoint, update, release
+            response = self.client.patch(url, {"low_stock_threshold": 3})
+        self.assertEqual(response.status_code, 200)
+        cat.refresh_from_db()
+        self.assertEqual((cat.low_stock_threshold, cat.slug), (3, "fruits"))
+
     def test_retrieve_category_slug_id(self):
         cat = Category.objects.create(name="FRUITS")
         url = reverse("category-details", args=[cat.slug, cat.id])
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
+
+
+class CategoryTreeTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.manager = User.objects.create_user(username="manager", password="pass123", role="manager")
+        self.food = Category.objects.create(name="FOOD")
+        self.fruits = Category.objects.create(name="FRUITS", parent=self.food)
+        self.citrus = Category.objects.create(name="CITRUS", parent=self.fruits)
+        self.drinks = Category.objects.create(name="DRINKS")
+
+    def tree(self):
+        response = self.client.get(reverse("categories-tree"))
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_paths_follow_the_tree(self):
+        self.assertEqual(self.citrus.path, "food/fruits/citrus/")
+        self.food.name = "GROCERIES"
+        self.food.save()
+        self.citrus.refresh_from_db()
+        self.assertEqual(self.citrus.path, "groceries/fruits/citrus/")
+
+        self.fruits.parent = self.drinks
+        self.fruits.save()
+        self.citrus.refresh_from_db()
+        self.assertEqual(self.citrus.path, "drinks/fruits/citrus/")
+
+    def test_tree_is_one_query_with_subtree_counts(self):
+        Product.objects.create(name="Orange", category=self.citrus, price=1, stock=5)
+        Product.objects.create(name="Lemon", category=self.citrus, price=1, stock=0)
+        Product.objects.create(name="Apple", category=self.fruits, price=1, stock=3)
+        with self.assertNumQueries(1):
+            data = self.tree().data
+        self.assertEqual([node["slug"] for node in data], ["drinks", "food"])
+        food = data[1]
+        self.assertEqual((food["product_count"], food["total_product_count"], food["total_in_stock_count"]), (0, 3, 2))
+        citrus = food["children"][0]["children"][0]
+        self.assertEqual((citrus["path"], citrus["product_count"], citrus["in_stock_count"]), ("food/fruits/citrus/", 2, 1))
+        # Cached until something changes
+        with self.assertNumQueries(0):
+            self.assertEqual(self.tree()["X-Cache"], "HIT")
+
+    def test_counts_follow_products(self):
+        apple = Product.objects.create(name="Apple", category=self.fruits, price=1, stock=1)
+        self.fruits.refresh_from_db()
+        self.assertEqual((self.fruits.product_count, self.fruits.in_stock_count), (1, 1))
+        self.tree()
+
+        # Selling the last one takes it out of the in-stock count
+        customer = User.objects.create_user(username="c", password="pass")
+        self.client.force_authenticate(customer)
+        self.client.post(reverse("cart-list"), {"product_id": apple.id, "quantity": 1})
+        self.assertEqual(self.client.post(reverse("cart-checkout")).status_code, 201)
+        self.fruits.refresh_from_db()
+        self.assertEqual((self.fruits.product_count, self.fruits.in_stock_count), (1, 0))
+        self.assertEqual(self.tree()["X-Cache"], "MISS")
+
+        apple = Product.objects.get(id=apple.id)
+        apple.category = self.citrus
+        apple.stock = 4
+        apple.save()
+        self.fruits.refresh_from_db()
+        self.citrus.refresh_from_db()
+        self.assertEqual((self.fruits.product_count, self.citrus.product_count, self.citrus.in_stock_count), (0, 1, 1))
+
+        lime = Product.objects.create(name="Lime", category=self.citrus, price=1, stock=0)
+        self.citrus.refresh_from_db()
+        self.assertEqual((self.citrus.product_count, self.citrus.in_stock_count), (2, 1))
+        lime.delete()
+        self.citrus.refresh_from_db()
+        self.assertEqual(self.citrus.product_count, 1)
+
+    def test_saves_that_dont_change_stock_status_dont_recount(self):
+        apple = Product.objects.create(name="Apple", category=self.fruits, price=1, stock=5)
+        apple = Product.objects.get(id=apple.id)
+        apple.stock = 4
+        with CaptureQueriesContext(connection) as ctx:
+            apple.save()
+        self.assertFalse(any("product_count" in q["sql"] for q in ctx.captured_queries))
+
+    def test_saves_leave_the_counts_alone(self):
+        Product.objects.create(name="Apple", category=self.fruits, price=1, stock=1)
+        # Loaded before the product was counted: saving it mustn't write back 0
+        self.fruits.low_stock_threshold = 2
+        self.fruits.save()
+        self.fruits.refresh_from_db()
+        self.assertEqual(self.fruits.product_count, 1)
+
+    def test_move_through_the_api(self):
+        self.client.force_authenticate(self.manager)
+        url = reverse("category-details", args=[self.fruits.slug, self.fruits.id])
+        response = self.client.patch(url, {"parent": self.drinks.id, "name": "Fresh Fruit"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["path"], "drinks/fresh-fruit/")
+        self.citrus.refresh_from_db()
+        self.assertEqual(self.citrus.path, "drinks/fresh-fruit/citrus/")
+
+    def test_category_cant_be_nested_under_its_own_subtree(self):
+        self.client.force_authenticate(self.manager)
+        url = reverse("category-details", args=[self.food.slug, self.food.id])
+        response = self.client.patch(url, {"parent": self.citrus.id})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("parent", response.data)
+
+    def test_category_with_subcategories_cant_be_deleted(self):
+        self.client.force_authenticate(self.manager)
+        response = self.client.delete(reverse("category-details", args=[self.food.slug, self.food.id]))
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(Category.objects.filter(id=self.food.id).exists())
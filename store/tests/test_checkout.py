@@ -1,6 +1,11 @@
-from rest_framework.test import APITestCase
+import threading
+
+from rest_framework.test import APITestCase, APIClient
+from django.db import connection
+from django.test import TransactionTestCase, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from store.models import Product, Category, User
+from store.models import Product, Category, User, CartItem, Order
 
 class CheckoutTests(APITestCase):
     def setUp(self):
@@ -8,6 +13,7 @@ class CheckoutTests(APITestCase):
         self.client.force_authenticate(self.user)
 
         cat = Category.objects.create(name="FRUITS")
+        self.category = cat
         self.product = Product.objects.create(name="Apple", category=cat, price=50, stock=10)
 
         # add cart item
@@ -17,3 +23,72 @@ class CheckoutTests(APITestCase):
         url = reverse("cart-checkout")
         response = self.client.post(url, {})
         self.assertEqual(response.status_code, 201)
+
+    def test_checkout_decrements_stock_and_clears_cart(self):
+        response = self.client.post(reverse("cart-checkout"), {})
+        self.assertEqual(response.status_code, 201)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 8)
+        self.assertEqual(len(response.data["items"]), 1)
+        self.assertFalse(CartItem.objects.filter(user=self.user).exists())
+
+    def test_second_checkout_cannot_oversell(self):
+        other = User.objects.create_user(username="u2", password="pass")
+        CartItem.objects.filter(user=self.user).update(quantity=6)
+        CartItem.objects.create(user=other, product=self.product, quantity=6)
+
+        self.assertEqual(self.client.post(reverse("cart-checkout"), {}).status_code, 201)
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.post(reverse("cart-checkout"), {}).status_code, 400)
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 4)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def _checkout_query_count(self, lines):
+        user = User.objects.create_user(username=f"bulk{lines}", password="pass")
+        for i in range(lines):
+            p = Product.objects.create(name=f"Item {lines}-{i}", category=self.category, price=5, stock=10)
+            CartItem.objects.create(user=user, product=p, quantity=1)
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse("cart-checkout"), {})
+        self.assertEqual(response.status_code, 201)
+        return len(ctx.captured_queries)
+
+    def test_checkout_query_count_is_constant(self):
+        self.assertEqual(self._checkout_query_count(1), self._checkout_query_count(10))
+
+
+@skipUnlessDBFeature("has_select_for_update")
+class ConcurrentCheckoutTests(TransactionTestCase):
+    def test_concurrent_checkouts_do_not_oversell(self):
+        cat = Category.objects.create(name="FRUITS")
+        product = Product.objects.create(name="Apple", category=cat, price=50, stock=10)
+        users = [User.objects.create_user(username=f"u{i}", password="pass") for i in range(5)]
+        for user in users:
+            CartItem.objects.create(user=user, product=product, quantity=3)
+
+        statuses = []
+        barrier = threading.Barrier(len(users))
+
+        def checkout(user):
+            client = APIClient()
+            client.force_authenticate(user)
+            barrier.wait()
+            try:
+                statuses.append(client.post(reverse("cart-checkout"), {}).status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=checkout, args=(u,)) for u in users]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        product.refresh_from_db()
+        self.assertEqual(statuses.count(201), 3)
+        self.assertEqual(statuses.count(400), 2)
+        self.assertEqual(product.stock, 1)
+        self.assertEqual(Order.objects.count(), 3)
@@ -0,0 +1,127 @@
+from io import StringIO
+from unittest import mock
+
+from rest_framework.test import APITestCase
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import override_settings
+from django.urls import reverse
+from store import alerts
+from store.alerts import process_stock_events
+from store.models import Product, Category, User, CartItem, StockEvent, LowStockAlert
+
+
+@override_settings(LOW_STOCK_THRESHOLD=5, LOW_STOCK_NOTIFIER="store.alerts.LogNotifier")
+class LowStockAlertTests(APITestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="FRUITS")
+        self.apple = Product.objects.create(name="Apple", category=self.category, price=10, stock=10)
+        self.pear = Product.objects.create(name="Pear", category=self.category, price=10, stock=10)
+        process_stock_events()
+
+    def process(self):
+        """(summary, ids of the products the notifier was told about)"""
+        with mock.patch("store.alerts.LogNotifier.notify") as notify:
+            summary = process_stock_events()
+        notified = [a.product_id for call in notify.call_args_list for a in call.args[0]]
+        return summary, sorted(notified)
+
+    def checkout(self, product, quantity):
+        user = User.objects.create_user(username=f"u{User.objects.count()}", password="pass")
+        CartItem.objects.create(user=user, product=product, quantity=quantity)
+        self.client.force_authenticate(user)
+        self.assertEqual(self.client.post(reverse("cart-checkout"), {}).status_code, 201)
+
+    def test_checkout_queues_an_event_instead_of_alerting_inline(self):
+        with mock.patch("store.alerts.LogNotifier.notify") as notify:
+            self.checkout(self.apple, 6)
+        notify.assert_not_called()
+        self.assertEqual(list(StockEvent.objects.values_list("product_id", "source")), [(self.apple.id, "checkout")])
+
+        summary, notified = self.process()
+        self.assertEqual(notified, [self.apple.id])
+        self.assertEqual((summary["events"], summary["alerted"]), (1, 1))
+        self.assertFalse(StockEvent.objects.exists())
+        alert = LowStockAlert.objects.get()
+        self.assertEqual((alert.stock, alert.threshold), (4, 5))
+
+    def test_events_are_collapsed_and_alerts_not_repeated(self):
+        self.checkout(self.apple, 6)
+        self.checkout(self.apple, 1)
+        self.assertEqual(self.process()[1], [self.apple.id])
+
+        # Still low: the alert is kept up to date but not sent again
+        self.checkout(self.apple, 1)
+        self.assertEqual(self.process()[1], [])
+        self.assertEqual(LowStockAlert.objects.get().stock, 2)
+
+        # Restocked clears it, running low again alerts again
+        self.apple.stock = 20
+        self.apple.save()
+        summary, _ = self.process()
+        self.assertEqual(summary["cleared"], 1)
+        self.assertFalse(LowStockAlert.objects.exists())
+        self.checkout(self.apple, 18)
+        self.assertEqual(self.process()[1], [self.apple.id])
+
+    def test_thresholds_product_then_category_then_default(self):
+        self.category.low_stock_threshold = 8
+        self.category.save()
+        self.pear.low_stock_threshold = 2
+        self.pear.save()
+        other = Product.objects.create(name="Salt", price=1, stock=6)
+        self.process()
+
+        Product.objects.filter(id__in=[self.apple.id, self.pear.id]).update(stock=7)
+        self.client.force_authenticate(User.objects.create_user(username="m", password="pass", role="manager"))
+        self.client.post(reverse("products-stock"), {"updates": [
+            {"id": self.apple.id, "stock": 7},  # category threshold 8
+            {"id": self.pear.id, "stock": 3},   # own threshold 2
+            {"id": other.id, "stock": 5},       # default 5
+        ]}, format="json")
+        self.assertEqual(self.process()[1], sorted([self.apple.id, other.id]))
+
+    def test_saves_that_skip_stock_dont_queue_events(self):
+        self.apple.name = "Green Apple"
+        self.apple.save(update_fields=["name", "slug"])
+        self.assertFalse(StockEvent.objects.exists())
+
+    def test_alert_inserted_by_another_consumer_is_skipped(self):
+        self.checkout(self.apple, 6)
+        current_levels = alerts._current_levels
+
+        def racing_consumer(product_ids):
+            # Another worker took a different event for the same product
+            LowStockAlert.objects.create(product=self.apple, stock=4, threshold=5)
+            return current_levels(product_ids)
+
+        with mock.patch("store.alerts._current_levels", racing_consumer):
+            summary, notified = self.process()
+        self.assertEqual(notified, [])
+        self.assertEqual(summary["alerted"], 0)
+        self.assertFalse(StockEvent.objects.exists())
+        self.assertEqual(LowStockAlert.objects.count(), 1)
+
+    def test_looping_worker_survives_failed_batches(self):
+        empty = {"events": 0, "products": 0, "alerted": 0, "cleared": 0}
+        results = [DatabaseError("deadlock detected"), DatabaseError("deadlock detected"), empty, KeyboardInterrupt]
+        command = "store.management.commands.process_stock_events"
+        with mock.patch(f"{command}.process_stock_events", side_effect=results), \
+                mock.patch(f"{command}.close_old_connections"), \
+                mock.patch(f"{command}.time.sleep") as sleep, \
+                self.assertLogs(command, "ERROR") as logs, \
+                self.assertRaises(KeyboardInterrupt):
+            call_command("process_stock_events", "--loop", "--interval", "2", stdout=StringIO())
+        self.assertEqual(len(logs.output), 2)
+        # Backs off while failing, back to the normal interval once a batch succeeds
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [2, 4, 2])
+
+    def test_command_drains_the_outbox_in_batches(self):
+        for i in range(5):
+            Product.objects.create(name=f"Plum {i}", price=1, stock=1)
+        out = StringIO()
+        with self.assertLogs("store.alerts", "WARNING") as logs:
+            call_command("process_stock_events", "--batch-size", "2", stdout=out)
+        self.assertEqual(len(logs.output), 5)
+        self.assertIn("Done: 5 events, 5 new alerts", out.getvalue())
+        self.assertFalse(StockEvent.objects.exists())
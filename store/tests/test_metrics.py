@@ -0,0 +1,80 @@
+import re
+
+from rest_framework.test import APITestCase
+from django.conf import settings
+from django.test import AsyncClient, override_settings
+from django.urls import reverse
+from store.metrics import install_query_recorder, registry
+from store.models import Product, Category, User, CartItem
+
+WITH_METRICS = ["store.metrics.MetricsMiddleware", *settings.MIDDLEWARE]
+
+
+def sample(text, name, **labels):
+    wanted = ",".join(f'{k}="{v}"' for k, v in labels.items())
+    match = re.search(rf"^{re.escape(name)}\{{{re.escape(wanted)}\}} (\S+)$", text, re.M)
+    return match and float(match.group(1))
+
+
+@override_settings(METRICS_ENABLED=True, METRICS_TOKEN="s3cret", METRICS_SLOW_REQUEST_MS=0, MIDDLEWARE=WITH_METRICS)
+class MetricsTests(APITestCase):
+    def setUp(self):
+        registry.reset()
+        # The test connection predates the middleware; async views query through it from this thread
+        install_query_recorder()
+        self.user = User.objects.create_user(username="u1", password="pass")
+        self.category = Category.objects.create(name="FRUITS")
+        for i in range(3):
+            CartItem.objects.create(user=self.user, product=Product.objects.create(name=f"Apple {i}", category=self.category, price=5, stock=5))
+
+    def metrics(self):
+        response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_requests_are_recorded_per_view(self):
+        self.client.force_authenticate(self.user)
+        self.client.get(reverse("cart-list"))
+        self.client.get(reverse("cart-list"))
+        self.client.get("/api/nowhere/")
+
+        text = self.metrics()
+        self.assertEqual(sample(text, "store_requests_total", view="cart-list", method="GET", status="200"), 2)
+        self.assertEqual(sample(text, "store_request_duration_seconds_count", view="cart-list", method="GET"), 2)
+        # cart + images prefetch, twice
+        self.assertEqual(sample(text, "store_request_db_queries_sum", view="cart-list", method="GET"), 4)
+        self.assertEqual(sample(text, "store_request_db_queries_bucket", view="cart-list", method="GET", le="1"), 0)
+        self.assertEqual(sample(text, "store_request_db_queries_bucket", view="cart-list", method="GET", le="2"), 2)
+        self.assertEqual(sample(text, "store_requests_total", view="<unresolved>", method="GET", status="404"), 1)
+        self.assertNotIn('view="metrics"', self.metrics())
+
+    @override_settings(METRICS_SLOW_REQUEST_MS=0.001)
+    def test_slow_requests_are_logged_with_their_sql(self):
+        self.client.force_authenticate(self.user)
+        with self.assertLogs("store.metrics", "WARNING") as logs:
+            self.client.get(reverse("cart-list"))
+        self.assertIn("(cart-list) 200", logs.output[0])
+        self.assertIn('FROM "store_cartitem"', logs.output[0])
+
+    def test_token_protects_the_endpoint(self):
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 401)
+        self.assertEqual(self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer guess").status_code, 401)
+        response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(METRICS_TOKEN="")
+    def test_no_token_means_no_access(self):
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+        self.assertEqual(self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer ").status_code, 403)
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_endpoint_is_off_unless_enabled(self):
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 404)
+
+    @override_settings(ROOT_URLCONF="grocery_backend.asgi_urls")
+    async def test_async_views_are_counted(self):
+        response = await AsyncClient().get(reverse("products-list"))
+        self.assertEqual(response.status_code, 200)
+        text = registry.render()
+        self.assertEqual(sample(text, "store_request_duration_seconds_count", view="products-list", method="GET"), 1)
+        self.assertGreaterEqual(sample(text, "store_request_db_queries_sum", view="products-list", method="GET"), 1)
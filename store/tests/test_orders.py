@@ -0,0 +1,64 @@
+from rest_framework.test import APITestCase
+from django.test import override_settings
+from django.urls import reverse
+from store.models import Product, Category, User, CartItem, ProductImage
+from store.tests import IN_MEMORY_STORAGES
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES)
+class OrderHistoryTests(APITestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(username="u1", password="pass")
+        self.other = User.objects.create_user(username="u2", password="pass")
+        self.manager = User.objects.create_user(username="manager", password="pass", role="manager")
+        self.category = Category.objects.create(name="FRUITS")
+
+    def place_order(self, user, lines):
+        for i in range(lines):
+            p = Product.objects.create(name=f"{user.username} item {Product.objects.count()}", category=self.category, price=5, stock=10)
+            ProductImage.objects.create(product=p, image=f"product_images/{p.slug}.jpg")
+            CartItem.objects.create(user=user, product=p, quantity=1)
+        self.client.force_authenticate(user)
+        self.assertEqual(self.client.post(reverse("cart-checkout"), {}).status_code, 201)
+
+    def test_customer_sees_only_own_orders_newest_first(self):
+        self.place_order(self.customer, 1)
+        self.place_order(self.other, 1)
+        self.place_order(self.customer, 2)
+
+        self.client.force_authenticate(self.customer)
+        response = self.client.get(reverse("orders-list"))
+        self.assertEqual(response.status_code, 200)
+        orders = response.data["results"]
+        self.assertEqual([len(o["items"]) for o in orders], [2, 1])
+        self.assertTrue(all(o["customer"] == self.customer.id for o in orders))
+        self.assertEqual(orders[0]["items"][0]["product"]["category"]["name"], "FRUITS")
+
+    def test_listing_query_count_is_constant(self):
+        for _ in range(3):
+            self.place_order(self.customer, 3)
+        self.client.force_authenticate(self.customer)
+        # orders + items (with product/category) + images
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("orders-list"))
+        self.assertEqual(len(response.data["results"]), 3)
+
+    def test_keyset_pagination(self):
+        for _ in range(3):
+            self.place_order(self.customer, 1)
+        self.client.force_authenticate(self.customer)
+        response = self.client.get(reverse("orders-list"), {"page_size": 2})
+        ids = [o["id"] for o in response.data["results"]]
+        ids += [o["id"] for o in self.client.get(response.data["next"]).data["results"]]
+        self.assertEqual(len(set(ids)), 3)
+
+    def test_manager_orders(self):
+        self.place_order(self.customer, 1)
+        self.place_order(self.other, 1)
+
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get(reverse("manager-orders-list")).status_code, 403)
+
+        self.client.force_authenticate(self.manager)
+        self.assertEqual(len(self.client.get(reverse("manager-orders-list")).data["results"]), 2)
+        response = self.client.get(reverse("manager-orders-list"), {"customer": self.other.id})
+        self.assertEqual([o["customer"] for o in response.data["results"]], [self.other.id])
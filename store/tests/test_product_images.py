@@ -1,8 +1,30 @@
+import threading
+import time
+from io import BytesIO
+
 from rest_framework.test import APITestCase
-from django.urls import reverse
+from django.core.files.storage import InMemoryStorage
 from django.core.files.uploadedfile import SimpleUploadedFile
-from store.models import Product, Category, User
+from django.test import override_settings
+from django.urls import reverse
+from PIL import Image
+from store.models import Product, Category, User, ProductImage
+from store.tests import IN_MEMORY_STORAGES
+
+UPLOAD_LATENCY = 0.2
+
+
+class SlowStorage(InMemoryStorage):
+    """In-memory storage that takes UPLOAD_LATENCY seconds per file, like a remote bucket."""
+    _lock = threading.Lock()
+
+    def _save(self, name, content):
+        time.sleep(UPLOAD_LATENCY)
+        with self._lock:
+            return super()._save(name, content)
+
 
+@override_settings(STORAGES=IN_MEMORY_STORAGES)
 class ProductImageTests(APITestCase):
     def setUp(self):
         self.manager = User.objects.create_user(username="manager", password="pass123", role="manager")
@@ -16,3 +38,67 @@ class ProductImageTests(APITestCase):
         img = SimpleUploadedFile("test.jpg", b"image_data", content_type="image/jpeg")
         response = self.client.post(url, {"images": img}, format="multipart")
         self.assertEqual(response.status_code, 201)
+
+    @override_settings(
+        STORAGES={"default": {"BACKEND": "store.tests.test_product_images.SlowStorage"}},
+        PRODUCT_IMAGE_UPLOAD_WORKERS=4,
+    )
+    def test_uploads_run_in_parallel(self):
+        url = reverse("product-images-list-create", args=[self.product.id])
+        files = [SimpleUploadedFile(f"test{i}.jpg", b"image_data", content_type="image/jpeg") for i in range(4)]
+
+        start = time.perf_counter()
+        response = self.client.post(url, {"images": files}, format="multipart")
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data), 4)
+        self.assertEqual(ProductImage.objects.filter(product=self.product).count(), 4)
+        # Bounded by the slowest upload, not the sum of all four
+        self.assertLess(elapsed, UPLOAD_LATENCY * 2)
+
+    def test_rejects_more_than_seven_images(self):
+        url = reverse("product-images-list-create", args=[self.product.id])
+        files = [SimpleUploadedFile(f"test{i}.jpg", b"image_data", content_type="image/jpeg") for i in range(8)]
+        response = self.client.post(url, {"images": files}, format="multipart")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ProductImage.objects.exists())
+
+
+@override_settings(IMAGE_DERIVATIVE_WORKER="store.images.SyncDerivativeWorker", STORAGES=IN_MEMORY_STORAGES)
+class ProductImageDerivativeTests(APITestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username="manager", password="pass123", role="manager")
+        self.client.force_authenticate(self.manager)
+        cat = Category.objects.create(name="FRUITS")
+        self.product = Product.objects.create(name="Apple", category=cat, price=10, stock=10)
+        self.url = reverse("product-images-list-create", args=[self.product.id])
+
+    def make_png(self, size=(2000, 1000)):
+        buf = BytesIO()
+        Image.new("RGBA", size, (200, 30, 30, 255)).save(buf, "PNG")
+        return SimpleUploadedFile("apple.png", buf.getvalue(), content_type="image/png")
+
+    def test_upload_generates_renditions(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, {"images": self.make_png()}, format="multipart")
+        self.assertEqual(response.status_code, 201)
+
+        obj = ProductImage.objects.get()
+        with obj.thumbnail.open("rb") as fh, Image.open(fh) as thumb:
+            self.assertEqual(thumb.size, (160, 80))
+            self.assertEqual(thumb.format, "JPEG")
+        with obj.webp.open("rb") as fh, Image.open(fh) as webp:
+            self.assertEqual(webp.format, "WEBP")
+        self.assertTrue(obj.medium.name.startswith("product_images/"))
+
+        listing = self.client.get(self.url)
+        self.assertTrue(listing.data[0]["thumbnail"].endswith("_thumbnail.jpg"))
+
+    def test_unreadable_upload_is_kept_without_renditions(self):
+        img = SimpleUploadedFile("test.jpg", b"image_data", content_type="image/jpeg")
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, {"images": img}, format="multipart")
+        self.assertEqual(response.status_code, 201)
+        self.assertIsNone(response.data[0]["thumbnail"])
+        self.assertFalse(ProductImage.objects.get().thumbnail)
@@ -1,6 +1,11 @@
+from unittest import mock
+
 from rest_framework.test import APITestCase
+from django.core.cache import cache
+from django.db import IntegrityError
 from django.urls import reverse
 from store.models import Product, Category, User
+from store import slugs
 
 class ProductTests(APITestCase):
     def setUp(self):
@@ -10,6 +15,8 @@ class ProductTests(APITestCase):
         self.client.force_authenticate(self.manager)
 
         self.category = Category.objects.create(name="FRUITS")
+        cache.clear()
+        slugs._slugs.clear()
 
     def test_create_product(self):
         url = reverse("products-list")
@@ -27,3 +34,86 @@ class ProductTests(APITestCase):
         url = reverse("product-details", args=[product.slug, product.id])
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
+
+    def test_list_is_cursor_paginated(self):
+        for i in range(5):
+            Product.objects.create(name=f"Apple {i}", category=self.category, price=50, stock=5)
+        response = self.client.get(reverse("products-list"), {"page_size": 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), 2)
+
+        seen = [p["id"] for p in response.data["results"]]
+        while response.data["next"]:
+            response = self.client.get(response.data["next"])
+            seen += [p["id"] for p in response.data["results"]]
+        self.assertEqual(seen, list(Product.objects.order_by("-created_at", "-id").values_list("id", flat=True)))
+
+    def test_popular_walks_past_long_runs_of_ties(self):
+        # Every product ties on sold=0, far more of them than DRF's offset_cutoff
+        Product.objects.bulk_create(
+            Product(name=f"Apple {i}", slug=f"apple-{i}", category=self.category, price=10, stock=5) for i in range(1300)
+        )
+        response = self.client.get(reverse("products-list"), {"popular": "most", "page_size": 100})
+        seen = [p["id"] for p in response.data["results"]]
+        while response.data["next"]:
+            response = self.client.get(response.data["next"])
+            seen += [p["id"] for p in response.data["results"]]
+        self.assertEqual(seen, sorted(Product.objects.values_list("id", flat=True), reverse=True))
+
+        # And back again
+        previous = self.client.get(response.data["previous"]).data
+        self.assertEqual([p["id"] for p in previous["results"]], seen[-200:-100])
+
+    def test_tampered_cursor_is_a_404(self):
+        response = self.client.get(reverse("products-list"), {"cursor": "cD1bIngiXQ=="})  # p=["x"]
+        self.assertEqual(response.status_code, 404)
+
+    def test_sparse_fieldsets(self):
+        Product.objects.create(name="Apple", category=self.category, price=50, stock=5)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("products-list"), {"fields": "id,name,price"})
+        self.assertEqual(set(response.data["results"][0]), {"id", "name", "price"})
+
+    def test_create_checks_nothing_the_constraints_already_do(self):
+        data = {"name": "Apple", "category_id": self.category.id, "price": "50.00", "stock": 10}
+        # category lookup + savepoint, insert, stock event, category counts, release + images
+        with self.assertNumQueries(7):
+            response = self.client.post(reverse("products-list"), data)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["slug"], "apple")
+
+        response = self.client.post(reverse("products-list"), {**data, "name": "apple"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["name"], ["This name gives the same slug as an existing product."])
+
+    def test_other_integrity_errors_arent_reported_as_duplicates(self):
+        data = {"name": "Apple", "category_id": self.category.id, "price": "50.00", "stock": 10}
+        error = IntegrityError("FOREIGN KEY constraint failed")
+        with mock.patch.object(Product, "save", side_effect=error), self.assertRaises(IntegrityError):
+            self.client.post(reverse("products-list"), data)
+
+    def test_update_reads_the_product_once(self):
+        product = Product.objects.create(name="Apple", category=self.category, price=50, stock=5)
+        url = reverse("product-details", args=[product.slug, product.id])
+        # product + category, savepoint, update, stock event, release, images
+        with self.assertNumQueries(6):
+            response = self.client.patch(url, {"price": "45.00"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["category"]["slug"], "fruits")
+
+    def test_rename_moves_the_slug(self):
+        product = Product.objects.create(name="Apple", category=self.category, price=50, stock=5)
+        response = self.client.patch(reverse("product-details", args=[product.slug, product.id]), {"name": "Green Apple"})
+        self.assertEqual(response.data["slug"], "green-apple")
+        self.assertEqual(self.client.get(reverse("product-details", args=["green-apple", product.id])).status_code, 200)
+        self.assertEqual(self.client.get(reverse("product-details", args=["apple", product.id])).status_code, 404)
+
+    def test_retrieve_is_one_lookup(self):
+        product = Product.objects.create(name="Apple", category=self.category, price=50, stock=5)
+        other = Product.objects.create(name="Pear", category=self.category, price=50, stock=5)
+        with self.assertNumQueries(2):  # product + category, images
+            self.assertEqual(self.client.get(reverse("product-details", args=[product.slug, product.id])).status_code, 200)
+        # A slug we've seen belong to another product is a 404 without a query
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("product-details", args=[product.slug, other.id]))
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,76 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from rest_framework.test import APITestCase
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from store.models import Product, Category, User, CartItem, Order, PromoCode
+
+
+class PromoCodeCheckoutTests(APITestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username="manager", password="pass", role="manager")
+        self.product = Product.objects.create(name="Apple", category=Category.objects.create(name="FRUITS"), price=100, stock=50)
+        self.promo = PromoCode.objects.create(code="SAVE10", discount_type="percent", value=10, max_redemptions=2)
+
+    def checkout(self, code="SAVE10"):
+        user = User.objects.create_user(username=f"u{User.objects.count()}", password="pass")
+        CartItem.objects.create(user=user, product=self.product, quantity=1)
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse("cart-checkout"), {"promo_code": code})
+        promo_selects = [q for q in ctx.captured_queries if q["sql"].startswith("SELECT") and "store_promocode" in q["sql"]]
+        return response, promo_selects
+
+    def test_lookup_is_cached_and_redemptions_counted(self):
+        response, selects = self.checkout()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Decimal(response.data["total_amount"]), Decimal("90"))
+
+        response, selects = self.checkout()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(selects, [])
+        self.promo.refresh_from_db()
+        self.assertEqual(self.promo.times_redeemed, 2)
+
+    def test_redemption_limit_rolls_back_the_order(self):
+        self.assertEqual(self.checkout()[0].status_code, 201)
+        self.assertEqual(self.checkout()[0].status_code, 201)
+        response, _ = self.checkout()
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Order.objects.count(), 2)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 48)
+
+    def test_manager_edits_invalidate_the_cache(self):
+        self.checkout()
+        self.client.force_authenticate(self.manager)
+        response = self.client.patch(f"/api/promocodes/{self.promo.id}/", {"value": 50, "times_redeemed": 99})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["times_redeemed"], 1)
+
+        response, _ = self.checkout()
+        self.assertEqual(Decimal(response.data["total_amount"]), Decimal("50"))
+
+        self.client.force_authenticate(self.manager)
+        self.client.delete(f"/api/promocodes/{self.promo.id}/")
+        self.assertEqual(self.checkout()[0].data["detail"], "Invalid promo code")
+
+    def test_cached_code_expires_on_time(self):
+        PromoCode.objects.filter(id=self.promo.id).update(expires_at=timezone.now() + timedelta(minutes=5))
+        self.promo.save(update_fields=["is_active"])  # invalidate after the .update()
+        self.assertEqual(self.checkout()[0].status_code, 201)
+        later = timezone.now() + timedelta(minutes=10)
+        with mock.patch("store.promos.timezone.now", return_value=later):
+            response, selects = self.checkout()
+        self.assertEqual(response.data["detail"], "Promo code expired.")
+        self.assertEqual(selects, [])
+
+    def test_unknown_codes_are_cached_too(self):
+        self.assertEqual(self.checkout("NOPE")[0].status_code, 400)
+        response, selects = self.checkout("NOPE")
+        self.assertEqual(response.data["detail"], "Invalid promo code")
+        self.assertEqual(selects, [])
@@ -0,0 +1,92 @@
+"""
+EXPLAIN-based checks for the hot query paths. Every SELECT an endpoint runs
+is captured and explained; the test fails (printing the plan) if a guarded
+table is read with a full scan or sorted in memory. Postgres is told not to
+seq scan so the tiny test tables don't hide a missing index.
+"""
+from rest_framework.test import APITestCase
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from store.models import Product, Category, User, ProductImage, CartItem, PromoCode
+from store.tests import IN_MEMORY_STORAGES
+
+
+def explain(sql):
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute(f"EXPLAIN {sql}")
+            return [row[0] for row in cursor.fetchall()]
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def is_full_scan(line, table):
+    if connection.vendor == "postgresql":
+        return f"Seq Scan on {table}" in line
+    return line.strip() == f"SCAN {table}"
+
+
+def is_in_memory_sort(line):
+    if connection.vendor == "postgresql":
+        return line.strip().startswith("Sort")
+    return "USE TEMP B-TREE FOR ORDER BY" in line
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES)
+class QueryPlanTests(APITestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username="manager", password="pass", role="manager")
+        self.category = Category.objects.create(name="FRUITS")
+        for i in range(3):
+            p = Product.objects.create(name=f"Apple {i}", category=self.category, price=10, stock=10)
+            ProductImage.objects.create(product=p, image=f"product_images/apple{i}.jpg")
+
+    def capture_plans(self, request):
+        with CaptureQueriesContext(connection) as ctx:
+            response = request()
+        self.assertLess(response.status_code, 400)
+        selects = [q["sql"] for q in ctx.captured_queries if q["sql"].lstrip().upper().startswith("SELECT")]
+        return {sql: explain(sql) for sql in selects}
+
+    def assertIndexed(self, plans, table, sorted_by_index=False):
+        for sql, plan in plans.items():
+            if f'"{table}"' not in sql:
+                continue
+            text = "\n".join(plan)
+            for line in plan:
+                self.assertFalse(is_full_scan(line, table), f"Full scan of {table}:\n{sql}\n{text}")
+                if sorted_by_index:
+                    self.assertFalse(is_in_memory_sort(line), f"In-memory sort:\n{sql}\n{text}")
+
+    def test_product_listing(self):
+        plans = self.capture_plans(lambda: self.client.get(reverse("products-list")))
+        self.assertIndexed(plans, "store_product", sorted_by_index=True)
+        self.assertIndexed(plans, "store_productimage")
+
+    def test_product_listing_by_category(self):
+        plans = self.capture_plans(lambda: self.client.get(reverse("products-list"), {"category": "fruits"}))
+        self.assertIndexed(plans, "store_product", sorted_by_index=True)
+
+    def test_checkout_with_promo_code(self):
+        PromoCode.objects.create(code="SAVE10", discount_type="percent", value=10)
+        user = User.objects.create_user(username="u1", password="pass")
+        CartItem.objects.create(user=user, product=Product.objects.first(), quantity=1)
+        self.client.force_authenticate(user)
+        plans = self.capture_plans(lambda: self.client.post(reverse("cart-checkout"), {"promo_code": "SAVE10"}))
+        self.assertIndexed(plans, "store_promocode")
+        self.assertIndexed(plans, "store_cartitem")
+
+    def test_date_ranged_sales_report(self):
+        self.client.force_authenticate(self.manager)
+        plans = self.capture_plans(lambda: self.client.get(reverse("sales-by-product"), {"date_from": "2025-01-01"}))
+        self.assertIndexed(plans, "store_order")
+        self.assertIndexed(plans, "store_orderitem")
+
+    def test_order_history(self):
+        user = User.objects.create_user(username="u1", password="pass")
+        self.client.force_authenticate(user)
+        plans = self.capture_plans(lambda: self.client.get(reverse("orders-list")))
+        self.assertIndexed(plans, "store_order", sorted_by_index=True)
@@ -0,0 +1,96 @@
+import time
+from unittest import mock
+
+from rest_framework.test import APIClient
+from django.core.cache import cache
+from django.db import connections
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from store.cache import PRODUCTS, get_versions, invalidate_products
+from store.models import Product, Category, User
+from store.routers import ReplicaRouter, replica_reads
+
+
+@override_settings(DATABASE_REPLICAS=["replica1", "replica2"])
+class ReplicaRouterTests(SimpleTestCase):
+    def test_reads_only_go_to_replicas_when_asked(self):
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(Product), "default")
+        with replica_reads():
+            replica = router.db_for_read(Product)
+            self.assertIn(replica, ["replica1", "replica2"])
+            # One replica for the whole request
+            self.assertEqual({router.db_for_read(Product) for _ in range(20)}, {replica})
+            with replica_reads(False):
+                self.assertEqual(router.db_for_read(Product), "default")
+            self.assertEqual(router.db_for_write(Product), "default")
+        self.assertFalse(router.allow_migrate("replica1", "store"))
+        self.assertTrue(router.allow_migrate("default", "store"))
+
+
+@override_settings(DATABASE_REPLICAS=["replica1"], DB_REPLICA_PIN_SECONDS=5)
+class ReplicaReadTests(TransactionTestCase):
+    # replica1 (added by the test runner, see store/tests/runner.py) mirrors the
+    # test database, so what it reads is what default has
+    databases = {"default", "replica1"}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="u1", password="pass")
+        self.manager = User.objects.create_user(username="manager", password="pass", role="manager")
+        self.product = Product.objects.create(name="Apple", category=Category.objects.create(name="FRUITS"), price=5, stock=10)
+        self.client = APIClient()
+
+    def get(self, url, later=0):
+        # `later`: pretend the catalogue last changed that many seconds ago
+        with CaptureQueriesContext(connections["default"]) as primary, \
+                CaptureQueriesContext(connections["replica1"]) as replica, \
+                mock.patch("store.cache.time") as clock:
+            clock.time.return_value = time.time() + later
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(primary), len(replica)
+
+    def test_catalogue_reads_use_the_replica(self):
+        get_versions([PRODUCTS])
+        primary, replica = self.get("/api/products/", later=60)
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    def test_responses_built_right_after_a_change_come_from_the_primary(self):
+        invalidate_products([self.product.id])
+        primary, replica = self.get("/api/products/")
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+    def test_reports_use_the_replica(self):
+        self.client.force_authenticate(self.manager)
+        primary, replica = self.get(reverse("sales-by-product"))
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    def test_cart_writes_pin_the_user_to_the_primary(self):
+        get_versions([PRODUCTS])
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.get("/api/products/?page_size=5", later=60)[0], 0)
+
+        with CaptureQueriesContext(connections["replica1"]) as replica:
+            self.client.post(reverse("cart-list"), {"product_id": self.product.id, "quantity": 1})
+            self.client.get(reverse("cart-list"))
+        self.assertEqual(len(replica), 0)
+
+        primary, replica = self.get("/api/products/?page_size=10", later=60)
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+        # Other users aren't affected
+        self.client.force_authenticate(self.manager)
+        self.assertEqual(self.get("/api/products/?page_size=20", later=60)[0], 0)
+
+    @override_settings(ROOT_URLCONF="grocery_backend.asgi_urls")
+    def test_async_catalogue_views_use_the_replica(self):
+        get_versions([PRODUCTS])
+        primary, replica = self.get("/api/products/", later=60)
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
@@ -1,6 +1,12 @@
+import json
+from datetime import datetime, timezone
+from decimal import Decimal
+from io import StringIO
+
 from rest_framework.test import APITestCase
+from django.core.management import call_command
 from django.urls import reverse
-from store.models import Product, Category, User
+from store.models import Product, Category, User, CartItem, Order, ProductSales, CategorySales
 
 class ReportsTests(APITestCase):
     def setUp(self):
@@ -10,9 +16,108 @@ class ReportsTests(APITestCase):
         self.client.force_authenticate(self.manager)
 
         cat = Category.objects.create(name="FRUITS")
-        Product.objects.create(name="Apple", category=cat, price=10, stock=10)
+        self.apple = Product.objects.create(name="Apple", category=cat, price=10, stock=10)
+        self.pear = Product.objects.create(name="Pear", category=cat, price=10, stock=10)
+
+    def checkout(self, lines):
+        customer = User.objects.create_user(username=f"c{User.objects.count()}", password="pass")
+        for product, qty in lines:
+            CartItem.objects.create(user=customer, product=product, quantity=qty)
+        self.client.force_authenticate(customer)
+        # Category counters are bumped once the checkout commits
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post(reverse("cart-checkout"), {}).status_code, 201)
+        self.client.force_authenticate(self.manager)
 
     def test_sales_report(self):
         url = reverse("sales-by-product")
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
+
+    def test_checkout_updates_counters(self):
+        self.checkout([(self.apple, 2), (self.pear, 1)])
+        self.checkout([(self.pear, 3)])
+
+        response = self.client.get(reverse("sales-by-product"))
+        self.assertEqual(
+            [(row["name"], row["total_sold"], row["revenue"]) for row in response.data["results"]],
+            [("Pear", 4, Decimal("40")), ("Apple", 2, Decimal("20"))],
+        )
+        response = self.client.get(reverse("sales-by-category"))
+        self.assertEqual(response.data["results"][0]["total_sold"], 6)
+
+        popular = self.client.get(reverse("products-list"), {"popular": "most"})
+        self.assertEqual([p["name"] for p in popular.data["results"]], ["Pear", "Apple"])
+
+    def test_category_counters_wait_for_the_commit(self):
+        customer = User.objects.create_user(username="c", password="pass")
+        CartItem.objects.create(user=customer, product=self.apple, quantity=2)
+        self.client.force_authenticate(customer)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertEqual(self.client.post(reverse("cart-checkout"), {}).status_code, 201)
+        self.assertEqual(ProductSales.objects.get().units_sold, 2)
+        self.assertFalse(CategorySales.objects.exists())
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(CategorySales.objects.get().units_sold, 2)
+
+    def test_rebuild_matches_incremental_counters(self):
+        self.checkout([(self.apple, 2), (self.pear, 1)])
+        self.checkout([(self.apple, 1)])
+        before = sorted(ProductSales.objects.values_list("product_id", "units_sold", "revenue"))
+
+        ProductSales.objects.all().delete()
+        CategorySales.objects.all().delete()
+        call_command("rebuild_sales_counters", stdout=StringIO())
+
+        self.assertEqual(sorted(ProductSales.objects.values_list("product_id", "units_sold", "revenue")), before)
+        self.assertEqual(CategorySales.objects.get().units_sold, 4)
+
+    def test_date_range(self):
+        self.checkout([(self.apple, 2)])
+        Order.objects.update(created_at=datetime(2025, 1, 10, 12, tzinfo=timezone.utc))
+        self.checkout([(self.apple, 1), (self.pear, 5)])
+
+        url = reverse("sales-by-product")
+        january = self.client.get(url, {"date_from": "2025-01-01", "date_to": "2025-01-10"}).data["results"]
+        # Only what sold in the window
+        self.assertEqual([(r["name"], r["total_sold"]) for r in january], [("Apple", 2)])
+        self.assertEqual(january[0]["revenue"], Decimal("20"))
+
+        since = self.client.get(url, {"date_from": "2025-01-11", "sort": "least"}).data["results"]
+        self.assertEqual([(r["product_id"], r["total_sold"]) for r in since], [(self.apple.id, 1), (self.pear.id, 5)])
+
+        by_category = self.client.get(reverse("sales-by-category"), {"date_from": "2025-01-11"}).data["results"]
+        self.assertEqual(
+            [(r["category_id"], r["name"], r["total_sold"], r["revenue"]) for r in by_category],
+            [(self.apple.category_id, "FRUITS", 6, Decimal("60"))],
+        )
+
+        before_noon = self.client.get(url, {"date_to": "2025-01-10T11:00:00Z"}).data["results"]
+        self.assertEqual(before_noon, [])
+
+        bad = self.client.get(url, {"date_from": "last week"})
+        self.assertEqual(bad.status_code, 400)
+
+    def test_pagination(self):
+        response = self.client.get(reverse("sales-by-product"), {"page_size": 1})
+        self.assertEqual(response.data["count"], 2)
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertIsNotNone(response.data["next"])
+
+    def test_csv_export_streams(self):
+        self.checkout([(self.pear, 3)])
+        response = self.client.get(reverse("sales-by-product"), {"export": "csv"})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], "product_id,name,total_sold,revenue")
+        self.assertEqual(lines[1], f"{self.pear.id},Pear,3,30.00")
+        self.assertEqual(len(lines), 3)
+
+    def test_ndjson_export(self):
+        self.checkout([(self.apple, 1)])
+        response = self.client.get(reverse("sales-by-category"), {"export": "ndjson"})
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(rows, [{"category_id": self.apple.category_id, "name": "FRUITS", "total_sold": 1, "revenue": "10.00"}])
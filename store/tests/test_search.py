@@ -0,0 +1,72 @@
+from unittest import mock
+
+from rest_framework.test import APITestCase
+from django.urls import reverse
+from store.models import Product, Category
+from store.search import InvertedIndexSearchBackend, get_search_backend
+
+class ProductSearchTests(APITestCase):
+    def setUp(self):
+        # The in-process index outlives each test's rolled back transaction
+        get_search_backend().reset()
+        cat = Category.objects.create(name="FRUITS")
+        self.apple = Product.objects.create(name="Green Apple", category=cat, price=10, stock=5)
+        self.juice = Product.objects.create(name="Apple Juice", category=cat, price=20, stock=5)
+        self.applesauce = Product.objects.create(name="Applesauce", category=cat, price=30, stock=5)
+        Product.objects.create(name="Banana", category=cat, price=5, stock=5)
+
+    def search(self, term):
+        response = self.client.get(reverse("products-list"), {"search": term})
+        self.assertEqual(response.status_code, 200)
+        return [p["name"] for p in response.data["results"]]
+
+    def test_prefix_match(self):
+        self.assertEqual(set(self.search("app")), {"Green Apple", "Apple Juice", "Applesauce"})
+
+    def test_exact_word_ranks_above_prefix(self):
+        names = self.search("apple")
+        self.assertEqual(names[-1], "Applesauce")
+        self.assertEqual(len(names), 3)
+
+    def test_all_terms_must_match(self):
+        self.assertEqual(self.search("apple ju"), ["Apple Juice"])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.search("apple")  # build the index
+        self.juice.name = "Orange Juice"
+        self.juice.save()
+        self.apple.delete()
+        self.assertEqual(self.search("apple"), ["Applesauce"])
+        self.assertEqual(self.search("orange"), ["Orange Juice"])
+
+    def walk(self, term):
+        response = self.client.get(reverse("products-list"), {"search": term, "page_size": 100})
+        ids = [p["id"] for p in response.data["results"]]
+        while response.data["next"]:
+            response = self.client.get(response.data["next"])
+            ids += [p["id"] for p in response.data["results"]]
+        return ids, response.data
+
+    def plums(self, count):
+        Product.objects.bulk_create(
+            Product(name=f"Plum {i}", slug=f"plum-{i}", price=1, stock=1) for i in range(count)
+        )
+        get_search_backend().reset()  # bulk_create skips the signals that keep the index current
+        return sorted(Product.objects.filter(name__startswith="Plum").values_list("id", flat=True), reverse=True)
+
+    @mock.patch.object(InvertedIndexSearchBackend, "max_results", 2000)
+    def test_pages_through_long_runs_of_equal_rank(self):
+        plums = self.plums(1300)
+        ids, last_page = self.walk("plum")
+        self.assertEqual(ids, plums)
+        self.assertNotIn("search_truncated", last_page)
+
+    def test_capped_matches_are_flagged(self):
+        plums = self.plums(1100)
+        ids, last_page = self.walk("plum")
+        self.assertEqual(ids, plums[:1000])
+        self.assertTrue(last_page["search_truncated"])
+
+    def test_no_match(self):
+        self.assertEqual(self.search("zzz"), [])
+        self.assertEqual(self.search("!!"), [])
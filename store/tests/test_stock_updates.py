@@ -0,0 +1,55 @@
+from rest_framework.test import APITestCase
+from django.urls import reverse
+from store.models import Product, Category, User, StockEvent
+
+class BatchStockTests(APITestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username="manager", password="pass", role="manager")
+        self.client.force_authenticate(self.manager)
+        cat = Category.objects.create(name="FRUITS")
+        self.products = [Product.objects.create(name=f"Apple {i}", category=cat, price=1, stock=10) for i in range(20)]
+
+    def post(self, updates):
+        return self.client.post(reverse("products-stock"), {"updates": updates}, format="json")
+
+    def test_absolute_and_delta_updates(self):
+        a, b, c = self.products[:3]
+        response = self.post([
+            {"id": a.id, "stock": 50},
+            {"id": b.id, "delta": -4},
+            {"id": b.id, "delta": -1},
+            {"id": c.id, "delta": -11},
+            {"id": 999999, "stock": 1},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(r["id"], r["status"]) for r in response.data["results"]],
+            [(a.id, "ok"), (b.id, "ok"), (b.id, "ok"), (c.id, "error"), (999999, "error")],
+        )
+        stock = dict(Product.objects.filter(id__in=[a.id, b.id, c.id]).values_list("id", "stock"))
+        self.assertEqual(stock, {a.id: 50, b.id: 5, c.id: 10})
+
+    def test_query_count_does_not_depend_on_batch_size(self):
+        # savepoint, locking select, update, stock events, release
+        with self.assertNumQueries(5):
+            self.post([{"id": p.id, "delta": 1} for p in self.products])
+        self.assertTrue(all(p.stock == 11 for p in Product.objects.all()))
+
+    def test_one_stock_event_per_product(self):
+        a, b = self.products[:2]
+        StockEvent.objects.all().delete()
+        self.post([{"id": a.id, "stock": 3}, {"id": a.id, "delta": -1}, {"id": b.id, "delta": 1}])
+        self.assertEqual(
+            sorted(StockEvent.objects.values_list("product_id", "source")),
+            [(a.id, "stock_update"), (b.id, "stock_update")],
+        )
+
+    def test_validation(self):
+        a = self.products[0]
+        self.assertEqual(self.post([{"id": a.id, "stock": 1, "delta": 1}]).status_code, 400)
+        self.assertEqual(self.post([{"id": a.id, "stock": -1}]).status_code, 400)
+        self.assertEqual(self.post([]).status_code, 400)
+
+    def test_manager_only(self):
+        self.client.force_authenticate(User.objects.create_user(username="u1", password="pass"))
+        self.assertEqual(self.post([{"id": self.products[0].id, "stock": 1}]).status_code, 403)
@@ -1,7 +1,10 @@
 from rest_framework.test import APITestCase
+from django.test import override_settings
 from django.urls import reverse
-from store.models import Product, Category, User
+from store.models import Product, Category, User, WishlistItem, ProductImage
+from store.tests import IN_MEMORY_STORAGES
 
+@override_settings(STORAGES=IN_MEMORY_STORAGES)
 class WishlistTests(APITestCase):
     def setUp(self):
         self.user = User.objects.create_user(username="u1", password="pass")
@@ -15,3 +18,16 @@ class WishlistTests(APITestCase):
         data = {"product_id": self.product.id}
         response = self.client.post(url, data)
         self.assertEqual(response.status_code, 201)
+
+    def test_wishlist_list_query_count_is_constant(self):
+        cat = self.product.category
+        for i in range(5):
+            p = Product.objects.create(name=f"Pear {i}", category=cat, price=10, stock=10)
+            ProductImage.objects.create(product=p, image=f"product_images/pear{i}.jpg")
+            WishlistItem.objects.create(user=self.user, product=p)
+
+        # wishlist items + product images, however many lines there are
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("wishlist-list"))
+        self.assertEqual(len(response.data), 5)
+        self.assertEqual(response.data[0]["product"]["category"]["name"], "FRUITS")
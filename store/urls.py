@@ -1,7 +1,8 @@
 from rest_framework import routers
 from .views import (
     ProductViewSet, CategoryViewSet, CartViewSet, WishlistViewSet,
-    ReportViewSet, PromoCodeViewSet, ProductImageViewSet, RegisterView, CreateManagerView
+    ReportViewSet, PromoCodeViewSet, ProductImageViewSet, RegisterView, CreateManagerView,
+    OrderViewSet, ManagerOrderViewSet, LogoutView
 )
 from django.urls import path, include
 
@@ -11,12 +12,16 @@ router.register('categories', CategoryViewSet, basename='categories')
 router.register('cart', CartViewSet, basename='cart')
 router.register('wishlist', WishlistViewSet, basename='wishlist')
 router.register('promocodes', PromoCodeViewSet)
+router.register('orders', OrderViewSet, basename='orders')
+router.register('manager/orders', ManagerOrderViewSet, basename='manager-orders')
 
 report_list = ReportViewSet.as_view({'get': 'sales_by_product'})
+category_report = ReportViewSet.as_view({'get': 'sales_by_category'})
 
 urlpatterns = [
     path('auth/register/', RegisterView.as_view(), name='register'),
     path('auth/create-manager/', CreateManagerView.as_view(), name='create-manager'),
+    path('auth/logout/', LogoutView.as_view(), name='logout'),
     
     # HYBRID ROUTES (slug + id)
     path(
@@ -45,6 +50,7 @@ urlpatterns = [
     path("", include(router.urls)),
     
     path('reports/sales-by-product/', report_list, name='sales-by-product'),
+    path('reports/sales-by-category/', category_report, name='sales-by-category'),
 
     # PRODUCT IMAGES (Nested Routes)
     path(
@@ -1,19 +1,68 @@
 from rest_framework import viewsets, status
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, AllowAny, SAFE_METHODS
 from .models import Product, Category, CartItem, WishlistItem, Order, OrderItem, PromoCode, ProductImage
-from .serializers import ProductSerializer, CategorySerializer, CartItemSerializer, WishlistItemSerializer, OrderSerializer, UserSerializer, ManagerCreateSerializer, PromoCodeSerializer, ProductImageSerializer
+from .serializers import ProductSerializer, CategorySerializer, CartItemSerializer, WishlistItemSerializer, OrderSerializer, UserSerializer, ManagerCreateSerializer, PromoCodeSerializer, ProductImageSerializer, StockBatchSerializer, CartBulkSerializer
 from .permissions import IsManagerOrReadOnly, IsManager, IsAdmin
+from .pagination import ProductCursorPagination, ReportPagination, OrderCursorPagination
+from . import reports, bulk, promos
+from .stock import apply_stock_updates
+from .search import get_search_backend
+from .sales import record_sales
+from .alerts import record_stock_changes
+from .carts import get_cart_backend
+from .slugs import slug_matches, remember_product_slug
+from .categories import category_tree, refresh_category_counts
+from .routers import ReplicaReadsMixin
+from .authentication import revoke_token
+from .images import upload_product_images, enqueue_derivatives
+from .cache import cached_response, invalidate_products, product_key, PRODUCTS, CATEGORIES, CATEGORY_COUNTS
+from functools import partial
 from rest_framework.decorators import action
+from rest_framework.views import APIView
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.response import Response
-from django.db.models import Sum, F, Count
+from django.db import transaction
+from django.db.models import F, Count, Q, Case, When, PositiveIntegerField
 from rest_framework import generics
 from django.utils import timezone
-from django.http import Http404
+from django.http import Http404, StreamingHttpResponse
 from rest_framework import serializers
-from django.db.models import Prefetch
-from django.utils.text import slugify
+from django.db.models import Prefetch, ProtectedError, prefetch_related_objects
 from django.db.models.functions import Coalesce
 
+def images_prefetch(lookup='images'):
+    # Product images in upload order, as ProductSerializer renders them
+    return Prefetch(lookup, queryset=ProductImage.objects.order_by('created_at'))
+
+def order_items_prefetch():
+    # Everything OrderSerializer renders, in 2 queries however many items/orders there are
+    return Prefetch(
+        'items',
+        queryset=OrderItem.objects.select_related('product__category').prefetch_related(images_prefetch('product__images')),
+    )
+
+def product_queryset(fields=None):
+    # Only join/prefetch the nested objects the client actually asked for
+    # (`fields` from ProductSerializer.requested_fields, None means all)
+    qs = Product.objects.all()
+    if not fields or 'category' in fields:
+        qs = qs.select_related('category')
+    if not fields or 'images' in fields:
+        # Prefetch related images to include them in serialized output
+        qs = qs.prefetch_related(images_prefetch())
+    return qs
+
+def cart_queryset(user_id):
+    # ProductSerializer nests category and images: join/prefetch them up front
+    return (
+        CartItem.objects.filter(user_id=user_id)
+        .select_related('product__category')
+        .prefetch_related(images_prefetch('product__images'))
+        .order_by('added_at', 'id')
+    )
+
 class RegisterView(generics.CreateAPIView):
     serializer_class = UserSerializer
     permission_classes = [AllowAny]
@@ -24,8 +73,26 @@ class CreateManagerView(generics.CreateAPIView):
 
     def perform_create(self, serializer):
         serializer.save(role="manager")
+
+class LogoutView(APIView):
+    """Revoke the access token used for this request, and the refresh token if one is posted."""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        refresh = request.data.get("refresh")
+        if refresh:
+            try:
+                refresh_token = RefreshToken(refresh)
+            except TokenError as exc:
+                raise serializers.ValidationError({"refresh": str(exc)})
+            if str(refresh_token.get(jwt_settings.USER_ID_CLAIM)) != str(request.user.id):
+                raise serializers.ValidationError({"refresh": "Token belongs to another user."})
+            revoke_token(refresh_token)
+        if request.auth is not None:
+            revoke_token(request.auth)
+        return Response(status=status.HTTP_204_NO_CONTENT)
   
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(ReplicaReadsMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all().order_by('name')
     serializer_class = CategorySerializer
     permission_classes = [IsManagerOrReadOnly]
@@ -39,25 +106,59 @@ class CategoryViewSet(viewsets.ModelViewSet):
         except Category.DoesNotExist:
             raise Http404("Category not found")
 
+    # Anonymous-facing reads are served from the catalogue cache (store/cache.py)
+    def list(self, request, *args, **kwargs):
+        return cached_response(request, [CATEGORIES], partial(super().list, request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return cached_response(request, [CATEGORIES], partial(super().retrieve, request, *args, **kwargs))
+
+    @action(detail=False, methods=['get'])
+    def tree(self, request):
+        """The whole category tree with product counts, for the navigation menu (one query)."""
+        return cached_response(request, [CATEGORIES, CATEGORY_COUNTS], lambda: Response(category_tree()))
+
+    def perform_destroy(self, instance):
+        try:
+            instance.delete()
+        except ProtectedError:
+            raise serializers.ValidationError({"detail": "Move or delete this category's subcategories first."})
+
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(ReplicaReadsMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = [IsManagerOrReadOnly]
+    pagination_class = ProductCursorPagination
 
     def get_object(self):
         slug = self.kwargs.get("slug")
         pk = self.kwargs.get("pk")
 
-        obj = Product.objects.filter(slug=slug, id=pk).first()
+        # One lookup, joined/prefetched like the listing (DRF drops prefetches
+        # after an update, so writes don't bother); a slug we know belongs to
+        # another product is a 404 without one (store/slugs.py)
+        if self.request.method in SAFE_METHODS:
+            qs = product_queryset(ProductSerializer.requested_fields(self.request))
+        else:
+            qs = Product.objects.select_related('category')
+        obj = slug_matches(slug, pk) and qs.filter(slug=slug, id=pk).first()
         if not obj:
             raise Http404("No product matches given slug and id")
+        remember_product_slug(slug, pk)
         return obj
 
+    # Anonymous-facing reads are served from the catalogue cache (store/cache.py)
+    def list(self, request, *args, **kwargs):
+        return cached_response(request, [PRODUCTS], partial(super().list, request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        # Products embed their category, see invalidate_category
+        versions = [product_key(self.kwargs.get("pk")), CATEGORIES]
+        return cached_response(request, versions, partial(super().retrieve, request, *args, **kwargs))
+
     def get_queryset(self):
-        qs = Product.objects.all().order_by('-created_at')
-        # Prefetch related images to include them in serialized output
-        qs = qs.prefetch_related(Prefetch('images', queryset=ProductImage.objects.order_by('created_at')))
+        qs = product_queryset(ProductSerializer.requested_fields(self.request)).order_by('-created_at')
         # existing filters (category/search/popular)...
         category = self.request.query_params.get('category')
         popular = self.request.query_params.get('popular')
@@ -66,11 +167,48 @@ class ProductViewSet(viewsets.ModelViewSet):
         if category:
             qs = qs.filter(category__slug=category.lower())
         if popular == 'most':
-            qs = qs.annotate(sold=Coalesce(Sum('orderitem__quantity'), 0)).order_by('-sold')
+            # Read the precomputed counter instead of SUMming every OrderItem
+            qs = qs.annotate(sold=Coalesce('sales__units_sold', 0)).order_by('-sold')
+            self.pagination_ordering = ('-sold', '-id')
         if search:
-            qs = qs.filter(name__icontains=search)
+            # Ranked full-text/prefix search (see store/search.py)
+            qs = get_search_backend().search(qs, search)
+            # Read off now, querysets don't carry it through their clones
+            self.search_truncated = getattr(qs, 'search_truncated', False)
+            if popular != 'most':
+                self.pagination_ordering = ('-search_rank', '-id')
         return qs
 
+    @action(detail=False, methods=['post'], url_path='stock', permission_classes=[IsManager])
+    def stock(self, request):
+        """Batch stock sync: {"updates": [{"id": 1, "stock": 10}, {"id": 2, "delta": -3}, ...]}"""
+        serializer = StockBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = apply_stock_updates(serializer.validated_data['updates'])
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], url_path='import', permission_classes=[IsManager])
+    def import_products(self, request):
+        """Upsert products from an uploaded CSV/NDJSON `file` (see store/bulk.py)."""
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"detail": "Upload the file as 'file'."}, status=status.HTTP_400_BAD_REQUEST)
+        file_format = request.data.get('file_format') or ('ndjson' if upload.name.endswith(('.ndjson', '.jsonl')) else 'csv')
+        if file_format not in bulk.IMPORT_FORMATS:
+            raise serializers.ValidationError({"file_format": f"Choose one of: {', '.join(bulk.IMPORT_FORMATS)}."})
+        summary = bulk.import_products(bulk.decode_lines(upload), file_format)
+        return Response(summary, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], url_path='export', permission_classes=[IsManager])
+    def export_products(self, request):
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in reports.EXPORT_FORMATS:
+            raise serializers.ValidationError({"file_format": f"Choose one of: {', '.join(reports.EXPORT_FORMATS)}."})
+        _, content_type = reports.EXPORT_FORMATS[file_format]
+        response = StreamingHttpResponse(bulk.export_products(file_format), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="products.{file_format}"'
+        return response
+
 class ProductImageViewSet(viewsets.ModelViewSet):
     serializer_class = ProductImageSerializer
     permission_classes = [IsManager]  
@@ -90,103 +228,228 @@ class ProductImageViewSet(viewsets.ModelViewSet):
         if ProductImage.objects.filter(product=product).count() + len(files) > 7:
             return Response({"detail": "Max 7 images allowed"}, status=400)
 
-        created = []
-        for img in files:
-            obj = ProductImage.objects.create(product=product, image=img)
-            created.append(ProductImageSerializer(obj).data)
+        created = upload_product_images(product, files)
+        return Response(ProductImageSerializer(created, many=True).data, status=201)
 
-        return Response(created, status=201)
+    def perform_update(self, serializer):
+        replaced = 'image' in serializer.validated_data
+        obj = serializer.save()
+        if replaced:
+            enqueue_derivatives([obj.id])
 
-class CartViewSet(viewsets.ModelViewSet):
+class CartViewSet(ReplicaReadsMixin, viewsets.GenericViewSet):
+    """The signed-in user's cart, kept by the CART_BACKEND (see store/carts.py)."""
     serializer_class = CartItemSerializer
     permission_classes = [IsAuthenticated]
+    # Carts are read from the primary; changing one (or checking out) pins the user there
+    replica_reads = False
 
-    def get_queryset(self):
-        return CartItem.objects.filter(user=self.request.user).select_related('product')
+    def get_line(self, pk):
+        item = str(pk).isdigit() and get_cart_backend().get_line(self.request.user.id, pk)
+        if not item:
+            raise Http404("No cart line matches the given id.")
+        return item
 
-    def perform_create(self, serializer):
+    def list(self, request):
+        items = get_cart_backend().lines(request.user.id)
+        return Response(self.get_serializer(items, many=True).data)
+
+    def retrieve(self, request, pk=None):
+        return Response(self.get_serializer(self.get_line(pk)).data)
+
+    def create(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
         product = serializer.validated_data['product']
         qty = serializer.validated_data.get('quantity', 1)
 
         if qty > product.stock:
             raise serializers.ValidationError("Insufficient stock.")
 
-        serializer.save(user=self.request.user)
+        item = get_cart_backend().add(request.user.id, product, qty)
+        return Response(self.get_serializer(item).data, status=status.HTTP_201_CREATED)
+
+    def update(self, request, pk=None, partial=False):
+        item = self.get_line(pk)
+        serializer = self.get_serializer(item, data=request.data, partial=partial)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        item = get_cart_backend().update(
+            request.user.id, item, data.get('product', item.product), data.get('quantity', item.quantity)
+        )
+        return Response(self.get_serializer(item).data)
+
+    def partial_update(self, request, pk=None):
+        return self.update(request, pk, partial=True)
+
+    def destroy(self, request, pk=None):
+        if not (str(pk).isdigit() and get_cart_backend().remove(request.user.id, pk)):
+            raise Http404("No cart line matches the given id.")
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        """Set many lines at once: {"lines": [{"product_id": 1, "quantity": 3}, {"product_id": 2, "quantity": 0}, ...]}"""
+        serializer = CartBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        cart = get_cart_backend()
+        cart.set_quantities(request.user.id, {line['product_id']: line['quantity'] for line in serializer.validated_data['lines']})
+        return Response(self.get_serializer(cart.lines(request.user.id), many=True).data)
 
     @action(detail=False, methods=['post'])
     def checkout(self, request):
-        user = request.user
-        items = CartItem.objects.filter(user=user).select_related('product')
-        if not items.exists():
-            return Response({"detail": "Cart is empty."}, status=status.HTTP_400_BAD_REQUEST)
-        total = 0
-        for it in items:
-            if it.quantity > it.product.stock:
-                return Response({"detail": f"Product {it.product.name} out of stock or insufficient quantity."}, status=status.HTTP_400_BAD_REQUEST)
-            total += it.product.price * it.quantity
-            
-        promo_code = request.data.get("promo_code")
-        discount_amount = 0
-
-        if promo_code:
-            try:
-                promo = PromoCode.objects.get(code=promo_code, is_active=True)
-                
-                if promo.expires_at and promo.expires_at < timezone.now():
-                    return Response({"detail": "Promo code expired."}, status=400)
-
-                # Apply discount
-                if promo.discount_type == "percent":
-                    discount_amount = (total * promo.value) / 100
-                else:
-                    discount_amount = promo.value
-
-            except PromoCode.DoesNotExist:
-                return Response({"detail": "Invalid promo code"}, status=400)
-
-        total -= discount_amount
-        if total < 0:
-            total = 0
-        
-        order = Order.objects.create(customer=user, total_amount=total)
-        order_items = []
-        for it in items:
-            OrderItem.objects.create(order=order, product=it.product, quantity=it.quantity, price_at_purchase=it.product.price)
-            # decrement stock
-            it.product.stock = Product.objects.filter(id=it.product.id).update(stock=F('stock') - it.quantity)
-        items.delete()
-        order.refresh_from_db()
+        # Just the id: with stateless JWT auth request.user isn't a User row
+        user_id = request.user.id
+        cart = get_cart_backend()
+        # Claimed before the transaction: a second checkout of the same cart
+        # (double click, retry) finds it empty, and loading a cached cart may
+        # write rows that mustn't roll back with a failed order
+        claim = cart.claim(user_id)
+        placed = False
+        try:
+            with transaction.atomic():
+                # The cart lines with their products locked
+                items = cart.checkout_lines(user_id, claim)
+                if not items:
+                    return Response({"detail": "Cart is empty."}, status=status.HTTP_400_BAD_REQUEST)
+                total = 0
+                for it in items:
+                    if it.quantity > it.product.stock:
+                        return Response({"detail": f"Product {it.product.name} out of stock or insufficient quantity."}, status=status.HTTP_400_BAD_REQUEST)
+                    total += it.product.price * it.quantity
+
+                promo_code = request.data.get("promo_code")
+                discount_amount = 0
+
+                promo = None
+                if promo_code:
+                    # Served from the promo cache, no query (see store/promos.py)
+                    promo = promos.get_promo_code(promo_code)
+                    if promo is None:
+                        return Response({"detail": "Invalid promo code"}, status=400)
+                    if promos.is_expired(promo):
+                        return Response({"detail": "Promo code expired."}, status=400)
+                    discount_amount = promos.discount_for(promo, total)
+
+                total -= discount_amount
+                if total < 0:
+                    total = 0
+
+                # Decrement stock for every line with a single conditional UPDATE. Each
+                # row only matches if it still has enough stock, so a short row count
+                # means someone else got there first and the whole order is rolled back.
+                enough_stock = Q()
+                for it in items:
+                    enough_stock |= Q(id=it.product_id, stock__gte=it.quantity)
+                updated = Product.objects.filter(enough_stock).update(
+                    stock=Case(
+                        *[When(id=it.product_id, then=F('stock') - it.quantity) for it in items],
+                        output_field=PositiveIntegerField(),
+                    ),
+                    updated_at=timezone.now(),
+                )
+                if updated != len(items):
+                    transaction.set_rollback(True)
+                    return Response({"detail": "Some products in your cart are out of stock or have insufficient quantity."}, status=status.HTTP_400_BAD_REQUEST)
+
+                order = Order.objects.create(customer_id=user_id, total_amount=total)
+                invalidate_products([it.product_id for it in items])
+                record_stock_changes([it.product_id for it in items], 'checkout')
+                # Lines that took the last of a product's stock change its category's in-stock count
+                refresh_category_counts([it.product.category_id for it in items if it.quantity == it.product.stock])
+
+                order_items = OrderItem.objects.bulk_create([
+                    OrderItem(order=order, product=it.product, quantity=it.quantity, price_at_purchase=it.product.price)
+                    for it in items
+                ])
+                record_sales(order_items)
+                cart.clear(user_id, claim)
+
+                # Count the redemption last, so the promo row (shared by every order
+                # using the code) stays locked for as short a time as possible
+                if promo and not promos.redeem(promo['id']):
+                    transaction.set_rollback(True)
+                    return Response({"detail": "Promo code is no longer available."}, status=status.HTTP_400_BAD_REQUEST)
+            placed = True
+        finally:
+            if not placed:
+                cart.release(user_id, claim)
+
+        prefetch_related_objects([order], order_items_prefetch())
         # Optionally: send confirmation email, payment handling
         serializer = OrderSerializer(order)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     
 
+class OrderViewSet(viewsets.ReadOnlyModelViewSet):
+    """The signed-in customer's order history, newest first."""
+    serializer_class = OrderSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = OrderCursorPagination
+
+    def get_queryset(self):
+        return Order.objects.filter(customer_id=self.request.user.id).prefetch_related(order_items_prefetch())
+
+class ManagerOrderViewSet(viewsets.ReadOnlyModelViewSet):
+    """Every customer's orders, for managers. Optional ?customer=<user id>."""
+    serializer_class = OrderSerializer
+    permission_classes = [IsAuthenticated, IsManager]
+    pagination_class = OrderCursorPagination
+
+    def get_queryset(self):
+        qs = Order.objects.prefetch_related(order_items_prefetch())
+        customer = self.request.query_params.get('customer')
+        if customer:
+            if not customer.isdigit():
+                raise serializers.ValidationError({"customer": "Expected a user id."})
+            qs = qs.filter(customer_id=customer)
+        return qs
+
 class WishlistViewSet(viewsets.ModelViewSet):
     serializer_class = WishlistItemSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return WishlistItem.objects.filter(user=self.request.user).select_related('product')
+        return (
+            WishlistItem.objects.filter(user_id=self.request.user.id)
+            .select_related('product__category')
+            .prefetch_related(images_prefetch('product__images'))
+            .order_by('added_at', 'id')
+        )
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        serializer.save(user_id=self.request.user.id)
 
-class ReportViewSet(viewsets.ViewSet):
+class ReportViewSet(ReplicaReadsMixin, viewsets.ViewSet):
     permission_classes = [IsAuthenticated, IsManager]
 
     @action(detail=False, methods=['get'])
     def sales_by_product(self, request):
-        # returns product id, name, total_sold
-        qs = Product.objects.annotate(total_sold=Sum('orderitem__quantity')).order_by('-total_sold')
-        # filters
-        sort = request.query_params.get('sort')  # most / least
-        category = request.query_params.get('category')
-        if category:
-            qs = qs.filter(category__name__iexact=category)
-        if sort == 'least':
-            qs = qs.order_by('total_sold')
-        data = [{'product_id': p.id, 'name': p.name, 'total_sold': p.total_sold or 0} for p in qs]
-        return Response(data)
+        # product id, name, units sold and revenue; see store/reports.py for the filters
+        qs = reports.sales_by_product(request.query_params)
+        return self.report_response(request, qs, reports.PRODUCT_COLUMNS, 'sales-by-product')
+
+    @action(detail=False, methods=['get'])
+    def sales_by_category(self, request):
+        qs = reports.sales_by_category(request.query_params)
+        return self.report_response(request, qs, reports.CATEGORY_COLUMNS, 'sales-by-category')
+
+    def report_response(self, request, qs, columns, filename):
+        export = request.query_params.get('export')
+        if export:
+            if export not in reports.EXPORT_FORMATS:
+                raise serializers.ValidationError({"export": f"Choose one of: {', '.join(reports.EXPORT_FORMATS)}."})
+            # Stream rows straight from a server-side cursor instead of building the whole report in memory
+            stream, content_type = reports.EXPORT_FORMATS[export]
+            # .using(): the rows are read after the view returns, so fix the database now
+            rows = qs.using(qs.db).iterator(chunk_size=2000)
+            response = StreamingHttpResponse(stream(rows, columns), content_type=content_type)
+            response['Content-Disposition'] = f'attachment; filename="{filename}.{export}"'
+            return response
+
+        paginator = ReportPagination()
+        page = paginator.paginate_queryset(qs, request, view=self)
+        return paginator.get_paginated_response([reports.as_row(row, columns) for row in page])
 
 class PromoCodeViewSet(viewsets.ModelViewSet):
     queryset = PromoCode.objects.all().order_by('-created_at')